@@ -1,83 +1,46 @@
-from models.base import SessionLocal
+from models.base import SessionLocal, allocate_ids
+from app.Session_Manager import execute_transaction as _execute_transaction, read_transaction as _read_transaction, run_after_commit, session_scope
+from app.Schedule_Index import schedule_index, Booking
+from app.Auth_Service import forget_failed_logins
+from app.Member_Service import invalidate_member_dashboard, invalidate_class_catalogue
+from app.Pagination import Page, keyset_page, slice_page, estimate_count
+from app.Reference_Data import reference_data, bump_reference_data_version
+from app.Change_Stamps import CLASSES, member_stamp, trainer_stamp, bump_stamps
+from app.Cache import TTLCache
 from models.trainer import Trainer
 from models.member import Member
 from models.classes import Classes
+from models.class_enrollment_summary import Class_enrollment_summary
 from models.trainer_availability import Trainer_availability
 from models.admin import Admin
 from models.room import Room
-from models.invoice import Invoice
+from models.invoice import Invoice, UNPAID_INVOICE_STATUSES
 from models.equipment import Equipment
 from models.equipment_log import Equipment_log
 
-from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import datetime, date, time, timedelta
+from hashlib import sha1
+import json
+from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy.exc import IntegrityError, NoResultFound
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, or_, insert, values, column, select, Integer, DateTime
 from sqlalchemy.orm import Session, joinedload
 
-# Helper for opening and closing sessions
-def _execute_transaction(func):
-    """Decorator to handle session management (open, commit, rollback, close).
-    The decorated function must accept 'session' as its first argument.
-    
-    FIXED: The commit logic now checks the function name more broadly to ensure
-    all write operations (add, update, delete, register, log) are committed.
-    """
-    def wrapper(*args, **kwargs):
-        session = SessionLocal()
-        # The first argument 'session' is provided by the decorator
-        args_with_session = (session,) + args
-        try:
-            result = func(*args_with_session, **kwargs)
-            
-            # Commit only for functions that are intended to write data
-            # Check if the function name indicates a modification (add, update, delete, register, log)
-            is_write_operation = (
-                func.__name__.startswith('add_') or 
-                func.__name__.startswith('update_') or 
-                func.__name__.startswith('delete_') or 
-                func.__name__.startswith('register_') or 
-                func.__name__.startswith('log_')
-            )
-            
-            # Add explicit function names if they don't follow the convention but perform a write
-            specific_write_functions = ['update_invoice'] 
-
-            if is_write_operation or func.__name__ in specific_write_functions:
-                session.commit()
-                print(f"Transaction committed for {func.__name__}.")
-                
-            return result
-        except IntegrityError as e:
-            session.rollback()
-            print(f"Error: Database constraint violation during {func.__name__}. Details: {e}")
-            return None
-        except NoResultFound as e:
-            session.rollback()
-            print(f"Error: No result found during {func.__name__}. Details: {e}")
-            return None
-        except Exception as e:
-            session.rollback()
-            print(f"An unexpected error occurred during {func.__name__}: {e}")
-            return None # Return None on general failure for decorated functions
-        finally:
-            session.close()
+# Days between issuing an invoice and its due date
+INVOICE_DUE_DAYS = 14
 
-    return wrapper
+# Assembled admin dashboards per admin_id, kept briefly since admins reload the landing page often
+_admin_dashboards = TTLCache(ttl_seconds=15, max_entries=1000)
 
-#find biggest class_id
+#reserve the next class_id
 @_execute_transaction
 def get_class_id(session: Session)->int:
-    max_id = session.query(func.max(Classes.class_id)).scalar()
-    if max_id == 0:
-        target_id = 0
-    else:
-        target_id = max_id +1
-    print(f"THIS IS TARGET ID : {target_id}")
+    """Reserves the next class_id from the classes_class_id_seq sequence."""
+    target_id = allocate_ids(session, Classes, 1)[0]
     return target_id
 
 #find working trainer
-@_execute_transaction
+@_read_transaction
 def get_available_trainers_for_timeslot(session: Session, date_str: str, start_time_str: str, end_time_str: str) -> List[dict]:
 
     TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -99,10 +62,7 @@ def get_available_trainers_for_timeslot(session: Session, date_str: str, start_t
     # The condition for overlap (BUSY) is:
     # (Existing_Class_Start < Requested_End) AND (Existing_Class_End > Requested_Start)
     busy_trainer_ids_query = session.query(Classes.trainer_id)\
-        .filter(and_(
-            Classes.start_time < query_end_dt,
-            Classes.end_time > query_start_dt
-        ))\
+        .filter(Classes.overlaps(query_start_dt, query_end_dt))\
         .distinct()\
         .subquery() # Use subquery to select from later
 
@@ -129,6 +89,7 @@ def register_trainer(session: Session, name: str, email:str) -> Optional[Admin]:
             email=email
         )
         session.add(new_admin)
+        run_after_commit(lambda: forget_failed_logins(email))
         print(f"Success : register new admin : {name}")
         return new_admin
     except Exception as e:
@@ -136,7 +97,7 @@ def register_trainer(session: Session, name: str, email:str) -> Optional[Admin]:
         return False
 
 #get trianer_id
-@_execute_transaction
+@_read_transaction
 def get_admin_id(session: Session, name: str) -> Optional[int]:
     try:
         admin_id = session.query(Admin.admin_id).filter(
@@ -166,23 +127,11 @@ def schedule_new_class(
     # Calculate duration (90 minutes) and end_time
     class_duration = timedelta(minutes=90)
     end_time = start_time + class_duration
-    other_id = get_class_id()
-    print(f"THIS IS CLASS ID = {start_time}")
     
     # Check Trainer and Room availability (Conflict Checking Logic)
-    # FIX 2: Conflict checks now use the correctly calculated end_time
-    trainer_busy = session.query(Classes).filter(
-        Classes.trainer_id == trainer_id,
-        Classes.start_time < end_time, # Check if new class ends after a current class starts
-        Classes.end_time > start_time  # Check if new class starts before a current class ends
-    ).first()
-    #if trainer A has class on 12-02 at 1pm to 3pm
-    #it tries to detect the trainer A's time conflic
-    room_busy = session.query(Classes).filter(
-        Classes.room_id == room_id,
-        Classes.start_time < end_time,
-        Classes.end_time > start_time
-    ).first()
+    # One indexed probe covers both; the exclusion constraints on classes still reject
+    # a double booking that slips in concurrently (reported as an integrity error).
+    trainer_busy, room_busy = _find_booking_conflicts(session, trainer_id, room_id, start_time, end_time)
 
     if trainer_busy:
         print(f"Conflict: Trainer ID {trainer_id} is busy at this time.")
@@ -192,60 +141,100 @@ def schedule_new_class(
         print(f"Conflict: Room ID {room_id} is busy at this time.")
         return False
         
-    try:
-        # Create the new Classes object. 
-        new_class = Classes(
-            class_id=other_id,
-            trainer_id=trainer_id,
-            room_id=room_id,
-            class_type=class_type,
-            start_time=start_time,
-            number_members=0 
+    # Create the new Classes object (class_id is assigned by the classes_class_id_seq sequence)
+    new_class = Classes(
+        class_id=None,
+        trainer_id=trainer_id,
+        room_id=room_id,
+        class_type=class_type,
+        start_time=start_time,
+        number_members=0 
+    )
+    
+    # Commit (or rollback on an integrity error) is handled by the decorator
+    session.add(new_class)
+    session.flush()
+    booking = _booking_of(new_class)
+    run_after_commit(lambda: schedule_index.put(booking))
+    bump_stamps(session, CLASSES, trainer_stamp(trainer_id))
+    invalidate_class_catalogue()
+    invalidate_admin_dashboards()
+
+    print(f"Success: Class ID {new_class.class_id} ({class_type}) scheduled.")
+    return True
+
+
+def _find_booking_conflicts(
+    session: Session,
+    trainer_id: int,
+    room_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    exclude_class_id: Optional[int] = None,
+    use_schedule_index: bool = False
+) -> Tuple[Optional[Booking], Optional[Booking]]:
+    """
+    Finds a booking that overlaps [start_time, end_time) for the trainer and one for the room, with a
+    single query served by the GiST indexes of the exclusion constraints. The interactive pre-check
+    passes use_schedule_index to answer upcoming slots from memory instead; that index can be up to a
+    refresh behind other processes, so writes always ask the database.
+    Returns (trainer_conflict, room_conflict); either is None when that side is free.
+    """
+    if use_schedule_index:
+        conflicts = schedule_index.find_conflicts(trainer_id, room_id, start_time, end_time, exclude_class_id)
+        if conflicts is not None:
+            return conflicts
+
+    query = session.query(
+        Classes.class_id, Classes.trainer_id, Classes.room_id, Classes.start_time, Classes.end_time
+    ).filter(
+        or_(Classes.trainer_id == trainer_id, Classes.room_id == room_id),
+        Classes.overlaps(start_time, end_time)
+    )
+    if exclude_class_id is not None:
+        query = query.filter(Classes.class_id != exclude_class_id)
+
+    trainer_conflict = room_conflict = None
+    for row in query.order_by(Classes.start_time):
+        booked = Booking(*row)
+        if trainer_conflict is None and booked.trainer_id == trainer_id:
+            trainer_conflict = booked
+        if room_conflict is None and booked.room_id == room_id:
+            room_conflict = booked
+    return trainer_conflict, room_conflict
+
+def _booking_of(class_record: Classes) -> Booking:
+    return Booking(class_record.class_id, class_record.trainer_id, class_record.room_id,
+                   class_record.start_time, class_record.end_time)
+
+def find_class_conflict(trainer_id: int, room_id: int, start_time: datetime, class_id: Optional[int] = None) -> Optional[str]:
+    """
+    Interactive pre-check used while an admin tries out time slots. Returns a conflict message or None.
+    Not wrapped in _execute_transaction: it only reads, and upcoming slots are answered from the schedule
+    index in memory, so no connection is needed for them. Saving the class checks the database again.
+    """
+    with session_scope() as session:
+        return _check_for_conflict(
+            session, class_id, trainer_id, room_id, start_time, start_time + timedelta(minutes=90), use_schedule_index=True
         )
-        
-        session.add(new_class)
-        session.commit()
-
-        print(f"Success: Class ID {other_id} ({class_type}) scheduled.")
-        return True
-        
-    except IntegrityError:
-        session.rollback()
-        print(f"Integrity Error: Could not create class ID {other_id}.")
-        return False
-    except Exception as e:
-        session.rollback()
-        print(f"Unexpected error during class scheduling in service layer: {e}")
-        return False
 
+def _is_booking_conflict(error: IntegrityError) -> bool:
+    """True when the error comes from one of the classes exclusion constraints (SQLSTATE 23P01)."""
+    return getattr(error.orig, 'pgcode', None) == '23P01'
 
 #check overlap
-@_execute_transaction
+@_read_transaction
 def check_class_conflict(session: Session, room_id: int, trainer_id: int, start_time: datetime) -> bool:
-    # 1. Check for Room Conflict (Overlapping Time in the Same Room)
     end_time = start_time + timedelta(minutes= 90)
-    room_conflict = session.query(Classes).filter(
-        and_(
-            Classes.room_id == room_id,
-            Classes.start_time < end_time,  
-            Classes.end_time > start_time    
-        )
-    ).first()
+    trainer_conflict, room_conflict = _find_booking_conflicts(session, trainer_id, room_id, start_time, end_time)
 
+    # 1. Check for Room Conflict (Overlapping Time in the Same Room)
     if room_conflict:
         print(f"Conflict: Room {room_id} is already booked by Class ID {room_conflict.class_id} "
               f"from {room_conflict.start_time} to {room_conflict.end_time}.")
         return False
 
     # 2. Check for Trainer Conflict (Overlapping Time for the Same Trainer)
-    trainer_conflict = session.query(Classes).filter(
-        and_(
-            Classes.trainer_id == trainer_id,
-            Classes.start_time < end_time,
-            Classes.end_time > start_time
-        )
-    ).first()
-
     if trainer_conflict:
         print(f"Conflict: Trainer ID {trainer_id} is already assigned to Class ID {trainer_conflict.class_id} "
               f"from {trainer_conflict.start_time} to {trainer_conflict.end_time}.")
@@ -254,6 +243,105 @@ def check_class_conflict(session: Session, room_id: int, trainer_id: int, start_
         print("Success: Room and Trainer are available for the requested time slot.")
         return True
     
+#schedule a recurring series of classes
+@_execute_transaction
+def schedule_recurring_classes(
+    session: Session,
+    trainer_id: int,
+    room_id: int,
+    class_type: str,
+    first_date: date,
+    start_time: time,
+    weekdays: List[int],
+    weeks: int,
+    number_members: int = 0,
+    allow_partial: bool = False
+) -> Dict[str, Any]:
+    """
+    Schedules a weekly series, e.g. every Tue/Thu at 18:00 for 12 weeks (weekdays use 0=Monday).
+    All occurrences are checked against the trainer's and the room's bookings in one query and
+    inserted with one bulk statement. Returns a per-occurrence report. When some occurrences
+    conflict, nothing is scheduled unless allow_partial is True, in which case only the free ones are.
+    """
+    class_duration = timedelta(minutes=90)
+
+    # 1. Expand the series into occurrences
+    series_start = datetime.combine(first_date, start_time)
+    occurrences = sorted({
+        series_start + timedelta(days=day)
+        for day in range(weeks * 7)
+        if (first_date + timedelta(days=day)).weekday() in set(weekdays)
+    })
+    if not occurrences:
+        return {'scheduled': 0, 'conflicts': 0, 'occurrences': []}
+
+    # 2. One set-based conflict check for every occurrence against existing trainer/room bookings
+    candidates = values(
+        column('idx', Integer), column('start_time', DateTime), column('end_time', DateTime),
+        name='occurrence'
+    ).data([(i, start, start + class_duration) for i, start in enumerate(occurrences)])
+    clashes = session.query(
+        candidates.c.idx, Classes.class_id, Classes.trainer_id, Classes.room_id
+    ).join(
+        Classes,
+        and_(
+            or_(Classes.trainer_id == trainer_id, Classes.room_id == room_id),
+            Classes.overlaps(candidates.c.start_time, candidates.c.end_time)
+        )
+    ).order_by(candidates.c.idx).all()
+
+    reasons = {}
+    for clash in clashes:
+        if clash.trainer_id == trainer_id:
+            reasons.setdefault(clash.idx, f"Trainer ID {trainer_id} is busy (Class ID {clash.class_id}).")
+        else:
+            reasons.setdefault(clash.idx, f"Room ID {room_id} is occupied (Class ID {clash.class_id}).")
+
+    free = [i for i in range(len(occurrences)) if i not in reasons]
+    to_insert = free if (allow_partial or not reasons) else []
+
+    # 3. One bulk INSERT for the free occurrences (class_id comes from the sequence)
+    class_ids = {}
+    if to_insert:
+        rows = [{
+            'trainer_id': trainer_id,
+            'room_id': room_id,
+            'class_type': class_type,
+            'number_members': number_members,
+            'start_time': occurrences[i],
+            'end_time': occurrences[i] + class_duration,
+            'start_date': occurrences[i].date()
+        } for i in to_insert]
+        inserted = session.scalars(
+            insert(Classes).returning(Classes.class_id, sort_by_parameter_order=True), rows
+        ).all()
+        class_ids = dict(zip(to_insert, inserted))
+
+        bookings = [Booking(class_ids[i], trainer_id, room_id, occurrences[i], occurrences[i] + class_duration)
+                    for i in to_insert]
+        def _index_series():
+            for booking in bookings:
+                schedule_index.put(booking)
+        run_after_commit(_index_series)
+        bump_stamps(session, CLASSES, trainer_stamp(trainer_id))
+        invalidate_class_catalogue()
+        invalidate_admin_dashboards()
+
+    # 4. Per-occurrence report
+    report = []
+    for i, start in enumerate(occurrences):
+        entry = {'start_time': start.strftime('%Y-%m-%d %H:%M')}
+        if i in class_ids:
+            entry.update(status='scheduled', class_id=class_ids[i])
+        elif i in reasons:
+            entry.update(status='conflict', reason=reasons[i])
+        else:
+            entry.update(status='not scheduled', reason='Series rejected because other occurrences conflict.')
+        report.append(entry)
+
+    print(f"Success: Scheduled {len(class_ids)} of {len(occurrences)} '{class_type}' classes ({len(reasons)} conflicts).")
+    return {'scheduled': len(class_ids), 'conflicts': len(reasons), 'occurrences': report}
+
 def log_equipment_issue(admin_id: int, equipment_id: int, issue_description: str, repair_task: str) -> bool:
     """
     Logs a maintenance issue for a piece of equipment.
@@ -288,59 +376,60 @@ def log_equipment_issue(admin_id: int, equipment_id: int, issue_description: str
         session.close()
 
 #view invoice
-def view_member_invoices(member_id: int):
-    """Retrieves all invoices for a specific member."""
-    session = SessionLocal()
-    try:
-        invoices = session.query(Invoice).filter(Invoice.member_id == member_id).all()
-        
-        if not invoices:
-            print(f"No invoices found for Member ID {member_id}.")
-            return []
-
-        print(f"\n--- Invoices for Member ID {member_id} ---")
-        invoice_list = []
-        for inv in invoices:
-            data = {
-                'ID': inv.invoice_id,
-                'Total': f"${inv.total_price:.2f}",
-                'Status': inv.status,
-                'Issue Date': inv.issue_date.strftime('%Y-%m-%d') if inv.issue_date else 'N/A',
-                'Due Date': inv.due_date.strftime('%Y-%m-%d') if inv.due_date else 'N/A',
-                'Payment Method': inv.payment_method
-            }
-            invoice_list.append(data)
-            print(f"  ID: {data['ID']} | Total: {data['Total']} | Status: {data['Status']} | Due: {data['Due Date']}")
-        
-        return invoice_list
-    finally:
-        session.close()
+@_read_transaction
+def view_member_invoices(session: Session, member_id: int, limit: Optional[int] = None, after: Optional[str] = None, with_total: bool = False):
+    """Retrieves the invoices of a specific member, newest first, one page at a time when a limit is given."""
+    invoices_query = session.query(Invoice).filter(Invoice.member_id == member_id)
+    invoices = keyset_page(invoices_query, [Invoice.invoice_id], lambda inv: (inv.invoice_id,), limit, after, descending=True)
+    
+    if not invoices:
+        print(f"No invoices found for Member ID {member_id}.")
+        return Page()
+
+    print(f"\n--- Invoices for Member ID {member_id} ---")
+    invoice_list = []
+    for inv in invoices:
+        data = {
+            'ID': inv.invoice_id,
+            'Total': f"${inv.total_price:.2f}",
+            'Status': inv.status,
+            'Issue Date': inv.issue_date.strftime('%Y-%m-%d') if inv.issue_date else 'N/A',
+            'Due Date': inv.due_date.strftime('%Y-%m-%d') if inv.due_date else 'N/A',
+            'Payment Method': inv.payment_method
+        }
+        invoice_list.append(data)
+        print(f"  ID: {data['ID']} | Total: {data['Total']} | Status: {data['Status']} | Due: {data['Due Date']}")
+    
+    return Page(invoice_list, invoices.next_after, estimate_count(session, invoices_query) if with_total else None)
 
 #make invoice
-def make_invoice(admin_id:int, member_id:int, total_price:int, payment_method:str, status:str, price_type:str) ->bool:
-    session = SessionLocal()
-    try:
-        if(session.query(Member).filter(Member.member_id == member_id)):
-            print(f"Find the {member_id}")
-        else:
-            print(f"Error : not able to find {member_id}")
-            return False
-        new_invoice = Invoice(
-            member_id=member_id,
-            admin_id=admin_id,
-            total_price=total_price,
-            issue_date=datetime.now(),
-            payment_method=payment_method,
-            status=status,
-            price_type=price_type
-        )
-        session.add(new_invoice)
-        print(f"Success : create the invoice of {member_id}")
-        return True
-    
-    except Exception as e:
-        print("Error : {e}")
+@_execute_transaction
+def make_invoice(session: Session, admin_id:int, member_id:int, total_price:int, payment_method:str, status:str, price_type:str) ->bool:
+    """Issues one invoice to a member, due INVOICE_DUE_DAYS after today."""
+    if session.get(Member, member_id) is None:
+        print(f"Error : not able to find {member_id}")
         return False
+
+    issue_date = datetime.now()
+    new_invoice = Invoice(
+        invoice_id=None,
+        member_id=member_id,
+        admin_id=admin_id,
+        total_price=total_price,
+        issue_date=issue_date,
+        due_date=issue_date + timedelta(days=INVOICE_DUE_DAYS),
+        payment_method=payment_method,
+        status=status,
+        price_type=price_type
+    )
+    session.add(new_invoice)
+    # Flush so a constraint violation is reported (and rolled back) by the decorator
+    session.flush()
+    bump_stamps(session, member_stamp(member_id))
+    invalidate_admin_dashboards()
+    print(f"Success : create the invoice {new_invoice.invoice_id} of {member_id}")
+    return True
+
 #get invoice
 def get_invoice(member_id:int)->bool:
     session = SessionLocal()
@@ -371,6 +460,8 @@ def update_invoice(session: Session, invoice_id: int, total_price: float, price_
         current_invoice.price_type = price_type
         current_invoice.status = status
         current_invoice.admin_id = admin_id  # Optionally update the admin ID who last modified it
+        bump_stamps(session, member_stamp(current_invoice.member_id))
+        invalidate_admin_dashboards()
 
         # 3. Commit is handled by the decorator (@_execute_transaction)
         print(f"Success: Invoice ID {invoice_id} for Member {current_invoice.member_id} updated. "
@@ -381,12 +472,12 @@ def update_invoice(session: Session, invoice_id: int, total_price: float, price_
         # Error logging and rollback are handled by the decorator
         return False
     
-def check_admin(email: str, password: str) -> Optional[int]:
+@_read_transaction
+def check_admin(session: Session, email: str, password: str) -> Optional[int]:
     """
     Checks if a member with the given email and password exists.
     Returns the member_id on success, or None on failure.
     """
-    session = SessionLocal()
     admin_match = session.query(Admin).filter(
         Admin.email == email, 
         Admin.password == password
@@ -399,77 +490,136 @@ def check_admin(email: str, password: str) -> Optional[int]:
         print("Error: Invalid email or password.")
         return None
 
-@_execute_transaction
-def get_admin_dashboard_data(session: Session, admin_id: int) -> Dict[str, Any]:
-    
+def get_admin_dashboard_data(admin_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Everything the admin landing page shows: the next classes of the coming week, all trainers and
+    rooms (for the scheduling form) and headline counts. The result carries an 'etag' computed from
+    its content, and is cached per admin for a few seconds; admin writes drop it after committing.
+    """
+    dashboard = _admin_dashboards.get(admin_id)
+    if dashboard is None:
+        dashboard = _build_admin_dashboard_data(admin_id=admin_id)
+        if dashboard is None:
+            return None
+        dashboard['etag'] = sha1(json.dumps([admin_id, dashboard], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        _admin_dashboards.set(admin_id, dashboard)
+    return dashboard
+
+
+def invalidate_admin_dashboards():
+    """Drops every cached admin dashboard once the current unit of work commits."""
+    run_after_commit(_admin_dashboards.clear)
+
+
+@_read_transaction
+def _build_admin_dashboard_data(session: Session, admin_id: int) -> Dict[str, Any]:
     # 1. Calculate time range for the next 7 days
     now = datetime.now()
     one_week_later = now + timedelta(days=7)
     
     # 2. Fetch upcoming classes (joining with Trainer and Room)
-    try:
-        # --- MODIFICATION: Explicitly select columns instead of the entire Classes object ---
-        upcoming_classes = session.query(
-            Classes.class_id,
-            Classes.class_type,
-            Classes.start_time,
-            Classes.end_time,
-            Classes.number_members,
-            Trainer.name.label('trainer_name'),
-            Room.room_type.label('room_type'),
-            Room.capacity.label('room_capacity')
-        ).join(Trainer, Classes.trainer_id == Trainer.trainer_id)\
-         .join(Room, Classes.room_id == Room.room_id)\
-         .filter(Classes.start_time >= now)\
-         .filter(Classes.start_time <= one_week_later)\
-         .order_by(Classes.start_time)\
-         .limit(5)\
-         .all()
-        # ----------------------------------------------------------------------------------
-         
-        # Format the results into a list of dictionaries for Flask rendering
-        classes_data = []
-        for class_record in upcoming_classes:
-            # When explicitly selecting columns, the results are tuples, not mapped objects.
-            # We access columns by index or attribute name if using labels.
-            classes_data.append({
-                'class_id': class_record.class_id,
-                'class_type': class_record.class_type,
-                'start_time': class_record.start_time.strftime('%Y-%m-%d %H:%M'),
-                'end_time': class_record.end_time.strftime('%H:%M'),
-                'trainer_name': class_record.trainer_name,
-                'current_members': class_record.number_members, # This is capacity, based on schedule_new_class logic
-                'room_type': class_record.room_type,
-                'room_capacity': class_record.room_capacity,
-                'capacity_remaining': class_record.room_capacity - class_record.number_members
-            })
-
-    except Exception as e:
-        print(f"An unexpected error occurred during get_admin_dashboard_data: {e}")
-        # Return empty data structure on error
-        return {'classes': [], 'trainers': [], 'rooms': []}
-
-
-    # 3. Fetch list of all trainers
-    trainers = session.query(Trainer).order_by(Trainer.trainer_id).all()
-    trainers_data = [{'trainer_id': t.trainer_id, 'name': t.name} for t in trainers]
+    upcoming_classes = session.query(
+        Classes.class_id,
+        Classes.class_type,
+        Classes.start_time,
+        Classes.end_time,
+        Classes.number_members,
+        func.coalesce(Class_enrollment_summary.current_enrollment, 0).label('current_enrollment'),
+        Trainer.name.label('trainer_name'),
+        Room.room_type.label('room_type'),
+        Room.capacity.label('room_capacity')
+    ).join(Trainer, Classes.trainer_id == Trainer.trainer_id)\
+     .join(Room, Classes.room_id == Room.room_id)\
+     .outerjoin(Class_enrollment_summary, Classes.class_id == Class_enrollment_summary.class_id)\
+     .filter(Classes.start_time >= now)\
+     .filter(Classes.start_time <= one_week_later)\
+     .order_by(Classes.start_time)\
+     .limit(5)\
+     .all()
+
+    # Format the results into a list of dictionaries for Flask rendering
+    classes_data = []
+    for class_record in upcoming_classes:
+        classes_data.append({
+            'class_id': class_record.class_id,
+            'class_type': class_record.class_type,
+            'start_time': class_record.start_time.strftime('%Y-%m-%d %H:%M'),
+            'end_time': class_record.end_time.strftime('%H:%M'),
+            'trainer_name': class_record.trainer_name,
+            'current_members': class_record.number_members, # This is capacity, based on schedule_new_class logic
+            'current_enrollment': class_record.current_enrollment,
+            'room_type': class_record.room_type,
+            'room_capacity': class_record.room_capacity,
+            'capacity_remaining': class_record.room_capacity - class_record.number_members
+        })
 
-    # 4. Fetch list of all rooms
-    rooms = session.query(Room).order_by(Room.room_id).all()
-    rooms_data = [{'room_id': r.room_id, 'room_type': r.room_type, 'capacity': r.capacity} for r in rooms]
+    # 3. Trainers and rooms come from the in-process reference data; headline counts in a single round trip
+    trainers = [dict(t) for t in reference_data.trainers(session)]
+    rooms = [{'room_id': r['room_id'], 'room_type': r['room_type'], 'capacity': r['capacity']}
+             for r in reference_data.rooms(session)]
+    overview = session.execute(select(
+        select(func.count()).select_from(Member).scalar_subquery().label('total_members'),
+        select(func.count()).select_from(Classes).where(
+            Classes.start_time >= now, Classes.start_time <= one_week_later
+        ).scalar_subquery().label('classes_this_week'),
+        select(func.count()).select_from(Invoice).where(Invoice.status == 'Pending').scalar_subquery().label('pending_invoices'),
+        select(func.count()).select_from(Invoice).where(Invoice.status == 'Overdue').scalar_subquery().label('overdue_invoices'),
+        select(func.coalesce(func.sum(Invoice.total_price), 0)).where(
+            Invoice.status.in_(UNPAID_INVOICE_STATUSES)
+        ).scalar_subquery().label('outstanding_total'),
+    )).one()
 
     return {
         'classes': classes_data,
-        'trainers': trainers_data,
-        'rooms': rooms_data
+        'trainers': trainers,
+        'rooms': rooms,
+        'counts': {
+            'members': overview.total_members,
+            'trainers': len(trainers),
+            'rooms': len(rooms),
+            'classes_this_week': overview.classes_this_week,
+            'pending_invoices': overview.pending_invoices,
+            'overdue_invoices': overview.overdue_invoices,
+            'outstanding_total': round(overview.outstanding_total, 2),
+        },
+        'outstanding_balances': get_outstanding_balances(limit=10) or []
     }
 
 
+@_read_transaction
+def get_outstanding_balances(session: Session, limit: int = 10, member_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Unpaid total, number of unpaid invoices and oldest due date per member, largest balance first
+    (only member_id's when given). Aggregated from idx_invoice_unpaid_member without reading paid invoices.
+    """
+    balances = select(
+        Invoice.member_id,
+        func.sum(Invoice.total_price).label('balance'),
+        func.count().label('unpaid_invoices'),
+        func.min(Invoice.due_date).label('oldest_due_date')
+    ).where(Invoice.status.in_(UNPAID_INVOICE_STATUSES)).group_by(Invoice.member_id)
+    if member_id is not None:
+        balances = balances.where(Invoice.member_id == member_id)
+    balances = balances.order_by(func.sum(Invoice.total_price).desc(), Invoice.member_id).limit(limit).subquery()
+
+    # Names are joined to the few rows that are left
+    rows = session.execute(
+        select(balances, Member.name).join(Member, Member.member_id == balances.c.member_id)
+        .order_by(balances.c.balance.desc(), balances.c.member_id)
+    ).all()
+    return [{
+        'member_id': row.member_id,
+        'name': row.name,
+        'balance': round(row.balance, 2),
+        'unpaid_invoices': row.unpaid_invoices,
+        'oldest_due_date': row.oldest_due_date.strftime('%Y-%m-%d') if row.oldest_due_date else None
+    } for row in rows]
+
+
 @_execute_transaction
 def get_next_room_id(session: Session) -> int:
-    """Helper to determine the next available room_id."""
-    max_id = session.query(func.max(Room.room_id)).scalar()
-    return (max_id or 0) + 1
+    """Helper to reserve the next room_id from the room_room_id_seq sequence."""
+    return allocate_ids(session, Room, 1)[0]
 
 @_execute_transaction
 def add_room(session: Session, room_type: str, capacity: int, current_status: str, admin_id: int) -> Optional[int]:
@@ -477,66 +627,70 @@ def add_room(session: Session, room_type: str, capacity: int, current_status: st
     Adds a new room to the database.
     Fixes the 'unexpected keyword argument room_type' error by including 'room_type' in the signature.
     """
+    # room_id is assigned by the room_room_id_seq sequence
+    new_room = Room(
+        room_id=None,
+        admin_id=admin_id,
+        room_type=room_type,
+        capacity=capacity,
+        current_status=current_status
+    )
+    session.add(new_room)
+    # Flush to get the generated ID; integrity errors are logged and rolled back by the decorator
+    session.flush()
+    bump_reference_data_version(session)
+    invalidate_admin_dashboards()
+    print(f"Success: Room {room_type} (ID: {new_room.room_id}) added by Admin {admin_id}.")
+    return new_room.room_id
+
+def get_all_rooms(limit: Optional[int] = None, after: Optional[str] = None, with_total: bool = False) -> Page:
+    """
+    Retrieves rooms ordered by ID: all of them, or one page when a limit is given.
+    Served from the in-process reference data; the database is only asked whether it is still current.
+    """
     try:
-        new_room_id = get_next_room_id()
-        
-        new_room = Room(
-            room_id=new_room_id,
-            admin_id=admin_id,
-            room_type=room_type,
-            capacity=capacity,
-            current_status=current_status
-        )
-        session.add(new_room)
-        print(f"Success: Room {room_type} (ID: {new_room_id}) added by Admin {admin_id}.")
-        # Commit handled by decorator, but explicit log here
-        return new_room_id
-    except IntegrityError as e:
-        # Error logging and rollback are handled by decorator, but explicit log here
-        print(f"Integrity Error adding room: {e}")
-        return None
-
-def get_all_rooms() -> List[Dict[str, Any]]:
-    """Retrieves a list of all rooms. Does not need _execute_transaction as it's a read."""
-    session = SessionLocal()
-    try:
-        rooms = session.query(Room).all()
-        rooms_data = [{
-            "room_id": r.room_id,
-            "name": r.room_type, # Using room_type as the display name
-            "capacity": r.capacity,
-            "status": r.current_status, # Using current_status as the display status
-            "admin_id": r.admin_id
-        } for r in rooms]
+        with session_scope() as session:
+            rooms = slice_page(reference_data.rooms(session), lambda r: (r['room_id'],), limit, after, with_total)
+        rooms_data = Page([{
+            "room_id": r['room_id'],
+            "name": r['room_type'], # Using room_type as the display name
+            "room_type": r['room_type'],
+            "capacity": r['capacity'],
+            "status": r['current_status'], # Using current_status as the display status
+            "admin_id": r['admin_id']
+        } for r in rooms], rooms.next_after, rooms.estimated_total)
         print(f"Successfully retrieved {len(rooms_data)} rooms.")
         return rooms_data
     except Exception as e:
         print(f"Error retrieving all rooms: {e}")
-        return []
-    finally:
-        session.close()
+        return Page()
 
-@_execute_transaction
-def get_all_trainers(session: Session) -> List[Dict[str, Any]]:
-    """Fetches all trainers with their ID and Name."""
+def get_all_trainers(limit: Optional[int] = None, after: Optional[str] = None, with_total: bool = False) -> Page:
+    """
+    Fetches trainers (ID and Name) ordered by ID: all of them, or one page when a limit is given.
+    Served from the in-process reference data; the database is only asked whether it is still current.
+    """
     try:
-        # Fetching trainer_id and name
-        trainers = session.query(Trainer).all()
-        return [{
-            'trainer_id': t.trainer_id, 
-            'name': t.name
-        } for t in trainers]
+        with session_scope() as session:
+            trainers = slice_page(reference_data.trainers(session), lambda t: (t['trainer_id'],), limit, after, with_total)
+        return Page([dict(t) for t in trainers], trainers.next_after, trainers.estimated_total)
     except Exception as e:
         print(f"Error fetching all trainers: {e}")
-        return []
+        return Page()
 
-@_execute_transaction
-def get_all_classes(session: Session) -> List[Classes]:
+@_read_transaction
+def get_all_classes(session: Session, limit: Optional[int] = None, after: Optional[str] = None, with_total: bool = False) -> Page:
+    """Fetches classes, latest start time first: all of them, or one page when a limit is given."""
     try:
-        classes = session.query(Classes).options(
-            joinedload(Classes.room),
-            joinedload(Classes.trainer) 
-        ).all()
+        classes_query = session.query(Classes)
+        classes = keyset_page(
+            classes_query.options(joinedload(Classes.room), joinedload(Classes.trainer)),
+            [Classes.start_time, Classes.class_id],
+            lambda c: (c.start_time, c.class_id),
+            limit, after, descending=True
+        )
+        if with_total:
+            classes.estimated_total = estimate_count(session, classes_query)
         
         # This loop forces the data to be loaded before the session closes
         for c in classes:
@@ -549,7 +703,7 @@ def get_all_classes(session: Session) -> List[Classes]:
         
     except Exception as e:
         print(f"Error fetching all classes: {e}")
-        return []
+        return Page()
 
 @_execute_transaction
 def update_room(session: Session, room_id: int, name: str, capacity: int, status: str, admin_id: int) -> bool:
@@ -565,6 +719,8 @@ def update_room(session: Session, room_id: int, name: str, capacity: int, status
         room.capacity = capacity
         room.current_status = status # Assuming 'status' from the flask route maps to 'current_status' in the model
         room.admin_id = admin_id # Record which admin updated it
+        bump_reference_data_version(session)
+        invalidate_admin_dashboards()
         print(f"Success: Room ID {room_id} updated by Admin {admin_id}.")
         return True
     except Exception as e:
@@ -582,35 +738,29 @@ def delete_room(session: Session, room_id: int) -> bool:
             return False
         
         session.delete(room)
+        bump_reference_data_version(session)
+        invalidate_admin_dashboards()
         print(f"Success: Room ID {room_id} deleted.")
         return True
     except Exception as e:
         print(f"Error deleting room {room_id}: {e}")
         return False
     
-def _check_for_conflict(session, class_id: int, trainer_id: int, room_id: int, start_time: datetime, end_time: datetime) -> Optional[str]:
+def _check_for_conflict(session, class_id: int, trainer_id: int, room_id: int, start_time: datetime, end_time: datetime,
+                        use_schedule_index: bool = False) -> Optional[str]:
     """
     Checks for scheduling conflicts with the proposed class time, excluding the class being updated.
     """
     
-    # Base filter to exclude the class being updated, and check the time window
-    base_filter = [
-        Classes.class_id != class_id, 
-        Classes.start_time < end_time,
-        Classes.end_time > start_time
-    ]
+    trainer_conflict, room_conflict = _find_booking_conflicts(
+        session, trainer_id, room_id, start_time, end_time, exclude_class_id=class_id, use_schedule_index=use_schedule_index
+    )
 
     # 1. Trainer Conflict Check
-    trainer_filter = base_filter + [Classes.trainer_id == trainer_id]
-    trainer_conflict = session.query(Classes).filter(and_(*trainer_filter)).first()
-
     if trainer_conflict:
         return f"Trainer ID {trainer_id} is busy during the requested time slot."
 
     # 2. Room Conflict Check
-    room_filter = base_filter + [Classes.room_id == room_id]
-    room_conflict = session.query(Classes).filter(and_(*room_filter)).first()
-
     if room_conflict:
         return f"Room ID {room_id} is occupied during the requested time slot."
 
@@ -632,6 +782,7 @@ def update_class(
         
         if not class_to_update:
             return f"Error: Class ID {class_id} not found."
+        previous_trainer_id = class_to_update.trainer_id
 
         # --- Determine Effective Values for Conflict Check ---
         
@@ -657,28 +808,40 @@ def update_class(
             return f"Update failed: {conflict_message}"
 
         # --- 2. Apply Updates to the Class Object ---
-        
-        # Update class type (if provided and not empty)
-        if class_type is not None and class_type.strip():
-            class_to_update.class_type = class_type
-            
-        # Update trainer/room IDs (if provided)
-        if trainer_id is not None:
-            class_to_update.trainer_id = trainer_id
-            
-        if room_id is not None:
-            class_to_update.room_id = room_id
-
-        # Update time/date fields (if start_time was provided)
-        if start_time is not None:
-            class_to_update.start_time = effective_start_time
-            class_to_update.end_time = effective_end_time
-            class_to_update.start_date = effective_start_time.date() # Update the separate date column
+        # Flushed inside a savepoint so a constraint violation only undoes this update
+        with session.begin_nested():
+            # Update class type (if provided and not empty)
+            if class_type is not None and class_type.strip():
+                class_to_update.class_type = class_type
+                
+            # Update trainer/room IDs (if provided)
+            if trainer_id is not None:
+                class_to_update.trainer_id = trainer_id
+                
+            if room_id is not None:
+                class_to_update.room_id = room_id
+
+            # Update time/date fields (if start_time was provided)
+            if start_time is not None:
+                class_to_update.start_time = effective_start_time
+                class_to_update.end_time = effective_end_time
+                class_to_update.start_date = effective_start_time.date() # Update the separate date column
+
+        booking = _booking_of(class_to_update)
+        run_after_commit(lambda: schedule_index.put(booking))
+        bump_stamps(session, CLASSES, trainer_stamp(previous_trainer_id), trainer_stamp(class_to_update.trainer_id))
+        # Enrolled members see the class on their dashboards
+        invalidate_member_dashboard()
+        invalidate_class_catalogue()
+        invalidate_admin_dashboards()
 
         # The decorator handles session.commit()
         return "Class updated successfully!"
 
-    except IntegrityError:
+    except IntegrityError as e:
+        if _is_booking_conflict(e):
+            # Another admin booked the trainer or room between the conflict check and this update
+            return "Update failed: The trainer or room was just booked for an overlapping time slot."
         return "Update failed: The specified Trainer or Room ID does not exist."
     except Exception as e:
         print(f"Error updating class {class_id}: {e}")
@@ -713,6 +876,10 @@ def delete_class(session: Session, class_id: int) -> str:
             return f"Error: Class ID {class_id} not found for deletion."
         
         session.delete(class_to_delete)
+        run_after_commit(lambda: schedule_index.remove(class_id))
+        bump_stamps(session, CLASSES, trainer_stamp(class_to_delete.trainer_id))
+        invalidate_class_catalogue()
+        invalidate_admin_dashboards()
         
         # The decorator handles session.commit()
         return f"Class ID {class_id} deleted successfully."
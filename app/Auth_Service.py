@@ -0,0 +1,57 @@
+from app.Session_Manager import read_transaction as _read_transaction
+from app.Cache import TTLCache
+from models.member import Member
+from models.admin import Admin
+from models.trainer import Trainer
+from hashlib import sha256
+from typing import Optional, Tuple
+from sqlalchemy import select, literal, union_all
+from sqlalchemy.orm import Session
+
+# Failed (email, password) pairs are remembered briefly so repeated bad logins skip the database.
+_failed_logins = TTLCache(ttl_seconds=30, max_entries=10000)
+
+
+def _failed_login_key(email: str, password: str) -> Tuple[str, str]:
+    # Never keep plain-text passwords in memory; a digest is enough to recognise a repeat.
+    return (email, sha256((password or '').encode('utf-8')).hexdigest())
+
+
+def forget_failed_logins(email: str):
+    """Drops cached failures for an email (called when an account is created or its password changes)."""
+    _failed_logins.invalidate_where(lambda key: key[0] == email)
+
+
+@_read_transaction
+def resolve_login(session: Session, email: str, password: str) -> Optional[Tuple[str, int]]:
+    """
+    Finds which account (member, admin or trainer) the credentials belong to in one query.
+    Returns (role, user_id) on success, or None on failure.
+    When the same email is used by several roles, member wins over admin, and admin over trainer.
+    """
+    key = _failed_login_key(email, password)
+    if _failed_logins.get(key):
+        print("Error: Invalid email or password.")
+        return None
+
+    # One indexed email lookup per account table, combined into a single round trip
+    accounts = union_all(
+        select(literal('member').label('role'), Member.member_id.label('user_id'), literal(1).label('priority'))
+            .where(Member.email == email, Member.password == password),
+        select(literal('admin').label('role'), Admin.admin_id.label('user_id'), literal(2).label('priority'))
+            .where(Admin.email == email, Admin.password == password),
+        select(literal('trainer').label('role'), Trainer.trainer_id.label('user_id'), literal(3).label('priority'))
+            .where(Trainer.email == email, Trainer.password == password),
+    ).subquery()
+
+    match = session.execute(
+        select(accounts.c.role, accounts.c.user_id).order_by(accounts.c.priority).limit(1)
+    ).first()
+
+    if match is None:
+        _failed_logins.set(key, True)
+        print("Error: Invalid email or password.")
+        return None
+
+    print(f"Success: {match.role.capitalize()} {match.user_id} logged in.")
+    return match.role, match.user_id
@@ -0,0 +1,185 @@
+from app.Session_Manager import execute_transaction as _execute_transaction, separate_session_scope
+from app.Admin_Service import INVOICE_DUE_DAYS, invalidate_admin_dashboards
+from app.Change_Stamps import member_stamp, bump_stamps
+from models.billing_run import Billing_run
+from models.member import Member
+from models.invoice import Invoice
+from datetime import datetime, date, timedelta
+from time import perf_counter
+from typing import Optional, Dict, Any
+from sqlalchemy import func, select, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+MEMBERSHIP_PRICE_TYPE = 'Monthly Membership'
+
+# Members billed per INSERT ... SELECT; each chunk commits with the run's progress, so a stopped run loses at most one
+BILLING_CHUNK_MEMBERS = 5000
+
+
+def month_start(day: date) -> date:
+    """First day of the month containing day (the period a billing run bills)."""
+    return day.replace(day=1)
+
+
+@_execute_transaction
+def start_billing_run(session: Session, period: date, admin_id: int, total_price: float, payment_method: str,
+                      price_type: str = MEMBERSHIP_PRICE_TYPE) -> Optional[int]:
+    """
+    Returns the ID of the billing run for the month of period and price_type, creating it if there is none.
+    Starting a period twice returns the existing run, so it is resumed instead of billed again.
+    """
+    period_start = month_start(period)
+    issue_date = datetime.combine(period_start, datetime.min.time())
+    run_id = session.scalar(
+        insert(Billing_run).values(
+            admin_id=admin_id,
+            period_start=period_start,
+            price_type=price_type,
+            total_price=total_price,
+            payment_method=payment_method,
+            issue_date=issue_date,
+            due_date=issue_date + timedelta(days=INVOICE_DUE_DAYS),
+            status='Running',
+            last_member_id=0,
+            members_scanned=0,
+            invoices_created=0,
+            started_at=datetime.now()
+        ).on_conflict_do_nothing(constraint='uq_billing_run_period').returning(Billing_run.run_id)
+    )
+    if run_id is None:
+        run_id = session.scalar(select(Billing_run.run_id).where(
+            Billing_run.period_start == period_start, Billing_run.price_type == price_type
+        ))
+        print(f"Billing run {run_id} for {period_start} ({price_type}) already exists; resuming it.")
+    return run_id
+
+
+def _bill_next_chunk(session: Session, run_id: int, chunk_members: int) -> Optional[int]:
+    """
+    Bills the next chunk_members members after the run's cursor with one INSERT ... SELECT and moves the cursor.
+    Returns the number of invoices created, or None once every member has been billed (or the run is unknown).
+    """
+    # Locking the run row serializes concurrent attempts at the same run
+    run = session.get(Billing_run, run_id, with_for_update=True)
+    if run is None or run.status == 'Completed':
+        return None
+
+    chunk = select(Member.member_id).where(Member.member_id > run.last_member_id).order_by(
+        Member.member_id
+    ).limit(chunk_members).subquery()
+    upper, scanned = session.execute(select(func.max(chunk.c.member_id), func.count())).one()
+    if upper is None:
+        run.status = 'Completed'
+        run.finished_at = datetime.now()
+        return None
+
+    members = select(
+        Member.member_id,
+        literal(run.admin_id),
+        literal(run.payment_method),
+        literal('Pending'),
+        literal(run.price_type),
+        literal(run.total_price),
+        literal(run.issue_date),
+        literal(run.due_date),
+        literal(run.period_start),
+        literal(run.run_id)
+    ).where(Member.member_id > run.last_member_id, Member.member_id <= upper)
+    # Members already billed for this period (by an earlier attempt) are skipped on the idempotency key
+    billed = session.scalars(
+        insert(Invoice).from_select(
+            ['member_id', 'admin_id', 'payment_method', 'status', 'price_type', 'total_price', 'issue_date',
+             'due_date', 'billing_period', 'billing_run_id'],
+            members
+        ).on_conflict_do_nothing(constraint='uq_invoice_member_billing_period').returning(Invoice.member_id)
+    ).all()
+
+    run.last_member_id = upper
+    run.members_scanned += scanned
+    run.invoices_created += len(billed)
+    if billed:
+        bump_stamps(session, *[member_stamp(member_id) for member_id in billed])
+    return len(billed)
+
+
+def run_billing(run_id: int, chunk_members: int = BILLING_CHUNK_MEMBERS) -> Optional[Dict[str, Any]]:
+    """
+    Bills every member not yet billed by the run, a chunk per transaction, and reports the run's totals and
+    this call's throughput. Safe to call again after a failure or on a finished run: it continues from the
+    run's cursor, and no member is billed twice for the same period.
+    """
+    started = perf_counter()
+    created = 0
+    try:
+        while True:
+            with separate_session_scope() as session:
+                chunk_created = _bill_next_chunk(session, run_id, chunk_members)
+                if chunk_created:
+                    invalidate_admin_dashboards()
+            if chunk_created is None:
+                break
+            created += chunk_created
+            print(f"Billing run {run_id}: {created} invoices created so far.")
+    except Exception as e:
+        print(f"Error: Billing run {run_id} stopped; run it again to resume. Details: {e}")
+        return None
+
+    seconds = perf_counter() - started
+    with separate_session_scope() as session:
+        run = session.get(Billing_run, run_id)
+        if run is None:
+            print(f"Error: Billing run {run_id} not found.")
+            return None
+        report = {
+            'run_id': run.run_id,
+            'period_start': run.period_start.isoformat(),
+            'price_type': run.price_type,
+            'status': run.status,
+            'members_scanned': run.members_scanned,
+            'invoices_created': run.invoices_created,
+            'created_this_call': created,
+            'seconds': round(seconds, 3),
+            'invoices_per_second': round(created / seconds, 1) if seconds > 0 else None
+        }
+    print(f"Success: Billing run {run_id} {report['status']}: {created} invoices in {report['seconds']}s "
+          f"({report['invoices_per_second']}/s).")
+    return report
+
+
+def run_monthly_billing(period: date, admin_id: int, total_price: float, payment_method: str,
+                        price_type: str = MEMBERSHIP_PRICE_TYPE) -> Optional[Dict[str, Any]]:
+    """Starts (or resumes) the billing run of the month containing period and bills every member for it."""
+    # The run must be committed before its chunks, which use their own sessions, can see it
+    with separate_session_scope():
+        run_id = start_billing_run(
+            period=period, admin_id=admin_id, total_price=total_price, payment_method=payment_method, price_type=price_type
+        )
+    if run_id is None:
+        return None
+    return run_billing(run_id)
+
+
+if __name__ == "__main__":
+    # e.g. python -m app.Billing_Service 2026-11 --admin-id 1 --price 50 --payment-method "Credit Card"
+    #      python -m app.Billing_Service --resume 7
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bill every member for one month.")
+    parser.add_argument('period', nargs='?', help="month to bill, YYYY-MM")
+    parser.add_argument('--admin-id', type=int)
+    parser.add_argument('--price', type=float)
+    parser.add_argument('--payment-method', default='Credit Card')
+    parser.add_argument('--price-type', default=MEMBERSHIP_PRICE_TYPE)
+    parser.add_argument('--resume', type=int, metavar='RUN_ID', help="continue an existing run")
+    args = parser.parse_args()
+
+    if args.resume is not None:
+        result = run_billing(args.resume)
+    elif args.period and args.admin_id is not None and args.price is not None:
+        result = run_monthly_billing(
+            datetime.strptime(args.period, '%Y-%m').date(), args.admin_id, args.price, args.payment_method, args.price_type
+        )
+    else:
+        parser.error("give a period with --admin-id and --price, or --resume RUN_ID")
+    raise SystemExit(0 if result else 1)
@@ -0,0 +1,62 @@
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache. Entries expire after ttl_seconds, and the oldest
+    entries are evicted once max_entries is reached.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries = {}  # key -> (expires_at, value), in insertion order
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        expires_at = monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = (expires_at, value)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drops every entry whose key matches the predicate."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        # Drop expired entries first; if that frees nothing, drop the oldest one.
+        now = monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
@@ -0,0 +1,76 @@
+from models.base import SessionLocal
+from app.Session_Manager import session_scope
+from models.data_version import Data_version
+from hashlib import sha1
+from time import time
+import json
+from typing import Any, Dict, Iterable
+from sqlalchemy import select, event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+# Stamp names, one data_version row each. A page's ETag is derived from the stamps of what it shows,
+# so a client that already holds the current version gets a 304 without the page being rebuilt.
+CLASSES = 'classes'  # any class scheduled, moved or deleted
+
+
+def member_stamp(member_id: int) -> str:
+    """Enrollments, metrics, goals, profile and invoices of one member."""
+    return f"member:{member_id}"
+
+
+def trainer_stamp(trainer_id: int) -> str:
+    """Classes taught by and availability of one trainer."""
+    return f"trainer:{trainer_id}"
+
+
+def bump_stamps(session: Session, *names: str):
+    """
+    Marks the named stamps as changed by the current unit of work. The counters are incremented in one
+    statement just before it commits, in a fixed order, so concurrent writers never deadlock on them
+    and hold their row locks only for the commit itself.
+    """
+    session.info.setdefault('changed_stamps', set()).update(names)
+
+
+def read_stamps(session: Session, names: Iterable[str]) -> Dict[str, int]:
+    """Current value of each named stamp in one query (0 for a stamp that was never bumped)."""
+    names = sorted(set(names))
+    stamps = dict.fromkeys(names, 0)
+    stamps.update(session.execute(
+        select(Data_version.name, Data_version.version).where(Data_version.name.in_(names))
+    ).all())
+    return stamps
+
+
+def stamp_etag(names: Iterable[str], *extra: Any, fresh_for_seconds: float = 0) -> str:
+    """
+    ETag for a response built from the data behind the named stamps (plus any extra inputs, e.g. query
+    parameters). Pages that hide classes once they start also pass fresh_for_seconds, which makes the
+    tag roll over at least that often even when no stamp moved.
+    """
+    with session_scope() as session:
+        stamps = read_stamps(session, names)
+    if fresh_for_seconds:
+        extra += (int(time() // fresh_for_seconds),)
+    return sha1(json.dumps([stamps, extra], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+@event.listens_for(SessionLocal, 'before_commit')
+def _flush_changed_stamps(session: Session):
+    # Also fired when a SAVEPOINT is released; the stamps wait for the outermost commit
+    if session.in_nested_transaction():
+        return
+    names = session.info.pop('changed_stamps', None)
+    if names:
+        session.execute(
+            insert(Data_version).values([{'name': name, 'version': 1} for name in sorted(names)])
+            .on_conflict_do_update(index_elements=[Data_version.name], set_={'version': Data_version.version + 1})
+        )
+
+
+@event.listens_for(SessionLocal, 'after_transaction_end')
+def _discard_changed_stamps(session: Session, transaction):
+    # Reached after the outermost transaction ends; anything still pending was rolled back.
+    if transaction.parent is None:
+        session.info.pop('changed_stamps', None)
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks `threshold` points of the series (x ascending) that preserve its
+    visual shape, always keeping the first and the last one. Returns their indices, ascending.
+
+    The interior points are split into threshold - 2 buckets. In each bucket the point forming the
+    largest triangle with the previously selected point and the mean of the next bucket is kept.
+    Bucket means come from cumulative sums and each bucket's areas are computed as one array
+    operation, so the only Python-level loop runs once per output point.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 1)])
+
+    # Bucket i covers [edges[i], edges[i + 1]); the step is >= 1, so no bucket is empty
+    edges = 1 + (np.arange(threshold - 1, dtype=np.int64) * (n - 2)) // (threshold - 2)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Mean point of every bucket; the last bucket looks ahead to the final point instead
+    sum_x = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y, dtype=np.float64)))
+    sizes = ends - starts
+    next_x = np.append(((sum_x[ends] - sum_x[starts]) / sizes)[1:], x[-1])
+    next_y = np.append(((sum_y[ends] - sum_y[starts]) / sizes)[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        s, e = starts[i], ends[i]
+        # Twice the triangle area (the factor does not change which point is largest)
+        areas = np.abs((x[a] - next_x[i]) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (next_y[i] - y[a]))
+        a = s + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
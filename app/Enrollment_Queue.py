@@ -0,0 +1,137 @@
+from app.Session_Manager import session_scope
+from app.Cache import TTLCache
+from app.Member_Service import enroll_in_class, EnrollmentResult
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Deque, Dict, List
+
+
+class _Ticket:
+    """One member waiting for a seat in a class."""
+
+    def __init__(self, member_id: int):
+        self.member_id = member_id
+        self.done = Event()
+        self.taken = False  # set once a worker has picked it up; it can no longer be withdrawn
+        self.result = None
+
+
+class EnrollmentQueue:
+    """
+    Admission layer in front of enroll_in_class for bursts on popular classes.
+
+    Requests for the same class wait in one queue and a worker applies them in batches of
+    batch_size, each batch in a single transaction, so at most one connection per class (and
+    max_workers in total) is busy with enrollments however many requests arrive at once.
+    Classes with waiting requests take turns, one batch each. Callers wait at most
+    max_wait_seconds for their turn, and as long again for a batch they are in to commit. Once a class reports full, further
+    requests for it are refused immediately for full_ttl_seconds, or until a cancellation frees a seat.
+    """
+
+    def __init__(self, batch_size: int = 20, max_workers: int = 2, max_wait_seconds: float = 5, full_ttl_seconds: float = 15):
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='enrollment')
+        self._lock = Lock()
+        self._queues: Dict[int, Deque[_Ticket]] = {}  # only classes with a worker scheduled are present
+        self._full_classes = TTLCache(ttl_seconds=full_ttl_seconds, max_entries=10000)
+
+    def enroll(self, member_id: int, class_id: int) -> EnrollmentResult:
+        """Queues the enrollment and waits for its outcome (or for max_wait_seconds)."""
+        if self._full_classes.get(class_id):
+            return self._full(class_id)
+
+        ticket = _Ticket(member_id)
+        with self._lock:
+            queue = self._queues.get(class_id)
+            if queue is None:
+                queue = self._queues[class_id] = deque()
+                self._executor.submit(self._drain, class_id)
+            queue.append(ticket)
+
+        if not ticket.done.wait(self.max_wait_seconds):
+            with self._lock:
+                # A drained queue is gone from _queues; a ticket no longer in it has been picked up or rejected
+                queue = self._queues.get(class_id)
+                if not ticket.taken and queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    print(f"Error: Enrollment of member {member_id} in class {class_id} timed out in the queue.")
+                    return EnrollmentResult(False, 'busy', "The class is very busy right now, please try again.")
+            # Already inside a batch (or just rejected): wait for it to commit, but not forever
+            if not ticket.done.wait(self.max_wait_seconds):
+                print(f"Error: Enrollment of member {member_id} in class {class_id} is still being applied.")
+                return EnrollmentResult(
+                    False, 'pending',
+                    "Your enrollment is still being processed. Check your schedule in a moment before trying again."
+                )
+        return ticket.result
+
+    def forget_full(self, class_id: int):
+        """Lets requests through again after a seat was freed (e.g. by a cancellation)."""
+        self._full_classes.invalidate(class_id)
+
+    def _drain(self, class_id: int):
+        # One batch per turn, then back of the executor queue: busy classes cannot hold every worker
+        # while another class's requests wait for theirs.
+        with self._lock:
+            queue = self._queues[class_id]
+            batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+            for ticket in batch:
+                ticket.taken = True
+        try:
+            if batch:
+                self._apply(class_id, batch)
+        finally:
+            with self._lock:
+                if self._queues[class_id]:
+                    self._executor.submit(self._drain, class_id)
+                else:
+                    del self._queues[class_id]
+
+    def _apply(self, class_id: int, batch: List[_Ticket]):
+        results = []
+        try:
+            # One transaction per batch; each enrollment runs in its own SAVEPOINT inside it.
+            with session_scope():
+                for ticket in batch:
+                    if self._full_classes.get(class_id):
+                        results.append(self._full(class_id))
+                        continue
+                    result = enroll_in_class(member_id=ticket.member_id, class_id=class_id)
+                    if result is None:
+                        result = EnrollmentResult(False, 'error', "Enrollment failed, please try again.")
+                    elif result.reason == 'class_full':
+                        self._full_classes.set(class_id, True)
+                    results.append(result)
+        except Exception as e:
+            print(f"Error: Enrollment batch for class {class_id} failed. Details: {e}")
+            results = [EnrollmentResult(False, 'error', "Enrollment failed, please try again.")] * len(batch)
+
+        # Outcomes are only published once the batch has committed
+        for ticket, result in zip(batch, results):
+            ticket.result = result
+            ticket.done.set()
+
+        if self._full_classes.get(class_id):
+            self._reject_waiting(class_id)
+
+    def _reject_waiting(self, class_id: int):
+        with self._lock:
+            queue = self._queues.get(class_id)
+            waiting = list(queue) if queue else []
+            if queue:
+                queue.clear()
+            for ticket in waiting:
+                ticket.taken = True
+        for ticket in waiting:
+            ticket.result = self._full(class_id)
+            ticket.done.set()
+
+    @staticmethod
+    def _full(class_id: int) -> EnrollmentResult:
+        return EnrollmentResult(False, 'class_full', f"Class {class_id} is already full.")
+
+
+# Shared by every request handled by this process
+enrollment_queue = EnrollmentQueue()
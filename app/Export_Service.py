@@ -0,0 +1,110 @@
+from app.Session_Manager import session_scope
+from models.invoice import Invoice
+from models.class_enrollment import Class_enrollment
+from models.classes import Classes
+from models.metric import Metric
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator, Optional
+from sqlalchemy import select
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Rows fetched from the server-side cursor (and sent to the client) at a time
+_EXPORT_BATCH_ROWS = 5000
+
+
+def _invoices():
+    return select(
+        Invoice.invoice_id, Invoice.member_id, Invoice.admin_id, Invoice.price_type, Invoice.payment_method,
+        Invoice.status, Invoice.total_price, Invoice.issue_date, Invoice.due_date
+    ).order_by(Invoice.invoice_id), Invoice.member_id, Invoice.issue_date
+
+
+def _enrollments():
+    return select(
+        Class_enrollment.member_id, Class_enrollment.class_id, Classes.class_type, Classes.trainer_id,
+        Classes.start_time, Class_enrollment.enrollment_date
+    ).join(Classes, Classes.class_id == Class_enrollment.class_id).order_by(
+        Class_enrollment.member_id, Class_enrollment.class_id
+    ), Class_enrollment.member_id, Class_enrollment.enrollment_date
+
+
+def _metrics():
+    return select(
+        Metric.metric_id, Metric.member_id, Metric.device_id, Metric.record_date, Metric.weight, Metric.height,
+        Metric.heart_rate
+    ).order_by(Metric.metric_id), Metric.member_id, Metric.record_date
+
+
+# Dataset name -> builder of (statement ordered by a primary key, member column, date column used for filtering).
+# Ordering by an indexed key lets PostgreSQL stream rows as it reads them instead of sorting the whole table first.
+EXPORT_DATASETS = {
+    'invoices': _invoices,
+    'enrollments': _enrollments,
+    'metrics': _metrics,
+}
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def stream_export(
+    dataset: str,
+    fmt: str,
+    member_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> Iterator[str]:
+    """
+    Yields an export of one dataset (see EXPORT_DATASETS) as CSV or JSON Lines, a batch of rows at a time,
+    optionally limited to one member and to dates between start_date and end_date (inclusive).
+
+    Rows come from a server-side cursor as plain tuples, so memory use does not grow with the size of the
+    export, and the response starts before the query has returned anything.
+    The export runs in its own session, since a streamed response outlives the request's unit of work.
+    """
+    statement, member_column, date_column = EXPORT_DATASETS[dataset]()
+    if member_id is not None:
+        statement = statement.where(member_column == member_id)
+    if start_date is not None:
+        statement = statement.where(date_column >= start_date)
+    if end_date is not None:
+        statement = statement.where(date_column < end_date + timedelta(days=1))
+    columns = [c.name for c in statement.selected_columns]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    # Sent before the query runs, so the response starts at once (JSON Lines has no header: an empty chunk)
+    if fmt == 'csv':
+        writer.writerow(columns)
+    yield drain()
+
+    exported = 0
+    with session_scope() as session:
+        result = session.execute(statement, execution_options={'yield_per': _EXPORT_BATCH_ROWS})
+        for rows in result.partitions():
+            for row in rows:
+                if fmt == 'csv':
+                    writer.writerow([_plain(value) for value in row])
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, map(_plain, row)))))
+                    buffer.write('\n')
+            exported += len(rows)
+            yield drain()
+    print(f"Success: Exported {exported} {dataset} rows as {fmt}.")
+
+
+def export_filename(dataset: str, fmt: str) -> str:
+    """Download name of an export, e.g. invoices-20260101.csv."""
+    return f"{dataset}-{date.today():%Y%m%d}.{fmt}"
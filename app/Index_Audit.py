@@ -0,0 +1,292 @@
+import io
+import re
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from models.base import Base, engine
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from sqlalchemy import Column, Index, event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex
+
+# A foreign key or service query without an index is only reported once scanning its table costs more
+# than this (about ten thousand rows); below that a sequential scan is as cheap as an index lookup.
+# Indexes declared on the models are always reported when missing.
+MIN_SEQ_SCAN_COST = 1000
+
+# Every index on the live database: table, index name, key columns in order (None for an expression),
+# and whether it is partial. Only valid indexes count (a failed CREATE INDEX CONCURRENTLY leaves an invalid one).
+_LIVE_INDEXES_SQL = text("""
+    SELECT t.relname AS table_name, i.relname AS index_name, x.indpred IS NOT NULL AS partial,
+           ARRAY(
+               SELECT a.attname
+               FROM unnest(x.indkey[0:x.indnkeyatts - 1]) WITH ORDINALITY AS k(attnum, position)
+               LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+               ORDER BY k.position
+           ) AS key_columns
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = current_schema() AND x.indisvalid
+""")
+
+# Size of each table and how often it has been read by sequential scan since statistics were last reset
+_TABLE_STATS_SQL = text("""
+    SELECT c.relname AS table_name, GREATEST(c.reltuples, 0) AS row_estimate, c.relpages AS pages,
+           COALESCE(s.seq_scan, 0) AS seq_scans, COALESCE(s.seq_tup_read, 0) AS seq_rows_read
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')
+""")
+
+
+def create_index_sql(index: Index) -> str:
+    """CREATE INDEX CONCURRENTLY statement for an index declared on a model (builds it without blocking writes)."""
+    sql = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    return sql.replace(' INDEX ', ' INDEX CONCURRENTLY ', 1) + ';'
+
+
+def expected_access_paths() -> List[Dict[str, Any]]:
+    """
+    The lookups the services rely on, read from models/: every index declared on a model (the hot-path
+    queries each one serves are noted next to it), plus the columns of every foreign key, which the
+    services join and filter on.
+    """
+    paths = []
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            columns = tuple(e.name if isinstance(e, Column) else None for e in index.expressions)
+            paths.append({
+                'table': table.name,
+                'columns': columns,
+                'index': index.name,
+                'partial': index.dialect_options['postgresql'].get('where') is not None,
+                'reason': f"index {index.name} declared on the model",
+                'fix': create_index_sql(index)
+            })
+        for fk in sorted(table.foreign_key_constraints, key=lambda c: [col.name for col in c.columns]):
+            columns = tuple(col.name for col in fk.columns)
+            paths.append({
+                'table': table.name,
+                'columns': columns,
+                'index': None,
+                'partial': False,
+                'reason': f"foreign key to {fk.referred_table.name}",
+                'fix': f"CREATE INDEX CONCURRENTLY idx_{table.name}_{'_'.join(columns)} ON {table.name} ({', '.join(columns)});"
+            })
+    return paths
+
+
+def _covered(path: Dict[str, Any], live: List[Tuple[str, bool, Tuple[str, ...]]]) -> bool:
+    # A declared index is present under its own name, or as a full (non-partial) index whose leading key
+    # columns are the wanted ones; a partial one only ever stands in for itself.
+    for name, partial, key_columns in live:
+        if name == path['index']:
+            return True
+        if not path['partial'] and not partial and None not in path['columns'] \
+                and key_columns[:len(path['columns'])] == path['columns']:
+            return True
+    return False
+
+
+def audit_indexes(connection: Connection, paths: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Compares the live schema with paths (default: expected_access_paths()) and returns the ones no index
+    serves, costliest first; a table and columns wanted by several paths are reported once. Each one comes
+    with the planner's estimated cost of the sequential scan that every such lookup does today (same
+    formula as the planner, from the table's current size and cost settings), the number of sequential
+    scans the table has had, and the CREATE INDEX statement that fixes it.
+    """
+    live: Dict[str, List[Tuple[str, bool, Tuple[str, ...]]]] = {}
+    for row in connection.execute(_LIVE_INDEXES_SQL):
+        live.setdefault(row.table_name, []).append((row.index_name, row.partial, tuple(row.key_columns)))
+    stats = {row.table_name: row for row in connection.execute(_TABLE_STATS_SQL)}
+    seq_page_cost, cpu_tuple_cost, cpu_operator_cost = (
+        float(connection.execute(text(f"SHOW {setting}")).scalar())
+        for setting in ('seq_page_cost', 'cpu_tuple_cost', 'cpu_operator_cost')
+    )
+
+    missing = []
+    reported = set()
+    for path in expected_access_paths() if paths is None else paths:
+        table = stats.get(path['table'])
+        if table is None or (path['table'], path['columns']) in reported or _covered(path, live.get(path['table'], [])):
+            continue
+        columns = [c for c in path['columns'] if c is not None]
+        seq_scan_cost = table.pages * seq_page_cost + table.row_estimate * (cpu_tuple_cost + cpu_operator_cost * len(columns))
+        if path['index'] is None and seq_scan_cost < MIN_SEQ_SCAN_COST:
+            continue
+        reported.add((path['table'], path['columns']))
+        missing.append({
+            'table': path['table'],
+            'columns': columns,
+            'reason': path['reason'],
+            'rows': int(table.row_estimate),
+            'seq_scan_cost': round(seq_scan_cost, 1),
+            'seq_scans': table.seq_scans,
+            'seq_rows_read': table.seq_rows_read,
+            'fix': path['fix']
+        })
+    missing.sort(key=lambda m: m['seq_scan_cost'], reverse=True)
+    return missing
+
+
+def _service_hot_paths() -> List[Tuple[str, Callable[[Dict[str, int]], Any]]]:
+    """The read-side hot paths, by name, each as a call of the service function that serves it (given sample ids)."""
+    # Imported here: the services import the models, and db_migrate imports this module before the app exists
+    from app import Admin_Service, Auth_Service, Member_Service, Revenue_Service, Trainer_Service
+
+    today = date.today()
+    month_ago = today - timedelta(days=30)
+    return [
+        ('login', lambda ids: Auth_Service.resolve_login('index-audit@example.invalid', '')),
+        ('member dashboard', lambda ids: Member_Service._load_member_dashboard_data(ids['member'])),
+        ('member profile', lambda ids: Member_Service.get_profile(ids['member'])),
+        ('class catalogue', lambda ids: Member_Service._load_class_catalogue()),
+        ('available classes', lambda ids: Member_Service.get_available_classes(ids['member'], limit=20)),
+        ('metric history', lambda ids: Member_Service.get_metric_history(ids['member'], month_ago, today)),
+        ('metric trend', lambda ids: Member_Service.get_metric_trend(ids['member'], 'week', month_ago, today)),
+        ('trainer board', lambda ids: Trainer_Service.get_trainer_board(ids['trainer'])),
+        ('trainer schedule', lambda ids: Trainer_Service.view_trainer_schedule(ids['trainer'], month_ago, today, limit=20)),
+        ('admin dashboard', lambda ids: Admin_Service._build_admin_dashboard_data(ids['admin'])),
+        ('class list', lambda ids: Admin_Service.get_all_classes(limit=20)),
+        ('class conflict check', lambda ids: Admin_Service.check_class_conflict(
+            ids['room'], ids['trainer'], datetime.combine(today + timedelta(days=1), datetime.min.time()).replace(hour=9))),
+        ('available trainers', lambda ids: Admin_Service.get_available_trainers_for_timeslot(
+            (today + timedelta(days=1)).isoformat(), '09:00:00', '10:30:00')),
+        ('member invoices', lambda ids: Admin_Service.view_member_invoices(ids['member'], limit=20)),
+        ('outstanding balances', lambda ids: Admin_Service.get_outstanding_balances()),
+        ('revenue report', lambda ids: Revenue_Service.get_revenue_report(month_ago, today)),
+    ]
+
+
+class _AuditRollback(Exception):
+    """Raised to roll back the transaction the hot paths were run in."""
+
+
+def capture_service_queries() -> List[Tuple[str, str, Any]]:
+    """
+    Runs every service hot path once, in a read-only transaction that is rolled back, and returns the
+    statements they sent as (hot path, SQL, parameters), in order. The services' console output is discarded.
+    """
+    from app.Session_Manager import session_scope
+    from models.admin import Admin
+    from models.member import Member
+    from models.room import Room
+    from models.trainer import Trainer
+
+    captured: List[Tuple[str, str, Any]] = []
+    try:
+        with session_scope() as session:
+            session.execute(text("SET TRANSACTION READ ONLY"))
+            connection = session.connection()
+            # The lowest id of each kind, so lookups that check their id first go on to their main query
+            ids = {
+                name: session.query(column).order_by(column).limit(1).scalar() or 0
+                for name, column in (('member', Member.member_id), ('trainer', Trainer.trainer_id),
+                                     ('admin', Admin.admin_id), ('room', Room.room_id))
+            }
+            for name, run in _service_hot_paths():
+                def record(conn, cursor, statement, parameters, context, executemany):
+                    if conn is connection and not executemany:
+                        captured.append((name, statement, parameters))
+
+                event.listen(engine, 'before_cursor_execute', record)
+                try:
+                    with redirect_stdout(io.StringIO()):
+                        run(ids)
+                finally:
+                    event.remove(engine, 'before_cursor_execute', record)
+            raise _AuditRollback()
+    except _AuditRollback:
+        pass
+    return captured
+
+
+def _sequential_scans(plan: Dict[str, Any], sort_keys: Tuple[str, ...] = ()):
+    """Yields (Seq Scan node, sort keys of the sorts above it) for every sequential scan in an EXPLAIN plan."""
+    sort_keys = sort_keys + tuple(plan.get('Sort Key', ()))
+    if plan['Node Type'] == 'Seq Scan':
+        yield plan, sort_keys
+    for child in plan.get('Plans', ()):
+        yield from _sequential_scans(child, sort_keys)
+
+
+# A column compared in a scan filter, e.g. "(member_id = 5)" or "(m.record_date >= '2026-01-01'::date)"
+_FILTER_COLUMN = re.compile(r"\((?:\w+\.)?(\w+) (=|<>|<=|>=|<|>|~~|IS)(?=\s)")
+# A cast column, e.g. "(email)::text", which is compared as if it were the bare column
+_CAST_COLUMN = re.compile(r"\(((?:\w+\.)?\w+)\)::\w+(?: \w+)*")
+
+
+def _index_columns(table: str, scan_filter: str, sort_keys: Tuple[str, ...]) -> List[str]:
+    """Columns an index would need for a filtered (and sorted) scan: equality columns, then range columns, then sort keys."""
+    equal, ranged = [], []
+    for column, operator in _FILTER_COLUMN.findall(_CAST_COLUMN.sub(r'\1', scan_filter or '')):
+        target = equal if operator in ('=', 'IS') else ranged
+        if column not in equal and column not in ranged:
+            target.append(column)
+    columns = equal + ranged
+    for key in sort_keys:
+        qualifier, _, column = key.split()[0].rpartition('.')
+        if qualifier in ('', table) and re.fullmatch(r'\w+', column) and column not in columns:
+            columns.append(column)
+    return columns
+
+
+def service_access_paths(connection: Connection) -> List[Dict[str, Any]]:
+    """
+    The lookups the services actually make, read from the plans of their queries: runs the hot paths
+    (capture_service_queries), asks the planner how it would run each statement, and turns every
+    sequential scan it chose into a path on the scan's filter columns and the sort above it.
+    In the same form as expected_access_paths(), so audit_indexes() can check them.
+    """
+    found: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+    for hot_path, statement, parameters in capture_service_queries():
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()[0]['Plan']
+        for scan, sort_keys in _sequential_scans(plan):
+            table = scan['Relation Name']
+            columns = tuple(_index_columns(table, scan.get('Filter'), sort_keys))
+            if not columns:
+                continue
+            path = found.setdefault((table, columns), {
+                'table': table,
+                'columns': columns,
+                'index': None,
+                'partial': False,
+                'hot_paths': [],
+                'fix': f"CREATE INDEX CONCURRENTLY idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)});"
+            })
+            if hot_path not in path['hot_paths']:
+                path['hot_paths'].append(hot_path)
+    for path in found.values():
+        path['reason'] = f"{', '.join(path.pop('hot_paths'))} queries"
+    return list(found.values())
+
+
+def report_missing_indexes() -> List[Dict[str, Any]]:
+    """Runs both audits and prints one warning per missing index. Returns the findings (empty if none)."""
+    try:
+        hot_paths = [name for name, _ in _service_hot_paths()]
+        print(f"Index audit: checks the indexes declared on the models, foreign-key columns, and the queries "
+              f"of {len(hot_paths)} read hot paths ({', '.join(hot_paths)}). Write paths are not checked.")
+        with engine.connect() as connection:
+            missing = audit_indexes(connection, expected_access_paths() + service_access_paths(connection))
+    except Exception as e:
+        print(f"Warning: Could not audit indexes. Details: {e}")
+        return []
+
+    if not missing:
+        print("Success: Every expected index is present.")
+    for m in missing:
+        print(f"Warning: No index on {m['table']} ({', '.join(m['columns'])}) for the {m['reason']}: "
+              f"each lookup is a sequential scan of ~{m['rows']} rows (est. cost {m['seq_scan_cost']}), "
+              f"{m['seq_scans']} so far. Fix: {m['fix']}")
+    return missing
+
+
+if __name__ == "__main__":
+    # python -m app.Index_Audit  (exits with 1 when an index is missing)
+    import db_init  # noqa: F401  (loads every model the services' queries refer to)
+    raise SystemExit(1 if report_missing_indexes() else 0)
@@ -0,0 +1,100 @@
+from app.Session_Manager import separate_session_scope
+from app.Admin_Service import invalidate_admin_dashboards
+from app.Change_Stamps import member_stamp, bump_stamps
+from models.invoice import Invoice
+from datetime import datetime
+from threading import Event, Lock, Thread
+from time import sleep
+from typing import List, Optional
+from sqlalchemy import select, update, text
+from sqlalchemy.orm import Session
+
+# Invoices moved to Overdue per UPDATE. Each batch commits on its own, so row locks are held for one short
+# transaction and other writers to invoice are never blocked for the length of a sweep.
+SWEEP_BATCH_SIZE = 500
+SWEEP_INTERVAL_SECONDS = 15 * 60
+
+
+def _sweep_batch(session: Session, now: datetime, batch_size: int) -> List[int]:
+    """Marks up to batch_size Pending invoices due before now as Overdue. Returns their member_ids."""
+    # Give up rather than queue behind a table lock (e.g. a migration); the next pass retries
+    session.execute(text("SET LOCAL lock_timeout = '2s'"))
+    # Oldest first, through idx_invoice_unpaid_due_date. Rows an admin is editing right now are left for the next pass.
+    due = select(Invoice.invoice_id).where(
+        Invoice.status == 'Pending', Invoice.due_date < now
+    ).order_by(Invoice.due_date).limit(batch_size).with_for_update(skip_locked=True)
+    return session.scalars(
+        update(Invoice).where(Invoice.invoice_id.in_(due.scalar_subquery())).values(status='Overdue')
+        .returning(Invoice.member_id).execution_options(synchronize_session=False)
+    ).all()
+
+
+def sweep_overdue_invoices(batch_size: int = SWEEP_BATCH_SIZE, pause_seconds: float = 0.0) -> Optional[int]:
+    """
+    Moves every Pending invoice past its due date to Overdue, batch_size rows per transaction, pausing
+    pause_seconds between batches. Safe to run from several processes at once.
+    Returns the number of invoices moved, or None if the sweep stopped on an error.
+    """
+    now = datetime.now()
+    swept = 0
+    try:
+        while True:
+            with separate_session_scope() as session:
+                member_ids = _sweep_batch(session, now, batch_size)
+                if member_ids:
+                    bump_stamps(session, *{member_stamp(member_id) for member_id in member_ids})
+                    invalidate_admin_dashboards()
+            swept += len(member_ids)
+            if len(member_ids) < batch_size:
+                break
+            if pause_seconds:
+                sleep(pause_seconds)
+    except Exception as e:
+        print(f"Error: Overdue sweep stopped after {swept} invoices. Details: {e}")
+        return None
+
+    if swept:
+        print(f"Success: Marked {swept} invoices as Overdue.")
+    return swept
+
+
+class OverdueSweeper:
+    """Runs sweep_overdue_invoices every interval_seconds on a background thread of this process."""
+
+    def __init__(self, interval_seconds: float = SWEEP_INTERVAL_SECONDS, pause_seconds: float = 0.05):
+        self.interval_seconds = interval_seconds
+        self.pause_seconds = pause_seconds
+        self._stopped = Event()
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+
+    def start(self):
+        """Starts sweeping (the first sweep runs at once). Does nothing if already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = Thread(target=self._run, name='overdue-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops after the sweep in progress, if any."""
+        self._stopped.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            sweep_overdue_invoices(pause_seconds=self.pause_seconds)
+            self._stopped.wait(self.interval_seconds)
+
+
+# Shared by every request handled by this process
+overdue_sweeper = OverdueSweeper()
+
+
+if __name__ == "__main__":
+    # One pass, e.g. from cron: python -m app.Invoice_Sweeper
+    raise SystemExit(0 if sweep_overdue_invoices() is not None else 1)
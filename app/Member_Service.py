@@ -1,42 +1,56 @@
 from models.base import SessionLocal
+from app.Session_Manager import execute_transaction as _execute_transaction, read_transaction as _read_transaction, run_after_commit
+from app.Auth_Service import forget_failed_logins
+from app.Cache import TTLCache
+from app.Pagination import Page, encode_after, decode_after
+from app.Change_Stamps import CLASSES, member_stamp, bump_stamps, stamp_etag
+from app.Downsample import lttb_indices
 from models.member import Member
 from models.fitness_goal import Fitness_goal
 from models.metric import Metric
+from models.metric_rollup import Metric_rollup, METRIC_ROLLUP_PERIODS
 from models.class_enrollment import Class_enrollment
+from models.class_enrollment_summary import Class_enrollment_summary
 from models.classes import Classes
 from models.room import Room
 # Import the new PersonalTrainingSession model
 #from models.personal_training_session import PersonalTrainingSession 
+from bisect import bisect_left, bisect_right
 from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
+from hashlib import sha1
+import json
+from operator import itemgetter
+import numpy as np
+from typing import Optional, List, Dict, Any, Set, Tuple
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, and_, or_ # Imported or_ for login check
+from sqlalchemy import func, and_, or_, text, select, extract, Float # Imported or_ for login check
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session 
 
-# Helper for opening and closing sessions
-def _execute_transaction(func):
-    """Decorator to handle session management (open, commit, rollback, close).
-    The decorated function must accept 'session' as its first argument.
-    """
-    def wrapper(*args, **kwargs):
-        session = SessionLocal()
-        # The first argument 'session' is provided by the decorator
-        args_with_session = (session,) + args
-        try:
-            result = func(*args_with_session, **kwargs)
-            session.commit()
-            return result
-        except IntegrityError as e:
-            session.rollback()
-            print(f"Error: Database constraint violation (e.g., duplicate email). Details: {e}")
-            return None
-        except Exception as e:
-            session.rollback()
-            print(f"Error: An unexpected error occurred. Details: {e}")
-            return None
-        finally:
-            session.close()
-    return wrapper
+# Assembled dashboards per member_id. Every write that changes one drops it after committing,
+# so the TTL only bounds how long classes that have started, or writes made by other processes, stay visible.
+_member_dashboards = TTLCache(ttl_seconds=60, max_entries=10000)
+
+
+def invalidate_member_dashboard(member_id: Optional[int] = None):
+    """Drops the cached dashboard of one member once the current unit of work commits (all of them if member_id is None)."""
+    if member_id is None:
+        run_after_commit(_member_dashboards.clear)
+    else:
+        run_after_commit(lambda: _member_dashboards.invalidate(member_id))
+
+
+# Upcoming classes with enrollment counts, shared by every member viewing the schedule, as
+# (content digest, entries). Enrollments, cancellations and class changes drop it after committing.
+_class_catalogue = TTLCache(ttl_seconds=30, max_entries=1)
+
+# Pages that hide classes once they start roll their ETag over at least this often
+_UPCOMING_FRESH_SECONDS = 60
+
+
+def invalidate_class_catalogue():
+    """Drops the shared class catalogue once the current unit of work commits."""
+    run_after_commit(_class_catalogue.clear)
 
 # --- Member Management Functions ---
 
@@ -51,14 +65,9 @@ def register_member(session:Session, name: str, email: str, gender:str, date_of_
         # 1. Prepare data
         date_of_birth = datetime.strptime(date_of_birth_str, '%Y-%m-%d')
         
-        # 2. Find the next available ID
-        # Get the maximum member_id and add 1, default to 1 if no members exist
-        max_id = session.query(func.max(Member.member_id)).scalar()
-        new_member_id = (max_id or 0) + 1
-        
-        # 3. Create Member
+        # 2. Create Member (member_id is assigned by the member_member_id_seq sequence)
         new_member = Member(
-            member_id=new_member_id,
+            member_id=None,
             name=name,
             email=email,
             date_of_birth=date_of_birth,
@@ -67,25 +76,23 @@ def register_member(session:Session, name: str, email: str, gender:str, date_of_
             gender=gender
         )
         session.add(new_member)
-        print(f"Success: Registered new member ID {new_member_id} and created initial goal.")
-        return new_member_id
+        # Flush to get the generated ID; a duplicate email raises here and is handled by the decorator
+        session.flush()
+        run_after_commit(lambda: forget_failed_logins(email))
+        print(f"Success: Registered new member ID {new_member.member_id} and created initial goal.")
+        return new_member.member_id
         
-    except IntegrityError:
-        # Handled by decorator
-        return None
-    except Exception as e:
-        # Handled by decorator
-        print(f"Unexpected error in register_member: {e}")
+    except ValueError as e:
+        print(f"Error: Invalid date of birth in register_member: {e}")
         return None
 
 # check member password
-@_execute_transaction
-def check_member(self, email: str, password: str) -> Optional[int]:
+@_read_transaction
+def check_member(session: Session, email: str, password: str) -> Optional[int]:
     """
     Checks if a member with the given email and password exists.
     Returns the member_id on success, or None on failure.
     """
-    session = SessionLocal()
     member_match = session.query(Member).filter(
         Member.email == email, 
         Member.password == password
@@ -101,27 +108,21 @@ def check_member(self, email: str, password: str) -> Optional[int]:
 
 # log health metrics
 @_execute_transaction
-def log_health(member_id: int, weight: int, height: int, heart_rate: int) -> bool:
+def log_health(session: Session, member_id: int, weight: int, height: int, heart_rate: int, record_date: Optional[datetime] = None) -> bool:
     """
-    Logs new health metrics for a member.
+    Logs new health metrics for a member, taken at record_date (now if not given).
     """
-    session = SessionLocal()
     try:
         # 1. Prepare data
-        record_dt = datetime.now()
+        record_dt = record_date or datetime.now()
         
         # 2. Check if member exists
         if not session.query(Member).filter(Member.member_id == member_id).first():
             print(f"Error: No member id: {member_id} found.")
             return False
 
-        # 3. Find the next available metric_id
-        max_id = session.query(func.max(Metric.metric_id)).scalar()
-        new_metric_id = (max_id or 0) + 1
-        
-        # 4. Create Metric
+        # 3. Create Metric (metric_id is assigned by the metrics_metric_id_seq sequence)
         new_metric = Metric(
-            metric_id=new_metric_id,
             member_id=member_id,
             record_date=record_dt,
             weight=weight,
@@ -129,9 +130,11 @@ def log_health(member_id: int, weight: int, height: int, heart_rate: int) -> boo
             heart_rate=heart_rate
         )
         session.add(new_metric)
+        bump_stamps(session, member_stamp(member_id))
+        invalidate_member_dashboard(member_id)
         
-        # 5. Commit is handled by the decorator
-        print(f"Success: Logged new metric ID {new_metric_id} for member {member_id}.")
+        # 4. Commit is handled by the decorator
+        print(f"Success: Logged new metric for member {member_id}.")
         return True
         
     except Exception as e:
@@ -139,6 +142,96 @@ def log_health(member_id: int, weight: int, height: int, heart_rate: int) -> boo
         print(f"Unexpected error in log_health: {e}")
         return False
 
+# Largest number of readings accepted from one device sync
+MAX_SYNC_READINGS = 50000
+
+
+def _parse_device_reading(raw: Dict[str, Any]) -> Tuple[int, str, datetime, int, int, int]:
+    """
+    Validates one reading sent by a device and returns (member_id, device_id, record_date, weight, height, heart_rate).
+    Timestamps with an offset are converted to server local time, like the record_date of readings entered by hand.
+    Raises ValueError describing what is wrong with it.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("reading must be an object")
+    values = {}
+    for field in ('member_id', 'weight', 'height', 'heart_rate'):
+        value = raw.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{field} must be a number")
+        values[field] = int(round(value))
+    device_id = raw.get('device_id')
+    if not isinstance(device_id, str) or not device_id.strip() or len(device_id) > 100:
+        raise ValueError("device_id must be a non-empty string of at most 100 characters")
+    try:
+        recorded_at = datetime.fromisoformat(raw.get('recorded_at'))
+    except (TypeError, ValueError):
+        raise ValueError("recorded_at must be an ISO 8601 timestamp")
+    if recorded_at.tzinfo is not None:
+        recorded_at = recorded_at.astimezone().replace(tzinfo=None)
+    return values['member_id'], device_id.strip(), recorded_at, values['weight'], values['height'], values['heart_rate']
+
+
+@_execute_transaction
+def ingest_device_readings(session: Session, readings: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Stores a batch of timestamped readings pushed by wearables and scales, for any number of members,
+    in one transaction. Each reading is {member_id, device_id, recorded_at, weight, height, heart_rate}.
+
+    A sync is idempotent: readings are keyed on (member, device, timestamp), so a reading sent twice, in
+    the same batch or in a later retry, is stored once. Invalid readings and readings of unknown members
+    are skipped and reported rather than failing the batch.
+    Returns {'received', 'inserted', 'duplicates', 'unknown_members', 'rejected': [{index, reason}]}.
+    """
+    rejected = []
+    batch = {}
+    for index, raw in enumerate(readings):
+        try:
+            member_id, device_id, record_dt, weight, height, heart_rate = _parse_device_reading(raw)
+        except ValueError as e:
+            rejected.append({'index': index, 'reason': str(e)})
+            continue
+        # The first copy of a reading wins, as it does against rows stored by an earlier sync
+        batch.setdefault((member_id, device_id, record_dt), {
+            'member_id': member_id,
+            'device_id': device_id,
+            'record_date': record_dt,
+            'weight': weight,
+            'height': height,
+            'heart_rate': heart_rate
+        })
+
+    # 1. One lookup for every member in the batch (metrics would reject them on the foreign key anyway)
+    member_ids = {member_id for member_id, _, _ in batch}
+    known = set(session.scalars(select(Member.member_id).where(Member.member_id.in_(member_ids)))) if member_ids else set()
+    rows = [row for (member_id, _, _), row in batch.items() if member_id in known]
+
+    # 2. Bulk INSERT, sent as multi-row statements; readings already stored are skipped on the natural key
+    inserted = []
+    if rows:
+        inserted = session.scalars(
+            insert(Metric)
+            .on_conflict_do_nothing(constraint='uq_metrics_member_device_time')
+            .returning(Metric.member_id),
+            rows
+        ).all()
+
+    changed = set(inserted)
+    if changed:
+        bump_stamps(session, *[member_stamp(member_id) for member_id in changed])
+        for member_id in changed:
+            invalidate_member_dashboard(member_id)
+
+    print(f"Success: Device sync stored {len(inserted)} of {len(readings)} readings for {len(changed)} members.")
+    return {
+        'received': len(readings),
+        'inserted': len(inserted),
+        # Repeated within this batch, plus already stored by an earlier sync
+        'duplicates': (len(readings) - len(rejected) - len(batch)) + (len(rows) - len(inserted)),
+        'unknown_members': sorted(member_ids - known),
+        'rejected': rejected
+    }
+
 # update member goal
 @_execute_transaction
 def update_member_goal(session: Session, goal_id: int, target_type: str, target_value: float, end_date_str: str, is_active: bool) -> bool:
@@ -163,6 +256,8 @@ def update_member_goal(session: Session, goal_id: int, target_type: str, target_
         goal_to_update.target_value = target_value
         goal_to_update.end_date = end_date
         goal_to_update.is_active = is_active
+        bump_stamps(session, member_stamp(goal_to_update.member_id))
+        invalidate_member_dashboard(goal_to_update.member_id)
         
         # 4. Commit is handled by the decorator
         print(f"Success: Updated goal ID {goal_id}.")
@@ -173,156 +268,326 @@ def update_member_goal(session: Session, goal_id: int, target_type: str, target_
         print(f"Unexpected error in update_member_goal: {e}")
         return False
 
+# Health trends
+@_read_transaction
+def get_metric_trend(session: Session, member_id: int, period: str, start_date: date, end_date: date) -> Optional[List[Dict[str, Any]]]:
+    """
+    Weight and heart-rate trend of a member between two dates, one point per day, week or month.
+    Read from the trigger-maintained metric_rollup table (its primary key range), never from raw readings.
+    Points cover every period that starts in [start_date, end_date]. Returns None for an unknown period.
+    """
+    if period not in METRIC_ROLLUP_PERIODS:
+        print(f"Error: Unknown trend period '{period}' (expected one of {', '.join(METRIC_ROLLUP_PERIODS)}).")
+        return None
+
+    rollups = session.query(Metric_rollup).filter(
+        Metric_rollup.member_id == member_id,
+        Metric_rollup.period == period,
+        Metric_rollup.period_start.between(start_date, end_date)
+    ).order_by(Metric_rollup.period_start).all()
+
+    return [{
+        'period_start': r.period_start.strftime('%Y-%m-%d'),
+        'readings': r.reading_count,
+        'weight': {'min': r.weight_min, 'max': r.weight_max, 'mean': round(r.weight_sum / r.reading_count, 2)},
+        'heart_rate': {'min': r.heart_rate_min, 'max': r.heart_rate_max, 'mean': round(r.heart_rate_sum / r.reading_count, 2)},
+    } for r in rollups]
+
+def metric_trend_etag(member_id: int, period: str, start_date: date, end_date: date) -> str:
+    """ETag of get_metric_trend, read from the member's change stamp (which moves with every logged reading)."""
+    return stamp_etag([member_stamp(member_id)], period, start_date, end_date)
+
+# Rows fetched per round trip while streaming a member's readings
+_HISTORY_FETCH_ROWS = 10000
+
+@_read_transaction
+def get_metric_history(session: Session, member_id: int, start_date: date, end_date: date, points: int = 200) -> Dict[str, Any]:
+    """
+    A member's weight and heart-rate readings between two dates (inclusive), downsampled on the server
+    to at most `points` points per series with LTTB, so charts keep their shape without the browser
+    receiving every reading. Readings are streamed through a server-side cursor along the
+    (member_id, record_date) index and packed straight into arrays, never into ORM objects.
+    """
+    readings = session.execute(
+        select(
+            # Seconds since the epoch as a float, so each fetched chunk converts to an array in one step
+            extract('epoch', Metric.record_date).cast(Float),
+            Metric.weight,
+            Metric.heart_rate
+        ).where(
+            Metric.member_id == member_id,
+            Metric.record_date >= start_date,
+            Metric.record_date < end_date + timedelta(days=1)
+        ).order_by(Metric.record_date),
+        execution_options={'stream_results': True, 'yield_per': _HISTORY_FETCH_ROWS}
+    )
+    chunks = [np.array(chunk, dtype=np.float64) for chunk in readings.partitions()]
+    data = np.concatenate(chunks) if chunks else np.empty((0, 3))
+
+    seconds = data[:, 0]
+    history = {
+        'member_id': member_id,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'readings': len(data),
+        'series': {}
+    }
+    for name, column in (('weight', 1), ('heart_rate', 2)):
+        values = data[:, column]
+        kept = lttb_indices(seconds, values, points)
+        timestamps = np.datetime_as_string(seconds[kept].astype(np.int64).astype('datetime64[s]'))
+        history['series'][name] = [[t, v] for t, v in zip(timestamps.tolist(), values[kept].tolist())]
+    return history
+
+def metric_history_etag(member_id: int, start_date: date, end_date: date, points: int) -> str:
+    """ETag of get_metric_history, read from the member's change stamp (which moves with every logged reading)."""
+    return stamp_etag([member_stamp(member_id)], start_date, end_date, points)
+
+# The whole dashboard in one round trip: the member row plus JSON arrays for active goals,
+# the five latest metrics and upcoming classes, with dates already formatted by Postgres.
+_DASHBOARD_SQL = text("""
+SELECT
+    m.name AS member_name,
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'goal_id', g.goal_id,
+            'target_type', g.target_type,
+            'target_value', g.target_value,
+            'start_date', to_char(g.start_date, 'YYYY-MM-DD'),
+            'end_date', to_char(g.end_date, 'YYYY-MM-DD'),
+            'is_active', g.is_active
+        ) ORDER BY g.end_date)
+        FROM fitness_goal g
+        WHERE g.member_id = m.member_id AND g.is_active
+    ), '[]'::json) AS goals,
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'metric_id', x.metric_id,
+            'record_date', to_char(x.record_date, 'YYYY-MM-DD'),
+            'weight', x.weight,
+            'height', x.height,
+            'heart_rate', x.heart_rate
+        ) ORDER BY x.record_date DESC)
+        FROM (
+            SELECT metric_id, record_date, weight, height, heart_rate
+            FROM metrics
+            WHERE member_id = m.member_id
+            ORDER BY record_date DESC
+            LIMIT 5
+        ) x
+    ), '[]'::json) AS metrics,
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'class_id', c.class_id,
+            'class_type', c.class_type,
+            'trainer_id', c.trainer_id,
+            'start_time', to_char(c.start_time, 'YYYY-MM-DD HH24:MI')
+        ) ORDER BY c.start_time)
+        FROM class_enrollment ce
+        JOIN classes c ON c.class_id = ce.class_id
+        WHERE ce.member_id = m.member_id AND c.start_time >= :now
+    ), '[]'::json) AS classes
+FROM member m
+WHERE m.member_id = :member_id
+""")
+
+def member_dashboard_etag(member_id: int) -> str:
+    """ETag of the member dashboard, read from the member's and the class schedule's change stamps."""
+    return stamp_etag([member_stamp(member_id), CLASSES], fresh_for_seconds=_UPCOMING_FRESH_SECONDS)
+
+
 # Retrieve dashboard data
-@_execute_transaction
-def get_member_dashboard_data(session: Session, member_id: int) -> Optional[Dict[str, Any]]:
+def get_member_dashboard_data(member_id: int, etag: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     Retrieves all necessary data for the member dashboard.
+    Served from the per-member cache when possible; the database is only asked on a miss.
+    Given the current member_dashboard_etag, a cached dashboard built under another one (e.g. before a
+    write made by another process) is rebuilt, and the result carries it as 'etag'.
     """
-    try:
-        member = session.query(Member).filter(Member.member_id == member_id).first()
-        if not member:
-            print(f"Error: No member id: {member_id} found.")
-            return None
+    dashboard = _member_dashboards.get(member_id)
+    if dashboard is None or (etag is not None and dashboard.get('etag') != etag):
+        dashboard = _load_member_dashboard_data(member_id=member_id)
+        if dashboard is not None:
+            dashboard['etag'] = etag
+            _member_dashboards.set(member_id, dashboard)
+    return dashboard
 
-        # Fetch current active goals
-        active_goals = session.query(Fitness_goal).filter(
-            Fitness_goal.member_id == member_id,
-            Fitness_goal.is_active == True
-        ).order_by(Fitness_goal.end_date).all()
-        
-        # Fetch latest metrics (Max 5, ordered by date descending)
-        latest_metrics = session.query(Metric).filter(
-            Metric.member_id == member_id
-        ).order_by(Metric.record_date.desc()).limit(5).all()
-        
-        # Format output
-        goals_data = [{
-            'goal_id': g.goal_id,
-            'target_type': g.target_type,
-            'target_value': g.target_value,
-            'start_date': g.start_date.strftime('%Y-%m-%d'),
-            'end_date': g.end_date.strftime('%Y-%m-%d'),
-            'is_active': g.is_active
-        } for g in active_goals]
-        
-        metrics_data = [{
-            'metric_id': m.metric_id,
-            'record_date': m.record_date.strftime('%Y-%m-%d'),
-            'weight': m.weight,
-            'height': m.height,
-            'heart_rate': m.heart_rate
-        } for m in latest_metrics]
-        """
-        # Fetch scheduled personal training sessions (upcoming)
-        upcoming_pt_sessions = session.query(PersonalTrainingSession).filter(
-            PersonalTrainingSession.member_id == member_id,
-            PersonalTrainingSession.start_time >= datetime.now()
-        ).order_by(PersonalTrainingSession.start_time).all()
-        
-        pt_data = [{
-            'session_id': s.session_id,
-            'trainer_id': s.trainer_id,
-            'start_time': s.start_time.strftime('%Y-%m-%d %H:%M'),
-            'end_time': s.end_time.strftime('%Y-%m-%d %H:%M')
-        } for s in upcoming_pt_sessions]
-        """
-
-        # Fetch scheduled group classes (upcoming)
-        upcoming_classes = session.query(Classes).join(Class_enrollment).filter(
-            Class_enrollment.member_id == member_id,
-            Classes.start_time >= datetime.now()
-        ).order_by(Classes.start_time).all()
-
-        class_data = [{
-            'class_id': c.class_id,
-            'class_type': c.class_type,
-            'trainer_id': c.trainer_id,
-            'start_time': c.start_time.strftime('%Y-%m-%d %H:%M')
-        } for c in upcoming_classes]
-
-        return {
-            'member_name': member.name,
-            'goals': goals_data,
-            'metrics': metrics_data,
-            'classes': class_data
-        }
-        
-    except Exception as e:
-        print(f"Error retrieving member dashboard data for ID {member_id}. Details: {e}")
+
+@_read_transaction
+def _load_member_dashboard_data(session: Session, member_id: int) -> Optional[Dict[str, Any]]:
+    row = session.execute(_DASHBOARD_SQL, {'member_id': member_id, 'now': datetime.now()}).first()
+    if row is None:
+        print(f"Error: No member id: {member_id} found.")
         return None
 
+    return {
+        'member_name': row.member_name,
+        'goals': row.goals,
+        'metrics': row.metrics,
+        'classes': row.classes
+    }
+
+
+class EnrollmentResult:
+    """
+    Outcome of an enrollment or cancellation. It is truthy only on success, so callers that
+    just check the result keep working; on failure, reason holds a short code and message explains it.
+    """
+
+    def __init__(self, success: bool, reason: Optional[str] = None, message: str = ''):
+        self.success = success
+        self.reason = reason
+        self.message = message
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def __repr__(self):
+        return f"<EnrollmentResult (success={self.success}, reason={self.reason})>"
+
+
+# One statement: lock the class's summary row only if a seat is free, insert behind that lock,
+# and read back everything needed to explain a refusal. Concurrent enrollments for the same class
+# queue on the summary row lock and re-check the seat count once the previous one commits, so the
+# class can never go past number_members. ON CONFLICT covers a member double-submitting.
+_ENROLL_SQL = text("""
+WITH target AS (
+    SELECT class_id, number_members, start_time FROM classes WHERE class_id = :class_id
+),
+seat AS (
+    SELECT s.class_id
+    FROM class_enrollment_summary s
+    JOIN classes c ON c.class_id = s.class_id
+    WHERE s.class_id = :class_id
+      AND s.current_enrollment < c.number_members
+      AND c.start_time > :now
+      AND EXISTS (SELECT 1 FROM member WHERE member_id = :member_id)
+    FOR UPDATE OF s
+),
+enrolled AS (
+    INSERT INTO class_enrollment (member_id, class_id, enrollment_date)
+    SELECT :member_id, class_id, :now FROM seat
+    ON CONFLICT (member_id, class_id) DO NOTHING
+    RETURNING class_id
+)
+SELECT
+    EXISTS (SELECT 1 FROM enrolled) AS enrolled,
+    EXISTS (SELECT 1 FROM seat) AS seat_free,
+    EXISTS (SELECT 1 FROM member WHERE member_id = :member_id) AS member_found,
+    (SELECT start_time FROM target) AS start_time,
+    (SELECT number_members FROM target) AS capacity,
+    EXISTS (SELECT 1 FROM class_enrollment WHERE member_id = :member_id AND class_id = :class_id) AS already_enrolled
+""")
 
 # Enroll member in a class
 @_execute_transaction
-def enroll_in_class(session: Session, member_id: int, class_id: int) -> bool:
+def enroll_in_class(session: Session, member_id: int, class_id: int) -> EnrollmentResult:
     """
-    Enrolls a member into a class, checking for capacity and duplicate enrollment.
+    Enrolls a member into a class in a single statement; capacity and duplicate enrollment
+    are enforced by the database. Returns an EnrollmentResult explaining any refusal.
     """
-    member = session.query(Member).filter(Member.member_id == member_id).first()
-    class_to_enroll = session.query(Classes).filter(Classes.class_id == class_id).first()
-    
-    if not member:
-        print(f"Error: No member id: {member_id} found.")
-        return False
-    if not class_to_enroll:
-        print(f"Error: No class id: {class_id} found.")
-        return False
-    
-    # 1. Check if member is already enrolled
-    if session.query(Class_enrollment).filter(
-        Class_enrollment.member_id == member_id, 
-        Class_enrollment.class_id == class_id
-    ).first():
-        print(f"Error: Member ID {member_id} is already registered for class {class_id}.")
-        return False
+    now = datetime.now()
+    row = session.execute(_ENROLL_SQL, {'member_id': member_id, 'class_id': class_id, 'now': now}).one()
 
-    # 2. Check current enrollment count vs. class capacity
-    current_enrollment_count = session.query(func.count(Class_enrollment.member_id)).filter(
-        Class_enrollment.class_id == class_id
-    ).scalar()
-    
-    # Assuming the Classes model has a 'capacity' attribute
-    class_capacity = class_to_enroll.number_members # Use the number_members attribute as capacity
-    
-    if current_enrollment_count >= class_capacity:
-        print(f"Error: The class {class_id} is already full (Capacity: {class_capacity}, Current: {current_enrollment_count}).")
-        return False
-        
-    # 3. Perform enrollment
-    new_enrollment = Class_enrollment(
-        member_id=member_id, 
-        class_id=class_id, 
-        enrollment_date=datetime.now()
-    )
-    session.add(new_enrollment)
-    print(f"Success: Member {member_id} enrolled in class {class_id}.")
-    
-    return True
+    if row.enrolled:
+        bump_stamps(session, member_stamp(member_id))
+        invalidate_member_dashboard(member_id)
+        invalidate_class_catalogue()
+        print(f"Success: Member {member_id} enrolled in class {class_id}.")
+        return EnrollmentResult(True)
 
-@_execute_transaction
-def get_available_classes(session: Session, member_id: int) -> List[Dict[str, Any]]:
+    # already_enrolled reads the snapshot taken before the insert, so it reflects an earlier enrollment.
+    # A free seat with nothing inserted means ON CONFLICT hit an enrollment committed while this one
+    # waited for the seat lock (a double submit).
+    if not row.member_found:
+        result = EnrollmentResult(False, 'member_not_found', f"No member id: {member_id} found.")
+    elif row.start_time is None:
+        result = EnrollmentResult(False, 'class_not_found', f"No class id: {class_id} found.")
+    elif row.already_enrolled or row.seat_free:
+        result = EnrollmentResult(False, 'already_enrolled', f"You are already registered for class {class_id}.")
+    elif row.start_time <= now:
+        result = EnrollmentResult(False, 'class_started', f"Class {class_id} has already started.")
+    else:
+        result = EnrollmentResult(False, 'class_full', f"Class {class_id} is already full (Capacity: {row.capacity}).")
+
+    print(f"Error: {result.message}")
+    return result
+
+def get_available_classes(member_id: int, limit: Optional[int] = None, after: Optional[str] = None) -> Optional[Page]:
     """
     Fetches all currently available classes, including capacity, current enrollment count, 
     and whether the specified member is already enrolled.
+    The class list is shared by all members and cached; only the member's enrollments are read per call.
+    Classes are ordered by start time; pass limit and the previous page's next_after to page through them.
     """
-    current_time = datetime.now()
-    
-    # Subquery 1: Count current enrollments for each class
-    enrollment_count = session.query(
-        Class_enrollment.class_id, 
-        func.count(Class_enrollment.member_id).label('current_enrollment')
-    ).group_by(Class_enrollment.class_id).subquery()
-    
-    # Subquery 2: Check if the current member is enrolled in each class
-    member_enrollment = session.query(
-        Class_enrollment.class_id
-    ).filter(
+    catalogue = _current_class_catalogue()
+    if catalogue is None:
+        return None
+    catalogue = catalogue[1]
+
+    # The catalogue may be a little older than now: skip classes that started since it was built
+    upcoming = bisect_left(catalogue, (datetime.now(),), key=itemgetter(0))
+    first = upcoming
+    if after:
+        try:
+            first = max(first, bisect_right(catalogue, decode_after(after), key=itemgetter(0)))
+        except ValueError as e:
+            print(f"Error: {e}")
+            return None
+
+    entries = catalogue[first:] if limit is None else catalogue[first:first + limit + 1]
+    next_after = None
+    if limit is not None and len(entries) > limit:
+        entries = entries[:limit]
+        next_after = encode_after(entries[-1][0])
+
+    enrolled_ids = _enrolled_class_ids(member_id)
+    if enrolled_ids is None:
+        return None
+
+    return Page(
+        [dict(class_data, is_enrolled=class_data['class_id'] in enrolled_ids) for _, class_data in entries],
+        next_after=next_after,
+        estimated_total=len(catalogue) - upcoming
+    )
+
+
+@_read_transaction
+def _enrolled_class_ids(session: Session, member_id: int) -> Set[int]:
+    # Served by the (member_id, class_id) primary key of class_enrollment
+    return {class_id for (class_id,) in session.query(Class_enrollment.class_id).filter(
         Class_enrollment.member_id == member_id
-    ).subquery()
+    )}
+
+
+def class_schedule_etag(member_id: int, limit: Optional[int] = None, after: Optional[str] = None) -> Optional[str]:
+    """
+    ETag of one page of the member's view of the class schedule: the digest of the shared catalogue plus the
+    member's change stamp (which moves with their enrollments) and the page asked for. None when the
+    catalogue cannot be loaded.
+    """
+    catalogue = _current_class_catalogue()
+    if catalogue is None:
+        return None
+    return stamp_etag([member_stamp(member_id)], catalogue[0], limit, after, fresh_for_seconds=_UPCOMING_FRESH_SECONDS)
 
 
-    # Query Classes, left-joining with both subqueries
+def _current_class_catalogue() -> Optional[Tuple[str, List[Tuple[Tuple[datetime, int], Dict[str, Any]]]]]:
+    catalogue = _class_catalogue.get('upcoming')
+    if catalogue is None:
+        entries = _load_class_catalogue()
+        if entries is None:
+            return None
+        # Equal content gives an equal digest in every process, so the ETag holds across workers
+        digest = sha1(json.dumps([data for _, data in entries], sort_keys=True).encode('utf-8')).hexdigest()
+        catalogue = (digest, entries)
+        _class_catalogue.set('upcoming', catalogue)
+    return catalogue
+
+
+@_read_transaction
+def _load_class_catalogue(session: Session) -> List[Tuple[Tuple[datetime, int], Dict[str, Any]]]:
+    # Upcoming classes with their live enrollment counts, as ((start_time, class_id), class data) pairs
     classes = session.query(
         Classes.class_id,
         Classes.class_type,
@@ -330,63 +595,69 @@ def get_available_classes(session: Session, member_id: int) -> List[Dict[str, An
         Classes.room_id,
         Classes.start_time,
         Classes.number_members, # This is the capacity
-        func.coalesce(enrollment_count.c.current_enrollment, 0).label('current_enrollment'),
-        member_enrollment.c.class_id.isnot(None).label('is_enrolled')
-    ).outerjoin(enrollment_count, Classes.class_id == enrollment_count.c.class_id
-    ).outerjoin(member_enrollment, Classes.class_id == member_enrollment.c.class_id
+        # Enrollment counts come from the trigger-maintained summary table, not a GROUP BY
+        func.coalesce(Class_enrollment_summary.current_enrollment, 0).label('current_enrollment')
+    ).outerjoin(Class_enrollment_summary, Classes.class_id == Class_enrollment_summary.class_id
     ).filter(
-        Classes.start_time >= current_time
-    ).order_by(Classes.start_time).all()
+        Classes.start_time >= datetime.now()
+    ).order_by(Classes.start_time, Classes.class_id).all()
 
-    classes_data = [{
+    return [((c.start_time, c.class_id), {
         "class_id": c.class_id,
         "class_type": c.class_type,
         "trainer_id": c.trainer_id,
         "room_id": c.room_id,
         "start_time": c.start_time.strftime("%Y-%m-%d %H:%M"),
         "number_members": c.number_members, # Capacity
-        "current_enrollment": c.current_enrollment,
-        "is_enrolled": c.is_enrolled # NEW: Check if the member is already enrolled
-    } for c in classes]
+        "current_enrollment": c.current_enrollment
+    }) for c in classes]
 
-    return classes_data
+# One conditional delete: the enrollment only goes if its class has not started yet.
+# The remaining columns come from the pre-delete snapshot and explain a refusal.
+_CANCEL_SQL = text("""
+WITH cancelled AS (
+    DELETE FROM class_enrollment ce
+    USING classes c
+    WHERE ce.member_id = :member_id
+      AND ce.class_id = :class_id
+      AND c.class_id = ce.class_id
+      AND c.start_time > :now
+    RETURNING ce.class_id
+)
+SELECT
+    EXISTS (SELECT 1 FROM cancelled) AS cancelled,
+    (SELECT start_time FROM classes WHERE class_id = :class_id) AS start_time,
+    EXISTS (SELECT 1 FROM class_enrollment WHERE member_id = :member_id AND class_id = :class_id) AS was_enrolled
+""")
 
 @_execute_transaction
-def cancel_member_class_enrollment(session: Session, member_id: int, class_id: int) -> bool:
+def cancel_member_class_enrollment(session: Session, member_id: int, class_id: int) -> EnrollmentResult:
     """
     Cancels a member's enrollment in a class, ensuring the class is in the future.
-    Returns True on successful cancellation, False otherwise.
+    Returns an EnrollmentResult that is truthy on successful cancellation.
     """
-    try:
-        # Check if enrollment exists
-        enrollment_to_delete = session.query(Class_enrollment).filter(
-            Class_enrollment.member_id == member_id, 
-            Class_enrollment.class_id == class_id
-        ).one_or_none()
-        
-        if enrollment_to_delete:
-            # Check if the class start time is in the future (cancellation cutoff)
-            class_to_check = session.query(Classes).filter(Classes.class_id == class_id).one_or_none()
-            
-            if not class_to_check:
-                print(f"Error: Class ID {class_id} not found for cancellation check.")
-                return False
+    now = datetime.now()
+    row = session.execute(_CANCEL_SQL, {'member_id': member_id, 'class_id': class_id, 'now': now}).one()
 
-            if class_to_check.start_time <= datetime.now():
-                print(f"Error: Cannot cancel enrollment for class {class_id} that has already started.")
-                return False
-            
-            # Perform deletion
-            session.delete(enrollment_to_delete)
-            print(f"Member ID {member_id} successfully cancelled enrollment in class {class_id}.")
-            return True
-        else:
-            print(f"Error: Enrollment record for Member ID {member_id} in class {class_id} not found.")
-            return False
-            
-    except Exception as e:
-        print(f"Error cancelling enrollment for member {member_id} in class {class_id}: {e}")
-        return False
+    if row.cancelled:
+        # A seat is free again: let queued enrollments for this class through once this commits
+        from app.Enrollment_Queue import enrollment_queue
+        run_after_commit(lambda: enrollment_queue.forget_full(class_id))
+        bump_stamps(session, member_stamp(member_id))
+        invalidate_member_dashboard(member_id)
+        invalidate_class_catalogue()
+        print(f"Member ID {member_id} successfully cancelled enrollment in class {class_id}.")
+        return EnrollmentResult(True)
+
+    if row.start_time is None:
+        result = EnrollmentResult(False, 'class_not_found', f"Class ID {class_id} not found.")
+    elif not row.was_enrolled:
+        result = EnrollmentResult(False, 'not_enrolled', f"You are not registered for class {class_id}.")
+    else:
+        result = EnrollmentResult(False, 'class_started', f"Cannot cancel enrollment for class {class_id} that has already started.")
+
+    print(f"Error: {result.message}")
+    return result
     
 @_execute_transaction
 def set_profile(
@@ -415,9 +686,13 @@ def set_profile(
         member_match.name = name
         member_match.phone_number = phone_number
         member_match.gender = gender
+        bump_stamps(session, member_stamp(member_id))
+        invalidate_member_dashboard(member_id)
 
         if new_password:
             member_match.password = new_password
+            member_email = member_match.email
+            run_after_commit(lambda: forget_failed_logins(member_email))
             print(f"Member ID {member_id}: Password updated.")
             
         return True
@@ -426,7 +701,7 @@ def set_profile(
         print(f"Error in update_member_profile for member {member_id}: {e}")
         return False
     
-@_execute_transaction
+@_read_transaction
 def get_profile(session:Session, member_id:int):
     try:
         member_match = session.query(Member).filter(Member.member_id == member_id).one_or_none()
@@ -443,8 +718,6 @@ def get_profile(session:Session, member_id:int):
             return None
     except Exception as e:
         print(f"Error : {e}")
-    finally:
-        session.close()
 
 
         
@@ -0,0 +1,116 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_right
+from datetime import datetime
+from json import dumps, loads
+from typing import Any, Callable, List, Optional, Sequence
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query, Session
+
+# Page size used by the list routes when the client does not ask for one
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page(list):
+    """
+    One page of a listing. It is a plain list of the rows, so templates and callers iterate it as before,
+    plus next_after (the token for the following page, None on the last one) and estimated_total.
+    """
+
+    def __init__(self, items=(), next_after: Optional[str] = None, estimated_total: Optional[int] = None):
+        super().__init__(items)
+        self.next_after = next_after
+        self.estimated_total = estimated_total
+
+
+def page_size(requested: Optional[int]) -> int:
+    """Clamps a client-supplied page size to [1, MAX_PAGE_SIZE]."""
+    if not requested:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(requested, MAX_PAGE_SIZE))
+
+
+def encode_after(values: Sequence[Any]) -> str:
+    """Turns the sort key of the last row of a page into an opaque 'after' token."""
+    encoded = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return urlsafe_b64encode(dumps(encoded).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_after(token: str) -> tuple:
+    """Inverse of encode_after. Raises ValueError for a token that was not produced by it."""
+    try:
+        values = loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except Exception as e:
+        raise ValueError(f"Invalid page token: {token!r}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid page token: {token!r}")
+    return tuple(datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in values)
+
+
+def keyset_page(
+    query: Query,
+    sort_columns: Sequence,
+    key: Callable[[Any], Sequence[Any]],
+    limit: Optional[int],
+    after: Optional[str] = None,
+    descending: bool = False
+) -> Page:
+    """
+    Returns the rows of query that come after the 'after' token, ordered by sort_columns (which must be
+    unique together, e.g. end with the primary key). key(row) gives the sort values of a row.
+    The position is a WHERE on the sort key rather than an OFFSET, so every page costs the same.
+    With limit None every remaining row is returned.
+    """
+    if after:
+        position = tuple_(*sort_columns)
+        values = tuple_(*decode_after(after))
+        query = query.filter(position < values if descending else position > values)
+
+    query = query.order_by(*[c.desc() if descending else c for c in sort_columns])
+    if limit is None:
+        return Page(query.all())
+
+    # One extra row tells whether there is a next page without counting
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    return Page(rows, next_after=encode_after(key(rows[-1])))
+
+
+def slice_page(
+    rows: Sequence[Any],
+    key: Callable[[Any], Sequence[Any]],
+    limit: Optional[int],
+    after: Optional[str] = None,
+    with_total: bool = False
+) -> Page:
+    """
+    keyset_page for rows already held in memory, sorted ascending by key(row) (unique per row).
+    The page start is found by binary search; the total is exact and free, so it is given when asked for.
+    """
+    first = bisect_right(rows, decode_after(after), key=lambda row: tuple(key(row))) if after else 0
+    page = rows[first:] if limit is None else rows[first:first + limit + 1]
+    next_after = None
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        next_after = encode_after(key(page[-1]))
+    return Page(page, next_after, len(rows) if with_total else None)
+
+
+def estimate_count(session: Session, query: Query) -> Optional[int]:
+    """
+    Planner estimate of how many rows query returns, read from EXPLAIN instead of running a COUNT(*).
+    Returns None when no estimate is available (e.g. a database without EXPLAIN (FORMAT JSON)).
+    """
+    connection = session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    try:
+        with session.begin_nested():
+            plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    except Exception as e:
+        print(f"Warning: Could not estimate row count. Details: {e}")
+        return None
+    if isinstance(plan, str):
+        plan = loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,91 @@
+from app.Session_Manager import session_scope
+from app.Change_Stamps import bump_stamps, read_stamps
+from models.trainer import Trainer
+from models.room import Room
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+# Name of the data_version row counting changes to trainers and rooms
+REFERENCE_DATA = 'reference_data'
+
+
+def bump_reference_data_version(session: Session):
+    """
+    Marks trainers/rooms as changed. Must be called by every write to either table, inside its transaction,
+    so the new version only becomes visible to other processes together with the change itself.
+    """
+    bump_stamps(session, REFERENCE_DATA)
+    # Until it commits, this unit of work sees rows no other process does: keep them out of the cache
+    session.info['reference_data_changed'] = True
+
+
+class ReferenceData:
+    """
+    Per-process copy of the trainer and room tables, which are small and read on nearly every admin page.
+
+    Before serving from memory it compares the data_version counter (one primary key lookup, done once
+    per unit of work) with the version it loaded, and reloads both tables when they differ.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version: Optional[int] = None
+        self._trainers: List[Dict[str, Any]] = []  # ordered by trainer_id
+        self._rooms: List[Dict[str, Any]] = []  # ordered by room_id
+
+    def trainers(self, session: Session) -> List[Dict[str, Any]]:
+        """All trainers as {'trainer_id', 'name'} dicts, ordered by ID. Callers must not modify them."""
+        return self._current(session)[0]
+
+    def rooms(self, session: Session) -> List[Dict[str, Any]]:
+        """All rooms as {'room_id', 'room_type', 'capacity', 'current_status', 'admin_id'} dicts, ordered by ID."""
+        return self._current(session)[1]
+
+    def preload(self):
+        """Loads the tables up front (called at startup) so the first admin request does not pay for it."""
+        with session_scope() as session:
+            self._current(session)
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+
+    def _current(self, session: Session) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        if session.info.get('reference_data_changed'):
+            return self._load(session)
+
+        version = session.info.get('reference_data_version')
+        if version is None:
+            version = read_stamps(session, [REFERENCE_DATA])[REFERENCE_DATA]
+            session.info['reference_data_version'] = version
+
+        with self._lock:
+            if version == self._version:
+                return self._trainers, self._rooms
+
+        # The version was read first, so these rows are at least as new as it is
+        trainers, rooms = self._load(session)
+        with self._lock:
+            if self._version is None or version >= self._version:
+                self._version, self._trainers, self._rooms = version, trainers, rooms
+        return trainers, rooms
+
+    @staticmethod
+    def _load(session: Session) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        trainers = [{'trainer_id': t.trainer_id, 'name': t.name}
+                    for t in session.query(Trainer.trainer_id, Trainer.name).order_by(Trainer.trainer_id)]
+        rooms = [{
+            'room_id': r.room_id,
+            'room_type': r.room_type,
+            'capacity': r.capacity,
+            'current_status': r.current_status,
+            'admin_id': r.admin_id,
+        } for r in session.query(
+            Room.room_id, Room.room_type, Room.capacity, Room.current_status, Room.admin_id
+        ).order_by(Room.room_id)]
+        return trainers, rooms
+
+
+# Shared by every request handled by this process
+reference_data = ReferenceData()
@@ -0,0 +1,159 @@
+from app.Session_Manager import read_transaction as _read_transaction, separate_session_scope
+from models.invoice import Invoice, UNPAID_INVOICE_STATUSES
+from models.revenue_daily import Revenue_daily
+from models.revenue_backfill import Revenue_backfill
+from datetime import datetime, date
+from time import perf_counter
+from typing import Optional, Dict, Any, Sequence, Tuple
+from sqlalchemy import func, select, delete, case, cast, text, Date, Numeric
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+# Columns a revenue report can be grouped by, in the order they are listed
+REVENUE_DIMENSIONS = ('day', 'price_type', 'payment_method')
+
+# Invoices counted per rebuild transaction
+REVENUE_BACKFILL_CHUNK = 20000
+
+
+@_read_transaction
+def get_revenue_report(session: Session, start_date: date, end_date: date,
+                       group_by: Sequence[str] = REVENUE_DIMENSIONS) -> Optional[Dict[str, Any]]:
+    """
+    Invoiced, paid and outstanding amounts for invoices issued from start_date to end_date (inclusive),
+    grouped by any of REVENUE_DIMENSIONS, plus the totals of the range. Read from revenue_daily only.
+    Returns None if group_by names anything else.
+    """
+    if not group_by or any(dimension not in REVENUE_DIMENSIONS for dimension in group_by):
+        print(f"Error: Revenue reports can only be grouped by {', '.join(REVENUE_DIMENSIONS)}.")
+        return None
+    dimensions = [getattr(Revenue_daily, dimension) for dimension in REVENUE_DIMENSIONS if dimension in group_by]
+
+    measures = [
+        func.sum(Revenue_daily.invoice_count).label('invoices'),
+        func.sum(Revenue_daily.total_amount).label('invoiced'),
+        func.sum(case((Revenue_daily.status == 'Paid', Revenue_daily.total_amount), else_=0)).label('paid'),
+        func.sum(case(
+            (Revenue_daily.status.in_(UNPAID_INVOICE_STATUSES), Revenue_daily.total_amount), else_=0
+        )).label('outstanding'),
+    ]
+    in_range = (Revenue_daily.day >= start_date, Revenue_daily.day <= end_date)
+    rows = session.execute(
+        select(*dimensions, *measures).where(*in_range).group_by(*dimensions)
+        .having(func.sum(Revenue_daily.invoice_count) > 0).order_by(*dimensions)
+    ).all()
+    totals = session.execute(select(*measures).where(*in_range)).one()
+
+    def amounts(row) -> Dict[str, Any]:
+        return {
+            'invoices': int(row.invoices or 0),
+            'invoiced': float(row.invoiced or 0),
+            'paid': float(row.paid or 0),
+            'outstanding': float(row.outstanding or 0),
+        }
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'group_by': [d.key for d in dimensions],
+        'rows': [
+            {**{d.key: (row[i].isoformat() if isinstance(row[i], date) else row[i]) for i, d in enumerate(dimensions)},
+             **amounts(row)}
+            for row in rows
+        ],
+        'totals': amounts(totals)
+    }
+
+
+def _lock_revenue_rollup(session: Session):
+    # Invoice writes wait in the revenue triggers until this transaction ends; reports keep reading
+    session.execute(text("LOCK TABLE revenue_daily IN EXCLUSIVE MODE"))
+
+
+def _backfill_next_chunk(session: Session, chunk_invoices: int) -> Tuple[int, bool]:
+    """
+    Adds the next chunk_invoices invoices after the rebuild cursor to revenue_daily and moves the cursor
+    (removing it after the last invoice). Returns (invoices counted, whether the rebuild is finished).
+    """
+    _lock_revenue_rollup(session)
+    backfill = session.get(Revenue_backfill, 1)
+    if backfill is None:
+        return 0, True
+
+    lower = backfill.next_invoice_id
+    upper = session.scalar(
+        select(Invoice.invoice_id).where(Invoice.invoice_id >= lower).order_by(Invoice.invoice_id)
+        .offset(chunk_invoices).limit(1)
+    )
+    chunk = (Invoice.invoice_id >= lower,) + ((Invoice.invoice_id < upper,) if upper is not None else ())
+    day = cast(Invoice.issue_date, Date)
+    counted = select(
+        day, Invoice.price_type, Invoice.payment_method, Invoice.status,
+        func.count(), func.sum(cast(func.coalesce(Invoice.total_price, 0), Numeric))
+    ).where(Invoice.issue_date.isnot(None), *chunk).group_by(day, Invoice.price_type, Invoice.payment_method, Invoice.status)
+    stmt = insert(Revenue_daily).from_select(
+        ['day', 'price_type', 'payment_method', 'status', 'invoice_count', 'total_amount'], counted
+    )
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[Revenue_daily.day, Revenue_daily.price_type, Revenue_daily.payment_method, Revenue_daily.status],
+        set_={
+            'invoice_count': Revenue_daily.invoice_count + stmt.excluded.invoice_count,
+            'total_amount': Revenue_daily.total_amount + stmt.excluded.total_amount
+        }
+    ))
+    processed = session.scalar(select(func.count()).select_from(Invoice).where(*chunk))
+
+    if upper is None:
+        # Everything is counted; from now on the triggers maintain every invoice
+        session.delete(backfill)
+        return processed, True
+    backfill.next_invoice_id = upper
+    return processed, False
+
+
+def backfill_revenue(chunk_invoices: int = REVENUE_BACKFILL_CHUNK) -> Optional[Dict[str, Any]]:
+    """
+    Rebuilds revenue_daily from the invoice table, chunk_invoices invoices (in invoice_id order) per
+    transaction, while the app keeps writing: until the rebuild reaches an invoice, the revenue triggers
+    leave its changes to the rebuild. A rebuild that stopped continues from its cursor when run again.
+    Returns the number of invoices counted and the throughput, or None if it stopped on an error.
+    """
+    started = perf_counter()
+    counted = 0
+    try:
+        with separate_session_scope() as session:
+            _lock_revenue_rollup(session)
+            if session.get(Revenue_backfill, 1) is None:
+                session.execute(delete(Revenue_daily))
+                session.add(Revenue_backfill(next_invoice_id=0, started_at=datetime.now()))
+            else:
+                print("Resuming the revenue rebuild that was in progress.")
+
+        finished = False
+        while not finished:
+            with separate_session_scope() as session:
+                processed, finished = _backfill_next_chunk(session, chunk_invoices)
+            counted += processed
+            print(f"Revenue rebuild: {counted} invoices counted so far.")
+    except Exception as e:
+        print(f"Error: Revenue rebuild stopped; run it again to resume. Details: {e}")
+        return None
+
+    seconds = perf_counter() - started
+    print(f"Success: Revenue rollup rebuilt from {counted} invoices in {seconds:.2f}s.")
+    return {
+        'invoices': counted,
+        'seconds': round(seconds, 3),
+        'invoices_per_second': round(counted / seconds, 1) if seconds > 0 else None
+    }
+
+
+if __name__ == "__main__":
+    # Rebuild revenue_daily from scratch: python -m app.Revenue_Service [--chunk 20000]
+    import argparse
+    import app.Admin_Service  # noqa: F401  (loads every model the invoice relationships refer to)
+
+    parser = argparse.ArgumentParser(description="Rebuild the revenue rollup from the invoice table in chunks.")
+    parser.add_argument('--chunk', type=int, default=REVENUE_BACKFILL_CHUNK, help="invoices per transaction")
+    args = parser.parse_args()
+    raise SystemExit(0 if backfill_revenue(args.chunk) else 1)
@@ -0,0 +1,170 @@
+from models.base import SessionLocal
+from models.classes import Classes
+from bisect import bisect_left
+from collections import namedtuple, defaultdict
+from datetime import datetime
+from threading import Lock, RLock
+from time import monotonic
+from typing import Dict, List, Optional
+
+# Lightweight copy of a class booking, safe to keep after the session that loaded it is closed
+Booking = namedtuple('Booking', ['class_id', 'trainer_id', 'room_id', 'start_time', 'end_time'])
+
+
+class _Timeline:
+    """
+    Bookings of one trainer (or one room), sorted by start_time.
+    The exclusion constraints on classes guarantee they never overlap, so their end times are
+    sorted too, and an overlap query is one binary search plus the matches themselves.
+    """
+
+    def __init__(self):
+        self._starts: List[datetime] = []
+        self._bookings: List[Booking] = []
+
+    def add(self, booking: Booking):
+        index = bisect_left(self._starts, booking.start_time)
+        self._starts.insert(index, booking.start_time)
+        self._bookings.insert(index, booking)
+
+    def remove(self, booking: Booking):
+        index = bisect_left(self._starts, booking.start_time)
+        while index < len(self._bookings) and self._starts[index] == booking.start_time:
+            if self._bookings[index].class_id == booking.class_id:
+                del self._starts[index]
+                del self._bookings[index]
+                return
+            index += 1
+
+    def overlapping(self, start_time: datetime, end_time: datetime) -> List[Booking]:
+        # Every booking starting before end_time is a candidate; walk back while they still end after start_time
+        index = bisect_left(self._starts, end_time) - 1
+        matches = []
+        while index >= 0 and self._bookings[index].end_time > start_time:
+            matches.append(self._bookings[index])
+            index -= 1
+        matches.reverse()
+        return matches
+
+
+class ScheduleIndex:
+    """
+    Per-process index of upcoming class bookings keyed by trainer and by room.
+
+    It answers overlap questions without a database round trip. Writes made through the
+    admin service update it after they commit, and it is rebuilt from the database every
+    refresh_seconds to pick up writes made by other processes, so it can be that far behind.
+    It only serves the interactive pre-check: writes ask the database, and the exclusion
+    constraints on classes remain the final authority when a booking commits.
+    """
+
+    def __init__(self, refresh_seconds: float = 60):
+        self.refresh_seconds = refresh_seconds
+        self._lock = RLock()
+        # Serializes rebuilds; puts and removes made while one runs are replayed onto its result
+        self._load_lock = Lock()
+        self._changes_during_load: Optional[List[tuple]] = None
+        self._loaded_at: Optional[datetime] = None
+        self._expires_at = 0.0
+        self._by_class: Dict[int, Booking] = {}
+        self._by_trainer: Dict[int, _Timeline] = defaultdict(_Timeline)
+        self._by_room: Dict[int, _Timeline] = defaultdict(_Timeline)
+
+    def find_conflicts(
+        self,
+        trainer_id: int,
+        room_id: int,
+        start_time: datetime,
+        end_time: datetime,
+        exclude_class_id: Optional[int] = None
+    ):
+        """
+        Returns (trainer_conflict, room_conflict) bookings overlapping [start_time, end_time),
+        or None when the slot starts before the indexed window and the caller must ask the database.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if start_time < self._loaded_at:
+                return None
+            return (
+                self._first_other(self._by_trainer.get(trainer_id), start_time, end_time, exclude_class_id),
+                self._first_other(self._by_room.get(room_id), start_time, end_time, exclude_class_id),
+            )
+
+    def put(self, booking: Booking):
+        """Adds a booking, or moves it if the class is already indexed."""
+        with self._lock:
+            if self._changes_during_load is not None:
+                self._changes_during_load.append((self.put, booking))
+            if self._loaded_at is None:
+                return
+            self._discard(booking.class_id)
+            if booking.end_time > self._loaded_at:
+                self._by_class[booking.class_id] = booking
+                self._by_trainer[booking.trainer_id].add(booking)
+                self._by_room[booking.room_id].add(booking)
+
+    def remove(self, class_id: int):
+        with self._lock:
+            if self._changes_during_load is not None:
+                self._changes_during_load.append((self.remove, class_id))
+            self._discard(class_id)
+
+    def clear(self):
+        """Forces a rebuild from the database on the next query."""
+        with self._lock:
+            self._loaded_at = None
+            self._expires_at = 0.0
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            with self._lock:
+                if self._loaded_at is not None and monotonic() < self._expires_at:
+                    return
+                self._changes_during_load = []
+            try:
+                # A session of its own: the caller's may hold uncommitted changes, and the shared index
+                # must only ever see committed bookings. Queries keep using the old copy meanwhile.
+                now = datetime.now()
+                with SessionLocal() as session:
+                    rows = session.query(
+                        Classes.class_id, Classes.trainer_id, Classes.room_id, Classes.start_time, Classes.end_time
+                    ).filter(Classes.end_time > now).order_by(Classes.start_time).all()
+            except Exception:
+                with self._lock:
+                    self._changes_during_load = None
+                raise
+
+            with self._lock:
+                self._by_class = {}
+                self._by_trainer = defaultdict(_Timeline)
+                self._by_room = defaultdict(_Timeline)
+                for row in rows:
+                    booking = Booking(*row)
+                    self._by_class[booking.class_id] = booking
+                    self._by_trainer[booking.trainer_id].add(booking)
+                    self._by_room[booking.room_id].add(booking)
+                self._loaded_at = now
+                self._expires_at = monotonic() + self.refresh_seconds
+                changes, self._changes_during_load = self._changes_during_load, None
+                for apply, argument in changes:
+                    apply(argument)
+
+    def _discard(self, class_id: int):
+        booking = self._by_class.pop(class_id, None)
+        if booking is not None:
+            self._by_trainer[booking.trainer_id].remove(booking)
+            self._by_room[booking.room_id].remove(booking)
+
+    @staticmethod
+    def _first_other(timeline: Optional[_Timeline], start_time, end_time, exclude_class_id) -> Optional[Booking]:
+        if timeline is None:
+            return None
+        for booking in timeline.overlapping(start_time, end_time):
+            if booking.class_id != exclude_class_id:
+                return booking
+        return None
+
+
+# Shared by every request handled by this process
+schedule_index = ScheduleIndex()
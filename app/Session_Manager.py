@@ -0,0 +1,198 @@
+from models.base import SessionLocal
+from contextvars import ContextVar
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, NoResultFound
+from sqlalchemy.orm import Session
+
+# The session of the unit of work currently in progress (None outside of one).
+# A ContextVar keeps concurrent requests on separate threads from seeing each other's session.
+_current_session: ContextVar[Optional[Session]] = ContextVar('_current_session', default=None)
+
+
+def get_current_session() -> Optional[Session]:
+    """Returns the session of the active unit of work, or None if there is none."""
+    return _current_session.get()
+
+
+@contextmanager
+def session_scope():
+    """
+    Opens a unit of work: one session, one transaction, one commit (or rollback) at the end.
+    If a unit of work is already active, its session is reused and nothing is committed here.
+    """
+    outer_session = _current_session.get()
+    if outer_session is not None:
+        yield outer_session
+        return
+
+    session = SessionLocal()
+    token = _current_session.set(session)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+
+@contextmanager
+def separate_session_scope():
+    """
+    session_scope that always opens a new unit of work, committed on exit even when called inside another
+    one (e.g. a request). Long jobs use it to commit their progress step by step.
+    """
+    token = _current_session.set(None)
+    try:
+        with session_scope() as session:
+            yield session
+    finally:
+        _current_session.reset(token)
+
+
+# Helper for opening and closing sessions
+def execute_transaction(func):
+    """Decorator to handle session management (open, commit, rollback, close).
+    The decorated function must accept 'session' as its first argument.
+
+    Calls made inside an active unit of work (a Flask request, or another decorated call)
+    reuse its session and run inside a SAVEPOINT, so a failing call only undoes its own work.
+    Calls made outside of one open their own session and commit when they return.
+    Functions that only read use read_transaction instead.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _current_session.get()
+        if session is None:
+            with session_scope() as session:
+                return _run_in_transaction(session, session.begin, func, args, kwargs)
+        return _run_in_transaction(session, session.begin_nested, func, args, kwargs)
+    return wrapper
+
+
+def read_transaction(func):
+    """Decorator for service functions that only read; the decorated function accepts 'session' first.
+
+    Calls made inside an active unit of work run directly in its transaction: there is nothing to undo,
+    so they skip the SAVEPOINT and its two extra round trips. Calls made outside of one open their own
+    session, like execute_transaction. Errors are reported the same way (printed, None returned); a
+    database error in such a read leaves the unit of work's transaction failed, as any statement would.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _current_session.get()
+        if session is None:
+            with session_scope() as session:
+                return _run_in_transaction(session, session.begin, func, args, kwargs)
+        return _run_in_transaction(session, None, func, args, kwargs)
+    return wrapper
+
+
+def _run_in_transaction(session: Session, begin, func, args, kwargs):
+    # begin is None for reads inside the unit of work, which run in its transaction as they are
+    transaction = begin() if begin is not None else None
+    # Callbacks queued by this call are dropped with its work if it rolls back
+    queued = len(session.info.get('after_commit', ()))
+    # The first argument 'session' is provided by the decorator
+    args_with_session = (session,) + args
+    try:
+        result = func(*args_with_session, **kwargs)
+        if transaction is not None:
+            transaction.commit()
+        return result
+    except IntegrityError as e:
+        _rollback(session, transaction, queued)
+        print(f"Error: Database constraint violation during {func.__name__}. Details: {e}")
+        return None
+    except NoResultFound as e:
+        _rollback(session, transaction, queued)
+        print(f"Error: No result found during {func.__name__}. Details: {e}")
+        return None
+    except Exception as e:
+        _rollback(session, transaction, queued)
+        print(f"Error: An unexpected error occurred during {func.__name__}. Details: {e}")
+        return None
+
+
+def _rollback(session: Session, transaction, queued: int):
+    if transaction is not None:
+        transaction.rollback()
+    del session.info.get('after_commit', [])[queued:]
+
+
+def run_after_commit(callback: Callable[[], None]):
+    """
+    Runs the callback once the active unit of work has committed (used for cache invalidation).
+    It is dropped if the unit of work, or the decorated call that queued it, rolls back,
+    and runs immediately if none is active.
+    """
+    session = _current_session.get()
+    if session is None:
+        callback()
+        return
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _run_after_commit_callbacks(session: Session):
+    # Also fired when a SAVEPOINT is released; the callbacks wait for the outermost commit
+    if session.in_nested_transaction():
+        return
+    for callback in session.info.pop('after_commit', []):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Error: after-commit callback {callback} failed. Details: {e}")
+
+
+@event.listens_for(SessionLocal, 'after_transaction_end')
+def _discard_after_commit_callbacks(session: Session, transaction):
+    # Reached after the outermost transaction ends; anything still queued was rolled back.
+    if transaction.parent is None:
+        session.info.pop('after_commit', None)
+
+
+# --- Flask integration ---
+
+def init_app(app):
+    """Binds one unit of work to every Flask request handled by the app."""
+    from flask import g
+
+    @app.before_request
+    def _open_request_session():
+        session = SessionLocal()
+        g.db_session = session
+        g.db_session_token = _current_session.set(session)
+
+    @app.after_request
+    def _commit_request_session(response):
+        # Commit before the response leaves, so a failed commit is never reported as a success.
+        session = g.pop('db_session', None)
+        if session is not None:
+            try:
+                session.commit()
+            finally:
+                _close_request_session(session)
+        return response
+
+    @app.teardown_request
+    def _rollback_request_session(exc):
+        # Only reached with an open session when the view (or another hook) raised.
+        session = g.pop('db_session', None)
+        if session is not None:
+            session.rollback()
+            _close_request_session(session)
+
+
+def _close_request_session(session: Session):
+    from flask import g
+
+    token = g.pop('db_session_token', None)
+    if token is not None:
+        _current_session.reset(token)
+    session.close()
@@ -1,58 +1,42 @@
 from models.base import SessionLocal
+from app.Session_Manager import execute_transaction as _execute_transaction, read_transaction as _read_transaction, run_after_commit
+from app.Auth_Service import forget_failed_logins
+from app.Reference_Data import bump_reference_data_version
+from app.Change_Stamps import trainer_stamp, bump_stamps, stamp_etag
+from app.Admin_Service import invalidate_admin_dashboards
+from app.Pagination import keyset_page
 from models.trainer import Trainer
 from models.classes import Classes
 from models.trainer_availability import Trainer_availability
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy import func, and_, cast, Time
 from sqlalchemy.orm import Session 
 
-# Helper for opening and closing sessions
-def _execute_transaction(func):
-    """Decorator to handle session management (open, commit, rollback, close).
-    The decorated function must accept 'session' as its first argument.
-    """
-    def wrapper(*args, **kwargs):
-        session = SessionLocal()
-        # The first argument 'session' is provided by the decorator
-        # We need to prepend the session to the arguments list
-        args_with_session = (session,) + args
-        try:
-            result = func(*args_with_session, **kwargs)
-            
-            # Commit only for functions that are intended to write data
-            write_functions = ['register_trainer', 'update_trainer_availability']
-            if func.__name__ in write_functions:
-                session.commit()
-                print(f"Transaction committed for {func.__name__}.")
-                
-            return result
-        except IntegrityError as e:
-            session.rollback()
-            print(f"Error: Database constraint violation during {func.__name__}. Details: {e}")
-            return None
-        except Exception as e:
-            session.rollback()
-            print(f"Error: An unexpected error occurred during {func.__name__}. Details: {e}")
-            return None
-        finally:
-            session.close()
-    return wrapper
-
 #register trainer
 @_execute_transaction
-def register_trainer(session: Session, name: str) -> Optional[Trainer]:
+def register_trainer(session: Session, name: str, email: str, password: str, start_date: Optional[date] = None) -> Optional[int]:
+    """Registers a new trainer and returns their ID (None on failure, e.g. a duplicate email)."""
+    # trainer_id is assigned by the trainer_trainer_id_seq sequence
     new_trainer = Trainer(
+        trainer_id=None,
+        email=email,
         name=name,
-        start_date=datetime.now()
+        start_date=start_date or datetime.now(),
+        password=password
     )
     session.add(new_trainer)
+    session.flush()
+    # Trainers are reference data cached by every process, and listed on the admin dashboard
+    bump_reference_data_version(session)
+    invalidate_admin_dashboards()
+    run_after_commit(lambda: forget_failed_logins(email))
     print(f"Success: New Trainer {name} registered.")
-    return new_trainer
+    return new_trainer.trainer_id
 
 #get trianer_id
-@_execute_transaction
+@_read_transaction
 def get_trainer_id(session: Session, name: str) -> Optional[int]:
     try:
         trainer_id = session.query(Trainer.trainer_id).filter(
@@ -69,9 +53,19 @@ def get_trainer_id(session: Session, name: str) -> Optional[int]:
         print(f"ERROR during get_trainer_id: {e}")
         return None
 
+def trainer_board_etag(trainer_id: int) -> str:
+    """ETag of the trainer dashboard, read from the trainer's change stamp (their classes and availability)."""
+    # The board only lists classes that have not started yet, so the tag also rolls over every minute
+    return stamp_etag([trainer_stamp(trainer_id)], fresh_for_seconds=60)
+
+def trainer_schedule_etag(trainer_id: int, start_date: date, end_date: date,
+                          limit: Optional[int] = None, after: Optional[str] = None) -> str:
+    """ETag of one page of view_trainer_schedule for a date range, read from the trainer's change stamp."""
+    return stamp_etag([trainer_stamp(trainer_id)], start_date, end_date, limit, after)
+
 #each trainer's dashboard
 # Trainer_Service.py, inside get_trainer_board
-@_execute_transaction
+@_read_transaction
 def get_trainer_board(session: Session, trainer_id: int) -> Optional[Dict[str, Any]]:
     trainer = session.query(Trainer).filter(Trainer.trainer_id == trainer_id).first()
     if not trainer:
@@ -172,26 +166,38 @@ def update_trainer_availability(session: Session, trainer_id: int, day_of_week:
             end_time=end_time_dt
         )
         session.add(new_availability)
+        bump_stamps(session, trainer_stamp(trainer_id))
         print(f"Success: Added new availability for Trainer {trainer_id} on {day_of_week} from {start_time_str} to {end_time_str}.")
         
     return True
 
 
 # view full schedule
-@_execute_transaction
-def view_trainer_schedule(session: Session, trainer_id: int, start_date: date, end_date: date) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+@_read_transaction
+def view_trainer_schedule(
+    session: Session,
+    trainer_id: int,
+    start_date: date,
+    end_date: date,
+    limit: Optional[int] = None,
+    after: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
     """
     Retrieves the full schedule (Classes and PT Sessions) for a trainer within a date range.
+    With a limit, only that many classes are returned and 'next_after' holds the token for the next page.
     """
     trainer = session.query(Trainer).filter(Trainer.trainer_id == trainer_id).first()
     if not trainer:
         print(f"Error: Trainer ID {trainer_id} not found.")
         return None
 
-    classes_schedule = session.query(Classes).filter(
+    classes_query = session.query(Classes).filter(
         Classes.trainer_id == trainer_id,
-        Classes.start_time.between(start_date, end_date + datetime.timedelta(days=1)) # Include end of end_date
-    ).order_by(Classes.start_time).all()
+        Classes.start_time.between(start_date, end_date + timedelta(days=1)) # Include end of end_date
+    )
+    classes_schedule = keyset_page(
+        classes_query, [Classes.start_time, Classes.class_id], lambda c: (c.start_time, c.class_id), limit, after
+    )
 
 
     schedule_data = {
@@ -202,12 +208,13 @@ def view_trainer_schedule(session: Session, trainer_id: int, start_date: date, e
                 "duration_minutes": 90,
                 "room_id": c.room_id
             } for c in classes_schedule
-        ]
+        ],
+        "next_after": classes_schedule.next_after
     }
 
     
     return schedule_data
-@_execute_transaction
+@_read_transaction
 def check_trainer(session: Session, email: str, password: str) -> Optional[int]:
     trainer = session.query(Trainer).filter(Trainer.email == email).first()
 
@@ -1,20 +1,20 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from datetime import datetime, date
+import hmac
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, make_response, Response
+from datetime import datetime, date, timedelta
 import sys
 import logging
 from functools import wraps
 #from app.Member_Service import register_member, get_member_dashboard_data
 from app.Admin_Service import check_admin
 from app.Trainer_Service import check_trainer
-
-# Assuming db_init provides the initialization function
-try:
-    from db_init import initialize
-except ImportError:
-    # Placeholder if db_init.py is not provided, assumes initialization happens elsewhere or is stubbed
-    def initialize():
-        print("Warning: db_init.py or initialize() not found. Database setup might be skipped.")
+from app.Auth_Service import resolve_login
+from app import Session_Manager
+from models.base import engine
+from models.pool import get_pool_status
+from app.Pagination import page_size
+from app.Index_Audit import report_missing_indexes
+from db_migrate import check_schema_version
 
 # --- Setup logging and Path ---
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,11 +25,23 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # --- Import Service functions ---
 try:
     # Member Service Imports
-    from app.Member_Service import register_member,set_profile,cancel_member_class_enrollment,log_health, get_profile, check_member, update_member_goal,get_member_dashboard_data,get_available_classes,enroll_in_class
+    from app.Member_Service import register_member,set_profile,cancel_member_class_enrollment,log_health, get_profile, check_member, update_member_goal,get_member_dashboard_data,get_available_classes,enroll_in_class, member_dashboard_etag, class_schedule_etag, get_metric_trend, metric_trend_etag, get_metric_history, metric_history_etag, ingest_device_readings, MAX_SYNC_READINGS
     # Admin Service Imports
-    from app.Admin_Service import update_room, delete_class, update_class, get_all_classes, get_all_trainers, get_class_id, get_all_rooms,get_admin_dashboard_data, register_trainer, update_invoice, schedule_new_class, make_invoice, view_member_invoices, delete_room, update_room, add_room
+    from app.Admin_Service import schedule_recurring_classes, find_class_conflict, update_room, delete_class, update_class, get_all_classes, get_all_trainers, get_class_id, get_all_rooms,get_admin_dashboard_data, update_invoice, schedule_new_class, make_invoice, view_member_invoices, delete_room, update_room, add_room
     # Trainer Service Imports
-    from app.Trainer_Service import update_trainer_availability, view_trainer_schedule, get_trainer_board
+    from app.Trainer_Service import register_trainer, update_trainer_availability, view_trainer_schedule, get_trainer_board, trainer_board_etag, trainer_schedule_etag
+    # Enrollment bursts go through the per-class admission queue
+    from app.Enrollment_Queue import enrollment_queue
+    # Trainers and rooms are served from memory while their version counter is unchanged
+    from app.Reference_Data import reference_data
+    # Streaming CSV/JSONL exports for admins
+    from app.Export_Service import stream_export, export_filename, EXPORT_DATASETS, EXPORT_FORMATS
+    # Moves unpaid invoices past their due date to Overdue in the background
+    from app.Invoice_Sweeper import overdue_sweeper
+    # Revenue reports read from the revenue_daily rollup
+    from app.Revenue_Service import get_revenue_report, REVENUE_DIMENSIONS
+    # Monthly membership billing
+    from app.Billing_Service import run_monthly_billing, run_billing, MEMBERSHIP_PRICE_TYPE
 except ImportError as e:
     logger.error(f"FATAL: Failed to import service module. Check file names and function definitions: {e}")
     # Define placeholder functions to avoid application crash during startup
@@ -51,6 +63,8 @@ except ImportError as e:
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'a_very_secret_key_for_session_management')
+# One database session per request, shared by every service call the request makes
+Session_Manager.init_app(app)
 
 
 # --- Decorators for Role-Based Access Control (RBAC) ---
@@ -82,6 +96,27 @@ def role_required(required_role):
     return decorator
 
 
+# --- Conditional GET (ETag) helpers ---
+
+def is_not_modified(etag):
+    """True when the client already holds this exact version (flashed messages make pages differ, so never while any are pending)."""
+    return etag is not None and etag in request.if_none_match and not session.get('_flashes')
+
+def not_modified_response(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def with_etag(response, etag):
+    response = make_response(response)
+    if etag is not None:
+        response.set_etag(etag)
+    # Always revalidate: the ETag makes an unchanged page a cheap 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 # --- Public Routes (Login/Logout/Register) ---
 
 @app.route('/')
@@ -97,26 +132,14 @@ def show_login():
 def api_login():
     email = request.form.get('email')
     password = request.form.get('password')
-    print(email)
-    print(password)
-
-    member_id = check_member(email,password)
-    admin_id = check_admin(email,password)
-    trainer_id = check_trainer(email, password)
-    if member_id:
-        session['user_id'] = member_id
-        session['user_role'] = 'member'
-        return redirect(url_for('member_dashboard'))
-    elif admin_id:
-        session['user_id'] = admin_id
-        session['user_role'] = 'admin'
-        return redirect(url_for('admin_dashboard'))
-    elif trainer_id:
-        session['user_id'] = trainer_id
-        session['user_role'] = 'trainer'
-        return redirect(url_for('trainer_dashboard'))
-    else:
-        print("ERORRRRRRRR")
+
+    # One query resolves the role (member, admin or trainer) and the ID
+    account = resolve_login(email, password)
+    if account:
+        role, user_id = account
+        session['user_id'] = user_id
+        session['user_role'] = role
+        return redirect(url_for(f'{role}_dashboard'))
     flash('Invalid email or password.', 'error')
     return redirect(url_for('show_login'))
 
@@ -136,16 +159,28 @@ def show_registration():
 def show_class_schedule():
     """Displays the list of all available classes for enrollment."""
     member_id = session.get('user_id') # Get member ID
+
+    limit = page_size(request.args.get('limit', type=int))
+    after = request.args.get('after')
+
+    # Unchanged catalogue and enrollments: the tablet already shows this page
+    etag = class_schedule_etag(member_id=member_id, limit=limit, after=after)
+    if is_not_modified(etag):
+        return not_modified_response(etag)
     
-    # Fetch all available classes, checking for current member's enrollment status
-    available_classes = get_available_classes(member_id=member_id) 
+    # Fetch one page of available classes, checking for current member's enrollment status
+    available_classes = get_available_classes(member_id=member_id, limit=limit, after=after)
+    if available_classes is None:
+        # No ETag: a failed load must not be cached as an empty schedule
+        flash('Could not load the class schedule, please try again.', 'error')
+        return render_template('class_register.html', classes=None, user_role='member')
 
     # Pass the list of classes to the class_schedule.html template (renamed from class_register.html)
-    return render_template(
+    return with_etag(render_template(
         'class_register.html', 
         classes=available_classes,
         user_role='member'
-    )
+    ), etag)
 
 
 @app.route('/api/class/register', methods=['POST'])
@@ -159,13 +194,16 @@ def api_register_class():
         flash('Invalid class selected.', 'error')
         return redirect(url_for('show_class_schedule'))
 
-    success = enroll_in_class(member_id=member_id, class_id=class_id)
+    result = enrollment_queue.enroll(member_id=member_id, class_id=class_id)
     
-    if success:
+    if result:
         flash('Successfully registered for the class!', 'success')
+    elif getattr(result, 'reason', None) == 'pending':
+        # Still being applied: not a refusal, the member should check before submitting again
+        flash(result.message, 'warning')
     else:
-        # The service function handles specific error messages (like full or already enrolled)
-        flash('Failed to register for the class. It might be full, you are already enrolled, or the class time has passed.', 'error')
+        # The service reports why the enrollment was refused (full, already enrolled, started)
+        flash(getattr(result, 'message', None) or 'Failed to register for the class. It might be full, you are already enrolled, or the class time has passed.', 'error')
         
     return redirect(url_for('show_class_schedule'))
 
@@ -225,13 +263,13 @@ def api_cancel_enrollment():
         flash('Invalid class selected for cancellation.', 'error')
         return redirect(url_for('show_class_schedule'))
 
-    success = cancel_member_class_enrollment(member_id=member_id, class_id=class_id)
+    result = cancel_member_class_enrollment(member_id=member_id, class_id=class_id)
     
-    if success:
+    if result:
         flash('Successfully cancelled your class enrollment.', 'success')
     else:
-        # The service function handles specific error messages (like already started or not enrolled)
-        flash('Failed to cancel enrollment. You might not be registered or the class has already started.', 'error')
+        # The service reports why the cancellation was refused (already started or not enrolled)
+        flash(getattr(result, 'message', None) or 'Failed to cancel enrollment. You might not be registered or the class has already started.', 'error')
         
     return redirect(url_for('show_class_schedule'))
 
@@ -241,9 +279,14 @@ def api_cancel_enrollment():
 @role_required('member')
 def member_dashboard():
     member_id = session.get('user_id')
+
+    # Nothing the dashboard shows has changed since the client's last poll
+    etag = member_dashboard_etag(member_id=member_id)
+    if is_not_modified(etag):
+        return not_modified_response(etag)
     
     # 1. Call the service function to fetch data
-    dashboard_data = get_member_dashboard_data(member_id=member_id)
+    dashboard_data = get_member_dashboard_data(member_id=member_id, etag=etag)
 
     if not dashboard_data:
         flash("Could not retrieve dashboard data.", 'error')
@@ -251,11 +294,11 @@ def member_dashboard():
         return redirect(url_for('show_login')) 
 
     # 2. Pass the retrieved data to the template
-    return render_template(
+    return with_etag(render_template(
         'member dash.html', 
         user_id=member_id, 
         user_role='member',
-        data=dashboard_data)
+        data=dashboard_data), etag)
 
 @app.route('/profile/edit', methods=['GET'])
 @role_required('member')
@@ -277,6 +320,10 @@ def show_edit_profile():
 @role_required('trainer')
 def trainer_dashboard():
     trainer_id = session.get('user_id')
+    # Neither the trainer's classes nor their availability changed since the client's last poll
+    etag = trainer_board_etag(trainer_id=trainer_id)
+    if is_not_modified(etag):
+        return not_modified_response(etag)
      # 1. Call the service function to fetch data
     dashboard_data = get_trainer_board(trainer_id=trainer_id)
 
@@ -286,34 +333,36 @@ def trainer_dashboard():
         return redirect(url_for('show_login')) 
 
     # 2. Pass the retrieved data to the template
-    return render_template(
+    return with_etag(render_template(
         'trainer dash.html', 
         user_id=trainer_id, 
         user_role='trainer',
-        data=dashboard_data)
+        data=dashboard_data), etag)
 
 
 @app.route('/dashboard/admin', methods=['GET'])
 @role_required('admin')
 def admin_dashboard():
     admin_id = session.get('user_id')
-    # 1. Call the service function to fetch data
+    # 1. Call the service function to fetch data (classes, trainers, rooms and counts in one go)
     dashboard_data = get_admin_dashboard_data(admin_id=admin_id)
-    trainers = get_all_trainers()
-    rooms = get_all_rooms()
     if not dashboard_data:
         flash("Could not retrieve dashboard data.", 'error')
         # Redirect to login if data fetch fails, or show a simpler error page
         return redirect(url_for('show_login')) 
 
+    # The browser already has this exact page
+    if is_not_modified(dashboard_data['etag']):
+        return not_modified_response(dashboard_data['etag'])
+
     # 2. Pass the retrieved data to the template
-    return render_template(
+    return with_etag(render_template(
         'admin dash.html', 
         user_id=admin_id,
         user_role='admin',
-        all_trainers = trainers,
-        all_rooms = rooms,
-        data=dashboard_data)
+        all_trainers = dashboard_data['trainers'],
+        all_rooms = dashboard_data['rooms'],
+        data=dashboard_data), dashboard_data['etag'])
 
 
 # ----------------------------------------------------------------------
@@ -332,13 +381,16 @@ def api_enroll_in_class(member_id):
         flash('Invalid Class ID provided.', 'error')
         return redirect(url_for('member_dashboard')) # Or specific class listing page
 
-    success = enroll_in_class(member_id=member_id, class_id=class_id)
+    result = enrollment_queue.enroll(member_id=member_id, class_id=class_id)
 
-    if success:
+    if result:
         flash('Successfully enrolled in the class!', 'success')
+    elif getattr(result, 'reason', None) == 'pending':
+        # Still being applied: not a refusal, the member should check before submitting again
+        flash(result.message, 'warning')
     else:
-        # Service layer should provide specific error reasons (full, already enrolled)
-        flash('Enrollment failed. The class may be full or you are already registered.', 'error')
+        # The service reports why the enrollment was refused (full, already enrolled, started)
+        flash(getattr(result, 'message', None) or 'Enrollment failed. The class may be full or you are already registered.', 'error')
     
     return redirect(url_for('member_dashboard'))
 
@@ -355,12 +407,12 @@ def api_log_metric(member_id):
         height = float(data.get('height'))
         heart_rate = int(data.get('heart_rate'))
         record_date_str = data.get('record_date')
-        record_date = datetime.strptime(record_date_str, '%Y-%m-%d').date()
+        record_date = datetime.strptime(record_date_str, '%Y-%m-%d') if record_date_str else None
     except Exception:
         flash('Invalid input for metric logging.', 'error')
         return redirect(url_for('member_dashboard'))
 
-    success = log_health_metric(
+    success = log_health(
         member_id=member_id,
         record_date=record_date,
         weight=weight,
@@ -376,6 +428,89 @@ def api_log_metric(member_id):
     return redirect(url_for('member_dashboard'))
 
 
+@app.route('/api/member/<int:member_id>/metrics/trend', methods=['GET'])
+@role_required('member')
+def api_metric_trend(member_id):
+    """
+    Weight and heart-rate trend for charts: ?period=day|week|month&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD.
+    Defaults to weekly points over the last 6 months.
+    """
+    if session.get('user_id') != member_id:
+        return jsonify({'message': 'Unauthorized ID.'}), 403
+
+    period = request.args.get('period', 'week')
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else date.today()
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else end_date - timedelta(days=182)
+    except ValueError:
+        return jsonify({'message': 'start_date and end_date must be YYYY-MM-DD.'}), 400
+
+    etag = metric_trend_etag(member_id=member_id, period=period, start_date=start_date, end_date=end_date)
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+
+    points = get_metric_trend(member_id=member_id, period=period, start_date=start_date, end_date=end_date)
+    if points is None:
+        return jsonify({'message': 'Could not load the trend. period must be day, week or month.'}), 400
+    return with_etag(jsonify({'member_id': member_id, 'period': period, 'points': points}), etag)
+
+
+# Bounds for the number of points a metric history chart may ask for
+MAX_HISTORY_POINTS = 2000
+
+@app.route('/api/member/<int:member_id>/metrics/history', methods=['GET'])
+@role_required('member')
+def api_metric_history(member_id):
+    """
+    Chart-ready weight and heart-rate history for any date range, downsampled on the server:
+    ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&points=200. Defaults to the last year at 200 points.
+    """
+    if session.get('user_id') != member_id:
+        return jsonify({'message': 'Unauthorized ID.'}), 403
+
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else date.today()
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else end_date - timedelta(days=365)
+    except ValueError:
+        return jsonify({'message': 'start_date and end_date must be YYYY-MM-DD.'}), 400
+    points = max(3, min(request.args.get('points', 200, type=int), MAX_HISTORY_POINTS))
+
+    etag = metric_history_etag(member_id=member_id, start_date=start_date, end_date=end_date, points=points)
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+
+    history = get_metric_history(member_id=member_id, start_date=start_date, end_date=end_date, points=points)
+    if history is None:
+        return jsonify({'message': 'Could not load the metric history.'}), 500
+    return with_etag(jsonify(history), etag)
+
+
+@app.route('/api/devices/metrics/sync', methods=['POST'])
+def api_device_metrics_sync():
+    """
+    Batch upload from wearables and smart scales: {"readings": [{member_id, device_id, recorded_at, weight, height, heart_rate}, ...]}.
+    Devices authenticate with 'Authorization: Bearer <DEVICE_SYNC_TOKEN>'. Re-sending a batch is safe.
+    """
+    expected = os.environ.get('DEVICE_SYNC_TOKEN')
+    if not expected:
+        return jsonify({'message': 'Device sync is not configured.'}), 503
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied.encode('utf-8'), expected.encode('utf-8')):
+        return jsonify({'message': 'Invalid device token.'}), 401
+
+    data = request.get_json(silent=True)
+    readings = data.get('readings') if isinstance(data, dict) else None
+    if not isinstance(readings, list):
+        return jsonify({'message': 'Body must be JSON with a "readings" list.'}), 400
+    if len(readings) > MAX_SYNC_READINGS:
+        return jsonify({'message': f'At most {MAX_SYNC_READINGS} readings per sync.'}), 413
+
+    result = ingest_device_readings(readings=readings)
+    if result is None:
+        return jsonify({'message': 'Could not store the readings.'}), 500
+    return jsonify(result)
+
+
 @app.route('/api/member/<int:member_id>/update_goal', methods=['POST'])
 @role_required('member')
 def api_update_goal(member_id):
@@ -500,9 +635,23 @@ def api_view_schedule(trainer_id):
     except Exception:
         # Default to a 7-day schedule if dates are not provided or invalid
         end_date = date.today()
-        start_date = end_date - datetime.timedelta(days=6)
+        start_date = end_date - timedelta(days=6)
+
+    limit = page_size(request.args.get('limit', type=int))
+    after = request.args.get('after')
 
-    schedule_data = view_trainer_schedule(trainer_id=trainer_id, start_date=start_date, end_date=end_date)
+    # The trainer's classes have not changed since the client's last poll
+    etag = trainer_schedule_etag(trainer_id=trainer_id, start_date=start_date, end_date=end_date, limit=limit, after=after)
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+
+    schedule_data = view_trainer_schedule(
+        trainer_id=trainer_id,
+        start_date=start_date,
+        end_date=end_date,
+        limit=limit,
+        after=after
+    )
     
     # In a real app, this would return JSON to be rendered by JS on the dashboard
     # For simplicity, we just flash a message if there's an error
@@ -510,7 +659,7 @@ def api_view_schedule(trainer_id):
         flash("Could not retrieve schedule.", 'error')
         return redirect(url_for('trainer_dashboard'))
         
-    return jsonify(schedule_data) # Send schedule data as JSON
+    return with_etag(jsonify(schedule_data), etag) # Send schedule data as JSON
 
 
 @app.route('/api/trainer/class/<int:class_id>/roster', methods=['GET'])
@@ -615,6 +764,52 @@ def api_create_class():
         
     return redirect(url_for('admin_dashboard'))
 
+WEEKDAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+@app.route('/api/admin/create_recurring_class', methods=['POST'])
+@role_required('admin')
+def api_create_recurring_class():
+    """
+    Schedules a weekly series in one request, e.g. Zumba every Tue/Thu 18:00 in room 1 with trainer 101
+    for 12 weeks. Accepts a form or a JSON body and returns the per-occurrence report as JSON.
+    """
+    data = request.get_json(silent=True) or request.form
+    weekdays_raw = data.get('weekdays') if request.is_json else request.form.getlist('weekdays')
+    try:
+        class_type = data.get('class_type').strip()
+        trainer_id = int(data.get('trainer_id'))
+        room_id = int(data.get('room_id'))
+        first_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d').date()
+        start_time = datetime.strptime(data.get('start_time'), '%H:%M').time()
+        weeks = int(data.get('weeks'))
+        number_members = int(data.get('number_members') or 0)
+        allow_partial = str(data.get('allow_partial', '')).lower() in ('1', 'true', 'on', 'yes')
+        # Weekdays may be given as numbers (0=Monday) or names ('Tue', 'thursday', ...)
+        weekdays = [
+            int(day) if str(day).isdigit() else WEEKDAY_NAMES.index(str(day).strip().lower()[:3])
+            for day in weekdays_raw
+        ]
+        if not class_type or not weekdays or not 1 <= weeks <= 52 or any(not 0 <= day <= 6 for day in weekdays):
+            raise ValueError('class_type, weekdays and 1-52 weeks are required')
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({'message': f'Invalid recurring class request: {e}'}), 400
+
+    report = schedule_recurring_classes(
+        trainer_id=trainer_id,
+        room_id=room_id,
+        class_type=class_type,
+        first_date=first_date,
+        start_time=start_time,
+        weekdays=weekdays,
+        weeks=weeks,
+        number_members=number_members,
+        allow_partial=allow_partial
+    )
+    if report is None:
+        # A concurrent booking hit the exclusion constraints, or the IDs were invalid
+        return jsonify({'message': 'Recurring class creation failed. Please retry.'}), 409
+    return jsonify(report), (201 if report['scheduled'] else 409)
+
 @app.route('/api/admin/remove_class/<int:class_id>', methods=['POST'])
 @role_required('admin')
 def api_remove_class(class_id):
@@ -682,8 +877,12 @@ def api_add_equipment():
 @role_required('admin')
 def admin_manage_classes():
     try:
-        # 1. Fetch all necessary data using the service layer functions
-        all_classes = get_all_classes()
+        # 1. Fetch one page of classes (latest first) plus the trainers and rooms for the form dropdowns
+        all_classes = get_all_classes(
+            limit=page_size(request.args.get('limit', type=int)),
+            after=request.args.get('after'),
+            with_total=True
+        )
         all_trainers = get_all_trainers()
         all_rooms = get_all_rooms()
         
@@ -731,11 +930,94 @@ def api_log_maintenance(equipment_id):
         
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/api/admin/pool_stats', methods=['GET'])
+@role_required('admin')
+def api_pool_stats():
+    """Live connection pool usage (checked out, overflow, waits, checkout latency histogram)."""
+    return jsonify(get_pool_status(engine))
+
+@app.route('/api/admin/billing/run', methods=['POST'])
+@role_required('admin')
+def api_admin_billing_run():
+    """
+    Bills every member for one month: period=YYYY-MM, total_price, payment_method, price_type (optional).
+    Posting run_id instead resumes a run that stopped; re-posting a period never bills anyone twice.
+    """
+    data = request.form
+    if data.get('run_id'):
+        report = run_billing(data.get('run_id', type=int))
+    else:
+        try:
+            period = datetime.strptime(data.get('period', ''), '%Y-%m').date()
+            total_price = float(data.get('total_price'))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'period (YYYY-MM) and total_price are required.'}), 400
+        report = run_monthly_billing(
+            period=period,
+            admin_id=session['user_id'],
+            total_price=total_price,
+            payment_method=data.get('payment_method') or 'Credit Card',
+            price_type=data.get('price_type') or MEMBERSHIP_PRICE_TYPE
+        )
+    if report is None:
+        return jsonify({'message': 'The billing run stopped. Post its run_id to resume it.'}), 500
+    return jsonify(report)
+
+@app.route('/api/admin/reports/revenue', methods=['GET'])
+@role_required('admin')
+def api_admin_revenue_report():
+    """
+    Invoiced, paid and outstanding amounts: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&group_by=day,price_type,payment_method.
+    Defaults to the last 30 days grouped by all three.
+    """
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else date.today()
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else end_date - timedelta(days=30)
+    except ValueError:
+        return jsonify({'message': 'start_date and end_date must be YYYY-MM-DD.'}), 400
+    group_by = [d for d in request.args.get('group_by', ','.join(REVENUE_DIMENSIONS)).split(',') if d]
+
+    report = get_revenue_report(start_date=start_date, end_date=end_date, group_by=group_by)
+    if report is None:
+        return jsonify({'message': f"group_by must be a comma-separated list of: {', '.join(REVENUE_DIMENSIONS)}."}), 400
+    return jsonify(report)
+
+@app.route('/api/admin/export/<dataset>', methods=['GET'])
+@role_required('admin')
+def api_admin_export(dataset):
+    """
+    Downloads invoices, enrollments or metrics as it is read from the database:
+    ?format=csv|jsonl&member_id=<id>&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD (all optional, format defaults to csv).
+    """
+    fmt = request.args.get('format', 'csv')
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'message': f"Unknown export. Choose one of: {', '.join(EXPORT_DATASETS)}."}), 404
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}."}), 400
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({'message': 'start_date and end_date must be YYYY-MM-DD.'}), 400
+    member_id = request.args.get('member_id', type=int)
+
+    # The generator runs after this request's session is closed and opens its own
+    response = Response(
+        stream_export(dataset, fmt, member_id=member_id, start_date=start_date, end_date=end_date),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, fmt)}"'
+    return response
+
 @app.route('/admin/manage_rooms')
 @role_required('admin')
 def manage_rooms():
-    """Renders the room management page with a list of all rooms."""
-    rooms = get_all_rooms()
+    """Renders the room management page with one page of rooms."""
+    rooms = get_all_rooms(
+        limit=page_size(request.args.get('limit', type=int)),
+        after=request.args.get('after'),
+        with_total=True
+    )
     # Note: rooms is expected to be a list of Room objects or dicts for the template
     return render_template('manage room.html', rooms=rooms)
 
@@ -930,6 +1212,21 @@ def api_update_class():
 
     return redirect(url_for('admin_manage_classes'))
 
+@app.route('/api/admin/class_conflict', methods=['GET'])
+@role_required('admin')
+def api_class_conflict():
+    """Live conflict check for the 'modify class' form; answered from the in-memory schedule index."""
+    try:
+        trainer_id = int(request.args.get('trainer_id'))
+        room_id = int(request.args.get('room_id'))
+        start_time = datetime.strptime(f"{request.args.get('start_date')} {request.args.get('start_time')}", '%Y-%m-%d %H:%M')
+        class_id = request.args.get('class_id', type=int)
+    except (TypeError, ValueError):
+        return jsonify({'message': 'trainer_id, room_id, start_date and start_time are required.'}), 400
+
+    conflict = find_class_conflict(trainer_id=trainer_id, room_id=room_id, start_time=start_time, class_id=class_id)
+    return jsonify({'conflict': conflict})
+
 @app.route('/api/admin/delete_class', methods=['POST'])
 @role_required('admin')
 def api_delete_class():
@@ -956,11 +1253,21 @@ def api_delete_class():
     return redirect(url_for('admin_manage_classes'))
 
 if __name__ == '__main__':
-    # Initialize the database before running the app
-    try:
-        initialize() 
-    except Exception as e:
-        logger.critical(f"Application startup halted due to failed database initialization: {e}", exc_info=True)
+    # Schema changes are applied by python db_migrate.py on deploy; starting only checks the version (no DDL)
+    if not check_schema_version():
+        logger.critical("Application startup halted: the database schema is not at the version this code needs.")
         sys.exit(1)
-        
-    app.run(debug=True)
+
+    debug = True
+    # With debug on, the Werkzeug reloader runs this block twice: in a parent that only watches files and
+    # restarts the server, and in the child that serves (WERKZEUG_RUN_MAIN set). Only the serving process
+    # starts the background work, so there is one sweeper and one audit per start or reload.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Warn about lookups no index serves (python -m app.Index_Audit runs the same check)
+        report_missing_indexes()
+
+        # Load trainers and rooms once so the first admin page is served from memory
+        reference_data.preload()
+        overdue_sweeper.start()
+
+    app.run(debug=debug)
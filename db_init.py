@@ -4,7 +4,8 @@ import sys
 from dotenv import load_dotenv
 import psycopg2
 from datetime import datetime, date, timedelta
-from models.base import create_tables
+from models.base import create_tables, Base
+from sqlalchemy import Sequence
 from models.base import SessionLocal
 from models.member import Member
 from models.admin import Admin
@@ -16,6 +17,13 @@ from models.room import Room
 from models.equipment import Equipment
 from models.equipment_log import Equipment_log
 from models.class_enrollment import Class_enrollment
+from models.class_enrollment_summary import Class_enrollment_summary
+from models.data_version import Data_version
+from models.billing_run import Billing_run
+from models.revenue_daily import Revenue_daily
+from models.revenue_backfill import Revenue_backfill
+from models.schema_version import Schema_version
+from models.metric_rollup import Metric_rollup
 from models.fitness_goal import Fitness_goal
 from models.invoice import Invoice # 중복 import
 from models.trainer_availability import Trainer_availability
@@ -45,6 +53,7 @@ def get_db_connection():
 # 1. Create database schema
 def initialized_db():
     print("--- Creating database schema ---")
+    # Only creates missing tables (with their indexes); indexes added to existing tables are left to db_migrate
     create_tables()
 
 # 2. Insert sample data
@@ -136,7 +145,75 @@ def insert_advanced_sql_features():
         conn = get_db_connection()
         cur = conn.cursor()
 
-        # Create View V_ClassSummary (DQL Feature)
+        # Enrollment counter table maintenance (replaces the GROUP BY in V_ClassSummary)
+        # Every class gets a summary row when it is created...
+        CLASS_SUMMARY_ROW_SQL = """
+        CREATE OR REPLACE FUNCTION create_class_summary_row()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO class_enrollment_summary (class_id, current_enrollment)
+            VALUES (NEW.class_id, 0)
+            ON CONFLICT (class_id) DO NOTHING;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+        cur.execute(CLASS_SUMMARY_ROW_SQL)
+        cur.execute("""
+        CREATE OR REPLACE TRIGGER trg_class_summary_row
+        AFTER INSERT ON classes
+        FOR EACH ROW
+        EXECUTE FUNCTION create_class_summary_row();
+        """)
+
+        # ...and enrollments / cancellations move its counter by one
+        ENROLLMENT_SUMMARY_SQL = """
+        CREATE OR REPLACE FUNCTION maintain_class_enrollment_summary()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO class_enrollment_summary (class_id, current_enrollment)
+                VALUES (NEW.class_id, 1)
+                ON CONFLICT (class_id) DO UPDATE
+                SET current_enrollment = class_enrollment_summary.current_enrollment + 1;
+                -- Last line of defence against overbooking, whatever path inserted the row
+                IF EXISTS (
+                    SELECT 1 FROM class_enrollment_summary s
+                    JOIN classes c ON c.class_id = s.class_id
+                    WHERE s.class_id = NEW.class_id AND s.current_enrollment > c.number_members
+                ) THEN
+                    RAISE EXCEPTION 'Class % is full', NEW.class_id USING ERRCODE = 'check_violation';
+                END IF;
+                RETURN NEW;
+            ELSE
+                UPDATE class_enrollment_summary
+                SET current_enrollment = current_enrollment - 1
+                WHERE class_id = OLD.class_id;
+                RETURN OLD;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+        cur.execute(ENROLLMENT_SUMMARY_SQL)
+        cur.execute("""
+        CREATE OR REPLACE TRIGGER trg_class_enrollment_summary
+        AFTER INSERT OR DELETE ON class_enrollment
+        FOR EACH ROW
+        EXECUTE FUNCTION maintain_class_enrollment_summary();
+        """)
+
+        # Backfill counters for classes and enrollments that existed before the triggers
+        cur.execute("""
+        INSERT INTO class_enrollment_summary (class_id, current_enrollment)
+        SELECT c.class_id, COUNT(ce.member_id)
+        FROM classes c
+        LEFT JOIN class_enrollment ce ON c.class_id = ce.class_id
+        GROUP BY c.class_id
+        ON CONFLICT (class_id) DO UPDATE SET current_enrollment = EXCLUDED.current_enrollment;
+        """)
+        print("   - Enrollment summary triggers created and counters backfilled.")
+
+        # Create View V_ClassSummary (DQL Feature), now reading the maintained counters
         VIEW_SQL = """
         CREATE OR REPLACE VIEW V_ClassSummary AS
         SELECT 
@@ -145,19 +222,154 @@ def insert_advanced_sql_features():
             t.name AS trainer_name,
             c.start_time,
             c.number_members,
-            COUNT(ce.member_id) AS current_enrollment
+            COALESCE(s.current_enrollment, 0)::bigint AS current_enrollment
         FROM classes c
         JOIN trainer t ON c.trainer_id = t.trainer_id
-        LEFT JOIN class_enrollment ce ON c.class_id = ce.class_id
-        GROUP BY c.class_id, c.class_type, t.name, c.start_time, c.number_members
+        LEFT JOIN class_enrollment_summary s ON c.class_id = s.class_id
         ORDER BY c.start_time;
         """
         cur.execute(VIEW_SQL)
-        print("   - View V_ClassSummary created/updated (DQL Feature).")
+        print("   - View V_ClassSummary created/updated (DQL Feature).")
+
+        # Health metric rollups (day / week / month per member) for trend charts.
+        # A statement-level trigger folds every batch of new readings in with one upsert.
+        METRIC_ROLLUP_SQL = """
+        CREATE OR REPLACE FUNCTION maintain_metric_rollup()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO metric_rollup (member_id, period, period_start, reading_count,
+                                       weight_min, weight_max, weight_sum,
+                                       heart_rate_min, heart_rate_max, heart_rate_sum)
+            SELECT n.member_id, p.period, date_trunc(p.period, n.record_date)::date, COUNT(*),
+                   MIN(n.weight), MAX(n.weight), SUM(n.weight),
+                   MIN(n.heart_rate), MAX(n.heart_rate), SUM(n.heart_rate)
+            FROM new_metrics n
+            CROSS JOIN (VALUES ('day'), ('week'), ('month')) AS p(period)
+            GROUP BY n.member_id, p.period, date_trunc(p.period, n.record_date)
+            -- A fixed order keeps concurrent batches from deadlocking on the same rollup rows
+            ORDER BY 1, 2, 3
+            ON CONFLICT (member_id, period, period_start) DO UPDATE SET
+                reading_count = metric_rollup.reading_count + EXCLUDED.reading_count,
+                weight_min = LEAST(metric_rollup.weight_min, EXCLUDED.weight_min),
+                weight_max = GREATEST(metric_rollup.weight_max, EXCLUDED.weight_max),
+                weight_sum = metric_rollup.weight_sum + EXCLUDED.weight_sum,
+                heart_rate_min = LEAST(metric_rollup.heart_rate_min, EXCLUDED.heart_rate_min),
+                heart_rate_max = GREATEST(metric_rollup.heart_rate_max, EXCLUDED.heart_rate_max),
+                heart_rate_sum = metric_rollup.heart_rate_sum + EXCLUDED.heart_rate_sum;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+        cur.execute(METRIC_ROLLUP_SQL)
+        cur.execute("""
+        CREATE OR REPLACE TRIGGER trg_metric_rollup
+        AFTER INSERT ON metrics
+        REFERENCING NEW TABLE AS new_metrics
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION maintain_metric_rollup();
+        """)
+
+        # Rebuild the rollups of readings stored before the trigger existed (replaces, so it can be re-run)
+        cur.execute("""
+        INSERT INTO metric_rollup (member_id, period, period_start, reading_count,
+                                   weight_min, weight_max, weight_sum,
+                                   heart_rate_min, heart_rate_max, heart_rate_sum)
+        SELECT m.member_id, p.period, date_trunc(p.period, m.record_date)::date, COUNT(*),
+               MIN(m.weight), MAX(m.weight), SUM(m.weight),
+               MIN(m.heart_rate), MAX(m.heart_rate), SUM(m.heart_rate)
+        FROM metrics m
+        CROSS JOIN (VALUES ('day'), ('week'), ('month')) AS p(period)
+        GROUP BY m.member_id, p.period, date_trunc(p.period, m.record_date)
+        ON CONFLICT (member_id, period, period_start) DO UPDATE SET
+            reading_count = EXCLUDED.reading_count,
+            weight_min = EXCLUDED.weight_min,
+            weight_max = EXCLUDED.weight_max,
+            weight_sum = EXCLUDED.weight_sum,
+            heart_rate_min = EXCLUDED.heart_rate_min,
+            heart_rate_max = EXCLUDED.heart_rate_max,
+            heart_rate_sum = EXCLUDED.heart_rate_sum;
+        """)
+        print("   - Metric rollup trigger created and rollups backfilled.")
+
+        # Revenue per issue day, price type, payment method and status for finance reports.
+        # Statement-level triggers add each statement's new invoice rows and subtract its old ones in one upsert,
+        # so a status or price change moves the amount between rollup rows (and a no-op update writes nothing).
+        REVENUE_ROLLUP_SQL = """
+        CREATE OR REPLACE FUNCTION maintain_revenue_daily()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            changes TEXT;
+            backfill_cursor INTEGER;
+        BEGIN
+            -- Waits while a rebuild chunk holds revenue_daily in EXCLUSIVE mode, then reads how far it got:
+            -- invoices it has not reached yet are left to it
+            LOCK TABLE revenue_daily IN ROW EXCLUSIVE MODE;
+            SELECT next_invoice_id INTO backfill_cursor FROM revenue_backfill;
+
+            changes := CASE TG_OP
+                WHEN 'INSERT' THEN 'SELECT invoice_id, issue_date, price_type, payment_method, status, 1, COALESCE(total_price, 0)::numeric FROM new_invoices'
+                WHEN 'DELETE' THEN 'SELECT invoice_id, issue_date, price_type, payment_method, status, -1, -COALESCE(total_price, 0)::numeric FROM old_invoices'
+                ELSE 'SELECT invoice_id, issue_date, price_type, payment_method, status, 1, COALESCE(total_price, 0)::numeric FROM new_invoices
+                      UNION ALL
+                      SELECT invoice_id, issue_date, price_type, payment_method, status, -1, -COALESCE(total_price, 0)::numeric FROM old_invoices'
+            END;
+
+            EXECUTE format($f$
+                INSERT INTO revenue_daily (day, price_type, payment_method, status, invoice_count, total_amount)
+                SELECT c.issue_date::date, c.price_type, c.payment_method, c.status, SUM(c.n), SUM(c.amount)
+                FROM (%s) AS c (invoice_id, issue_date, price_type, payment_method, status, n, amount)
+                WHERE c.issue_date IS NOT NULL AND ($1 IS NULL OR c.invoice_id < $1)
+                GROUP BY 1, 2, 3, 4
+                HAVING SUM(c.n) <> 0 OR SUM(c.amount) <> 0
+                -- A fixed order keeps concurrent statements from deadlocking on the same rollup rows
+                ORDER BY 1, 2, 3, 4
+                ON CONFLICT (day, price_type, payment_method, status) DO UPDATE SET
+                    invoice_count = revenue_daily.invoice_count + EXCLUDED.invoice_count,
+                    total_amount = revenue_daily.total_amount + EXCLUDED.total_amount
+            $f$, changes) USING backfill_cursor;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+        cur.execute(REVENUE_ROLLUP_SQL)
+        # Transition tables allow one event per trigger
+        cur.execute("""
+        CREATE OR REPLACE TRIGGER trg_revenue_daily_insert
+        AFTER INSERT ON invoice REFERENCING NEW TABLE AS new_invoices
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_revenue_daily();
+        CREATE OR REPLACE TRIGGER trg_revenue_daily_update
+        AFTER UPDATE ON invoice REFERENCING OLD TABLE AS old_invoices NEW TABLE AS new_invoices
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_revenue_daily();
+        CREATE OR REPLACE TRIGGER trg_revenue_daily_delete
+        AFTER DELETE ON invoice REFERENCING OLD TABLE AS old_invoices
+        FOR EACH STATEMENT EXECUTE FUNCTION maintain_revenue_daily();
+        """)
+
+        # First fill for invoices stored before the triggers existed; a full rebuild is
+        # python -m app.Revenue_Service, which runs in chunks while the app keeps writing
+        cur.execute("""
+        INSERT INTO revenue_daily (day, price_type, payment_method, status, invoice_count, total_amount)
+        SELECT issue_date::date, price_type, payment_method, status, COUNT(*), SUM(COALESCE(total_price, 0)::numeric)
+        FROM invoice
+        WHERE issue_date IS NOT NULL AND NOT EXISTS (SELECT 1 FROM revenue_daily)
+        GROUP BY 1, 2, 3, 4;
+        """)
+        print("   - Revenue rollup triggers created.")
+
+        # Reference data (trainers, rooms) version counter; bumped here too since the sample data may have changed them
+        cur.execute("""
+        INSERT INTO data_version (name, version) VALUES ('reference_data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = data_version.version + 1;
+        """)
+        print("   - Reference data version bumped.")
 
-        # create index
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_member_email ON member (email);")
-        print("   - Index idx_member_email created.")
+        # Device sync and billing run columns, for databases made before they were declared on Metric and Invoice.
+        # Adding a nullable column is instant; their unique keys and every index are built concurrently by
+        # db_migrate.create_indexes_concurrently, so no table is locked for the length of an index build.
+        cur.execute("ALTER TABLE metrics ADD COLUMN IF NOT EXISTS device_id VARCHAR(100);")
+        cur.execute("ALTER TABLE invoice ADD COLUMN IF NOT EXISTS billing_period DATE;")
+        cur.execute("ALTER TABLE invoice ADD COLUMN IF NOT EXISTS billing_run_id INTEGER REFERENCES billing_run (run_id);")
+        print("   - Columns metrics.device_id, invoice.billing_period and invoice.billing_run_id added.")
 
 
         # trigger - update equipment automatically
@@ -187,16 +399,52 @@ def insert_advanced_sql_features():
         conn.commit()
         cur.close()
         conn.close()
+        return True
     except psycopg2.Error as e:
         print(f"FATAL ERROR inserting advanced SQL features: {e}")
         # Note: No rollback needed here if the transaction failed.
+        return False
+
+# 4. Attach the ID sequences and move them past the existing rows
+def sync_id_sequences():
+    """
+    Makes sure every primary key sequence declared in models/ exists, is the column default,
+    and starts after the highest ID already stored (e.g. the hard-coded sample data IDs).
+    """
+    print("--- Synchronizing ID sequences ---")
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        for table in Base.metadata.sorted_tables:
+            for column in table.primary_key.columns:
+                if not isinstance(column.default, Sequence):
+                    continue
+                seq = column.default.name
+                cur.execute(f"CREATE SEQUENCE IF NOT EXISTS {seq} OWNED BY {table.name}.{column.name};")
+                cur.execute(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} SET DEFAULT nextval('{seq}');")
+                cur.execute(
+                    f"SELECT setval('{seq}', COALESCE((SELECT MAX({column.name}) FROM {table.name}), 0) + 1, false);"
+                )
+                print(f"   - Sequence {seq} synchronized.")
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except psycopg2.Error as e:
+        print(f"FATAL ERROR synchronizing ID sequences: {e}")
+        return False
 
-# Main initialization function called by apps.py
+# Sets up a development database: the schema migrations, then the sample data.
+# apps.py no longer calls this; it only checks the schema version (see db_migrate.py).
 def initialize():
-    initialized_db() 
+    from db_migrate import migrate
+    if not migrate():
+        return False
     insert_sample_data()
-    insert_advanced_sql_features()
+    # The sample data uses hard-coded IDs; move the sequences past them
+    sync_id_sequences()
     print("--- Database initialization complete ---")
+    return True
 
 if __name__ == "__main__":
     initialize()
\ No newline at end of file
@@ -0,0 +1,226 @@
+#versioned schema migrations
+import sys
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+from sqlalchemy import Index, UniqueConstraint, select, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.schema import AddConstraint
+from models.base import Base, SessionLocal, engine
+from models.classes import Classes
+from models.schema_version import Schema_version
+from db_init import initialized_db, insert_advanced_sql_features, sync_id_sequences  # also loads every model
+from app.Index_Audit import create_index_sql
+
+# Held while migrating, so two deploys starting at once apply each migration only once
+MIGRATION_LOCK_KEY = 72_510_001
+
+# Existing state of an index by name: None if there is none, else whether it is valid
+# (an interrupted CREATE INDEX CONCURRENTLY leaves an invalid one behind)
+_INDEX_VALID_SQL = text("""
+    SELECT x.indisvalid
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_namespace n ON n.oid = i.relnamespace
+    WHERE n.nspname = current_schema() AND i.relname = :name
+""")
+
+_CONSTRAINT_EXISTS_SQL = text("""
+    SELECT EXISTS (
+        SELECT 1 FROM pg_constraint c JOIN pg_namespace n ON n.oid = c.connamespace
+        WHERE n.nspname = current_schema() AND c.conname = :name
+    )
+""")
+
+
+def _build_index_concurrently(connection: Connection, name: str, create_sql: str) -> bool:
+    """Runs create_sql (a CREATE INDEX CONCURRENTLY) unless a valid index called name exists. Returns True if it did."""
+    valid = connection.execute(_INDEX_VALID_SQL, {'name': name}).scalar()
+    if valid:
+        return False
+    if valid is False:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(text(create_sql))
+    return True
+
+
+def create_indexes_concurrently(indexes: Iterable[Index] = (), unique_constraints: Iterable[UniqueConstraint] = (),
+                                extra: Iterable[Tuple[str, str]] = ()) -> bool:
+    """
+    Builds the given model indexes, named unique constraints and extra (name, CREATE INDEX CONCURRENTLY sql)
+    pairs that the database lacks, without blocking writes to their tables. A unique constraint is built as
+    a unique index first and then attached to its table, which only takes a brief lock.
+    Safe to run again after an interruption. Returns True once everything exists.
+    """
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        # A build can take longer than the app's per-statement limit
+        connection.execute(text("SET statement_timeout = 0"))
+        builds = [(index.name, create_index_sql(index)) for index in indexes] + list(extra)
+        for name, create_sql in builds:
+            if _build_index_concurrently(connection, name, create_sql):
+                print(f"   - Index {name} built concurrently.")
+
+        for constraint in unique_constraints:
+            if connection.execute(_CONSTRAINT_EXISTS_SQL, {'name': constraint.name}).scalar():
+                continue
+            table = constraint.table.name
+            columns = ', '.join(column.name for column in constraint.columns)
+            _build_index_concurrently(
+                connection, constraint.name, f"CREATE UNIQUE INDEX CONCURRENTLY {constraint.name} ON {table} ({columns})"
+            )
+            # Give up rather than hold up every query on the table behind a long transaction; rerun to retry
+            connection.execute(text("SET lock_timeout = '5s'"))
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {constraint.name} UNIQUE USING INDEX {constraint.name}"
+            ))
+            connection.execute(text("RESET lock_timeout"))
+            print(f"   - Constraint {constraint.name} built concurrently.")
+    return True
+
+
+def add_exclusion_constraints(constraints: Iterable[ExcludeConstraint]) -> bool:
+    """
+    Adds the given exclusion constraints that the database lacks, in one transaction. Unlike a plain index,
+    an exclusion constraint cannot be built concurrently: its table is locked while the GiST index is built,
+    so run this when the table is quiet. Fails (naming the clashing rows) if existing rows already violate one.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        # Give up rather than hold up every query on the table behind a long transaction; rerun to retry
+        connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+        for constraint in constraints:
+            if connection.execute(_CONSTRAINT_EXISTS_SQL, {'name': constraint.name}).scalar():
+                continue
+            connection.execute(AddConstraint(constraint))
+            print(f"   - Constraint {constraint.name} added.")
+    return True
+
+
+# 1. The schema as db_init built it on every start until migrations existed: tables, views, triggers,
+#    rollups and ID sequences. Every statement is idempotent, so it also adopts databases made that way.
+def _baseline() -> bool:
+    initialized_db()
+    return insert_advanced_sql_features() and sync_id_sequences()
+
+
+# 2. The indexes and unique keys declared on the models, for databases whose tables predate them
+def _model_indexes() -> bool:
+    tables = Base.metadata.sorted_tables
+    return create_indexes_concurrently(
+        indexes=[index for table in tables for index in sorted(table.indexes, key=lambda i: i.name)],
+        unique_constraints=[
+            constraint for table in tables for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint) and constraint.name
+        ],
+        extra=[('idx_member_email', "CREATE INDEX CONCURRENTLY idx_member_email ON member (email)")]
+    )
+
+
+# 3. The class booking exclusion constraints (and the btree_gist extension they need), for databases
+#    whose classes table predates them. Double bookings already stored must be moved first.
+def _class_booking_constraints() -> bool:
+    with engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    return add_exclusion_constraints(
+        sorted((c for c in Classes.__table__.constraints if isinstance(c, ExcludeConstraint)), key=lambda c: c.name)
+    )
+
+
+# Applied in order, each one once. Append new migrations here (never edit or renumber an applied one);
+# an index addition should go through create_indexes_concurrently.
+MIGRATIONS: List[Tuple[int, str, Callable[[], bool]]] = [
+    (1, 'baseline', _baseline),
+    (2, 'model indexes', _model_indexes),
+    (3, 'class booking constraints', _class_booking_constraints),
+]
+
+# The schema version this code needs
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection: Connection) -> int:
+    """Highest migration applied to the database (0 if none ever was)."""
+    try:
+        return connection.execute(select(Schema_version.version).order_by(Schema_version.version.desc()).limit(1)).scalar() or 0
+    except ProgrammingError:
+        # schema_version does not exist yet
+        connection.rollback()
+        return 0
+
+
+def check_schema_version() -> bool:
+    """
+    Startup check: one query, no DDL. Returns True if the database is at (or past) SCHEMA_VERSION,
+    otherwise prints what to run and returns False.
+    """
+    try:
+        with engine.connect() as connection:
+            current = get_schema_version(connection)
+    except Exception as e:
+        print(f"FATAL: Could not read the schema version. Details: {e}")
+        return False
+
+    if current < SCHEMA_VERSION:
+        print(f"FATAL: Database schema is at version {current}, this code needs {SCHEMA_VERSION}. "
+              f"Run: python db_migrate.py")
+        return False
+    if current > SCHEMA_VERSION:
+        print(f"Warning: Database schema is at version {current}, newer than this code ({SCHEMA_VERSION}).")
+    return True
+
+
+def migrate(target: Optional[int] = None) -> bool:
+    """
+    Applies every migration above the database's version, up to target (default: all), recording each one
+    in schema_version as it completes. Stops at the first that fails; running it again resumes there.
+    Returns True if the database ends up at the target.
+    """
+    target = SCHEMA_VERSION if target is None else target
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as lock_connection:
+        print("--- Applying schema migrations ---")
+        lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        try:
+            Schema_version.__table__.create(engine, checkfirst=True)
+            # Read after taking the lock: another process may have just migrated
+            current = get_schema_version(lock_connection)
+            for version, name, apply in MIGRATIONS:
+                if version <= current or version > target:
+                    continue
+                print(f"--- Migration {version}: {name} ---")
+                try:
+                    applied = apply()
+                except Exception as e:
+                    print(f"FATAL ERROR in migration {version} ({name}): {e}")
+                    applied = False
+                if not applied:
+                    print(f"Error: Schema left at version {current}; fix the error and run python db_migrate.py again.")
+                    return False
+                with SessionLocal() as session:
+                    session.add(Schema_version(version=version, name=name, applied_at=datetime.now()))
+                    session.commit()
+                current = version
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+
+    print(f"--- Schema is at version {current} ---")
+    return True
+
+
+if __name__ == "__main__":
+    # python db_migrate.py            apply pending migrations (run on deploy, before starting apps.py)
+    # python db_migrate.py --status   print the version and exit with 1 if migrations are pending
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply the versioned schema migrations.")
+    parser.add_argument('--status', action='store_true', help="only check the schema version")
+    parser.add_argument('--target', type=int, help="stop after this migration")
+    args = parser.parse_args()
+
+    if args.status:
+        ok = check_schema_version()
+        if ok:
+            print(f"Success: Database schema is current (version {SCHEMA_VERSION}).")
+        sys.exit(0 if ok else 1)
+    sys.exit(0 if migrate(args.target) else 1)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,String, ForeignKey
+from sqlalchemy import Column, Integer,String, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Admin(Base):
     __tablename__ = 'admin'
 
     # Primary Key
-    admin_id = Column(Integer, primary_key=True,unique = True)
+    admin_id = Column(Integer, Sequence('admin_admin_id_seq'), primary_key=True,unique = True)
     
     #history
     name = Column(String(100), nullable = False)
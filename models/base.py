@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, func
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv 
+from .pool import InstrumentedQueuePool
 import os 
 
 # 1. Load Environment Variables
@@ -19,11 +20,30 @@ DATABASE_URL = (
     f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# Connection pool settings (all optional, read from the same .env file)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables recycling
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))  # milliseconds, 0 means no limit
+
 # 3. Define the Base Class for all Models
 Base = declarative_base()
 
 # 4. Create the Engine
-engine = create_engine(DATABASE_URL, echo=False)
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    # statement_timeout is set per connection when it is opened
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"},
+)
 
 # 5. Create a configured "Session" class
 # This will be used in db_init.py and your service files
@@ -31,4 +51,16 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_tables():
     """Create all tables defined by Base.metadata in the database"""
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    Base.metadata.create_all(engine)
+
+def allocate_ids(session, model, count: int):
+    """
+    Reserves `count` new primary key values for a model from its sequence in one round trip.
+    Useful for bulk inserts that need to know the IDs before inserting.
+    """
+    if count <= 0:
+        return []
+    sequence = model.__table__.primary_key.columns.values()[0].default
+    return list(session.scalars(
+        select(sequence.next_value()).select_from(func.generate_series(1, count))
+    ))
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, Sequence, UniqueConstraint
+from .base import Base
+
+# One billing run per period and price type. It bills members in member_id order and records how far
+# it got, so a run that stopped part way is resumed from last_member_id instead of starting over.
+class Billing_run(Base):
+    __tablename__ = 'billing_run'
+
+    # Primary Key
+    run_id = Column(Integer, Sequence('billing_run_run_id_seq'), primary_key=True)
+    #foreign key
+    admin_id = Column(Integer, ForeignKey('admin.admin_id'), nullable=False)
+    #what is billed
+    period_start = Column(Date, nullable=False)
+    price_type = Column(String(100), nullable=False)
+    total_price = Column(Float, nullable=False)
+    payment_method = Column(String(100), nullable=False)
+    issue_date = Column(DateTime, nullable=False)
+    due_date = Column(DateTime, nullable=False)
+    #progress
+    status = Column(String(20), nullable=False)
+    last_member_id = Column(Integer, nullable=False, default=0)
+    members_scanned = Column(Integer, nullable=False, default=0)
+    invoices_created = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint(period_start, price_type, name='uq_billing_run_period'),
+    )
+
+    def __init__(self, admin_id, period_start, price_type, total_price, payment_method, issue_date, due_date, status, started_at):
+        self.admin_id = admin_id
+        self.period_start = period_start
+        self.price_type = price_type
+        self.total_price = total_price
+        self.payment_method = payment_method
+        self.issue_date = issue_date
+        self.due_date = due_date
+        self.status = status
+        self.last_member_id = 0
+        self.members_scanned = 0
+        self.invoices_created = 0
+        self.started_at = started_at
+
+    def __repr__(self):
+        return f"<billing_run (run_id={self.run_id}, period_start={self.period_start}, status={self.status}, invoices={self.invoices_created})>"
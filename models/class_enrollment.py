@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,DateTime, ForeignKey
+from sqlalchemy import Column, Integer,DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -15,6 +15,12 @@ class Class_enrollment(Base):
 
     member = relationship("Member", back_populates="class_enrollment")
     classes = relationship("Classes", back_populates="class_enrollment")
+
+    # The primary key leads with member_id; rosters and enrollment counts look classes up by class_id
+    __table_args__ = (
+        Index('idx_class_enrollment_class', class_id),
+    )
+
     def __init__(self, member_id, class_id, enrollment_date):
         self.member_id = member_id
         self.class_id = class_id
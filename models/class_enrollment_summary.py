@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from .base import Base
+
+# Running enrollment count per class, kept up to date by the trg_class_enrollment_summary
+# and trg_class_summary_row triggers (see db_init.py) so reads never aggregate class_enrollment.
+class Class_enrollment_summary(Base):
+    __tablename__ = 'class_enrollment_summary'
+
+    # Primary Key
+    class_id = Column(Integer, ForeignKey('classes.class_id', ondelete='CASCADE'), primary_key=True)
+    #history
+    current_enrollment = Column(Integer, nullable=False, default=0, server_default='0')
+
+    def __init__(self, class_id, current_enrollment=0):
+        self.class_id = class_id
+        self.current_enrollment = current_enrollment
+
+    def __repr__(self):
+        return f"<class_enrollment_summary (class_id={self.class_id}, current_enrollment={self.current_enrollment})>"
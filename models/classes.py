@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer,String,DateTime,ForeignKey, Date
+from sqlalchemy import Column, Integer,String,DateTime,ForeignKey, Date, Sequence, DDL, event, func, Index
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from .base import Base 
 from datetime import timedelta
@@ -7,7 +8,7 @@ class Classes(Base):
     __tablename__ = 'classes'
 
     # Primary Key
-    class_id = Column(Integer, primary_key=True,unique = True)
+    class_id = Column(Integer, Sequence('classes_class_id_seq'), primary_key=True,unique = True)
     # member info
     trainer_id = Column(Integer, ForeignKey('trainer.trainer_id'),nullable = False)
     room_id = Column(Integer, ForeignKey('room.room_id'),nullable = False)
@@ -22,6 +23,22 @@ class Classes(Base):
     room = relationship("Room", back_populates="classes")
     class_enrollment = relationship("Class_enrollment", back_populates="classes")
 
+    # A trainer or a room can never be booked twice for overlapping [start_time, end_time) ranges.
+    # The GiST indexes behind these constraints also serve the overlap queries in the services.
+    # The btree indexes serve the "upcoming classes" reads: a trainer's schedule, and every class from now on.
+    __table_args__ = (
+        Index('idx_classes_trainer_start', trainer_id, start_time),
+        Index('idx_classes_start_time', start_time),
+        ExcludeConstraint(
+            (trainer_id, '='), (func.tsrange(start_time, end_time), '&&'),
+            name='excl_classes_trainer_time', using='gist'
+        ),
+        ExcludeConstraint(
+            (room_id, '='), (func.tsrange(start_time, end_time), '&&'),
+            name='excl_classes_room_time', using='gist'
+        ),
+    )
+
     def __init__(self, class_id, trainer_id, room_id,class_type, start_time,number_members):
         self.class_id = class_id
         self.trainer_id = trainer_id
@@ -31,5 +48,16 @@ class Classes(Base):
         self.end_time = start_time+ timedelta(minutes=90)
         self.number_members = number_members
         self.start_date = start_time.date()
+    @classmethod
+    def overlaps(cls, start_time, end_time):
+        """SQL condition for classes whose time range overlaps [start_time, end_time) (GiST-indexed)."""
+        return func.tsrange(cls.start_time, cls.end_time).op('&&')(func.tsrange(start_time, end_time))
+
     def __repr__(self):
-        return f"<classes (id={self.class_id}, trainer_id={self.trainer_id},room_id={self.room_id}, start time='{self.start_time}, end time='{self.end_time}'>"
\ No newline at end of file
+        return f"<classes (id={self.class_id}, trainer_id={self.trainer_id},room_id={self.room_id}, start time='{self.start_time}, end time='{self.end_time}'>"
+
+# '=' on plain integer columns inside a GiST index needs the btree_gist extension
+event.listen(
+    Classes.__table__, 'before_create',
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect='postgresql')
+)
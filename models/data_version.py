@@ -0,0 +1,19 @@
+from sqlalchemy import Column, BigInteger, String
+from .base import Base
+
+# Named change counters shared by every worker process. A write bumps its counter inside its own
+# transaction, so a process holding data in memory only has to compare one number to know it is current.
+class Data_version(Base):
+    __tablename__ = 'data_version'
+
+    # Primary Key
+    name = Column(String(50), primary_key=True)
+    #history
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
+
+    def __init__(self, name, version=0):
+        self.name = name
+        self.version = version
+
+    def __repr__(self):
+        return f"<data_version (name={self.name}, version={self.version})>"
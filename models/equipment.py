@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,String, ForeignKey
+from sqlalchemy import Column, Integer,String, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Equipment(Base):
     __tablename__ = 'equipment'
 
     # Primary Key
-    equipment_id = Column(Integer, primary_key=True,unique = True)
+    equipment_id = Column(Integer, Sequence('equipment_equipment_id_seq'), primary_key=True,unique = True)
     # member info
     admin_id = Column(Integer, ForeignKey('admin.admin_id'),nullable = False)
     #history
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,String,DateTime, ForeignKey
+from sqlalchemy import Column, Integer,String,DateTime, ForeignKey, Sequence, Index
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Equipment_log(Base):
     __tablename__ = 'equipment_log'
 
     # Primary Key
-    log_id = Column(Integer, primary_key=True,unique = True)
+    log_id = Column(Integer, Sequence('equipment_log_log_id_seq'), primary_key=True,unique = True)
     # member info
     admin_id = Column(Integer, ForeignKey('admin.admin_id'),nullable = False)
     equipment_id = Column(Integer, ForeignKey('equipment.equipment_id'),nullable= False)
@@ -20,6 +20,11 @@ class Equipment_log(Base):
     admin = relationship("Admin", back_populates="equipment_log")
     equipment = relationship("Equipment", back_populates="equipment_log")
 
+    # Maintenance history is listed per piece of equipment
+    __table_args__ = (
+        Index('idx_equipment_log_equipment', equipment_id),
+    )
+
     def __init__(self, equipment_id, admin_id, repair_task, resolution_date,issue):
         self.equipment_id = equipment_id
         self.admin_id = admin_id
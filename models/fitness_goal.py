@@ -1,4 +1,4 @@
-from sqlalchemy import Column,Boolean, Integer,String,DateTime,Float, ForeignKey
+from sqlalchemy import Column,Boolean, Integer,String,DateTime,Float, ForeignKey, Sequence, Index
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Fitness_goal(Base):
     __tablename__ = 'fitness_goal'
 
     # Primary Key
-    goal_id = Column(Integer, primary_key=True,unique = True)
+    goal_id = Column(Integer, Sequence('fitness_goal_goal_id_seq'), primary_key=True,unique = True)
     # member info
     member_id = Column(Integer, ForeignKey('member.member_id'),nullable = False)
 
@@ -21,6 +21,11 @@ class Fitness_goal(Base):
 
     member = relationship("Member", back_populates="fitness_goal")
 
+    # A member's active goals are read on every dashboard load
+    __table_args__ = (
+        Index('idx_fitness_goal_member_active', member_id, is_active),
+    )
+
     def __init__(self, member_id, target_type, target_value, start_date, end_date, is_active):
         self.member_id = member_id
         self.target_type = target_type
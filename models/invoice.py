@@ -1,14 +1,17 @@
-from sqlalchemy import Column, Integer,String,DateTime,Float, ForeignKey
+from sqlalchemy import Column, Integer,String,Date,DateTime,Float, ForeignKey, Sequence, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from .base import Base 
 from datetime import timedelta
 
+# Invoices still to be paid. Pending ones past their due date are moved to Overdue by the sweeper.
+UNPAID_INVOICE_STATUSES = ('Pending', 'Overdue')
+
 # This model is the Supertype for both Admin and Trainer roles.
 class Invoice(Base):
     __tablename__ = 'invoice'
 
     # Primary Key
-    invoice_id = Column(Integer, primary_key=True,unique = True)
+    invoice_id = Column(Integer, Sequence('invoice_invoice_id_seq'), primary_key=True,unique = True)
     #foreing key
     member_id = Column(Integer, ForeignKey("member.member_id"))
     admin_id = Column(Integer, ForeignKey("admin.admin_id"))
@@ -19,6 +22,23 @@ class Invoice(Base):
     total_price = Column(Float)
     issue_date = Column(DateTime)
     due_date = Column(DateTime)
+    # Set on invoices made by a billing run: the month billed and the run that billed it
+    billing_period = Column(Date, nullable=True)
+    billing_run_id = Column(Integer, ForeignKey("billing_run.run_id"), nullable=True)
+
+    # A member is billed once per period and price type, however often a run is retried
+    # (invoices made by hand have no billing_period, and NULLs never conflict).
+    # The partial indexes cover only unpaid invoices, so they stay small however many are paid:
+    # one finds invoices falling due, the other sums balances per member from the index alone.
+    __table_args__ = (
+        UniqueConstraint(member_id, price_type, billing_period, name='uq_invoice_member_billing_period'),
+        Index('idx_invoice_unpaid_due_date', due_date, postgresql_where=status.in_(UNPAID_INVOICE_STATUSES)),
+        Index('idx_invoice_unpaid_member', member_id, postgresql_include=['total_price', 'due_date'],
+              postgresql_where=status.in_(UNPAID_INVOICE_STATUSES)),
+        # Foreign key lookups (member_id is the leading column of the billing key above)
+        Index('idx_invoice_admin', admin_id),
+        Index('idx_invoice_billing_run', billing_run_id),
+    )
 
 
     #relationships
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String,DateTime
+from sqlalchemy import Column, Integer, String,DateTime, Sequence
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Member(Base):
     __tablename__ = 'member'
 
     # Primary Key
-    member_id = Column(Integer, primary_key=True,unique = True)
+    member_id = Column(Integer, Sequence('member_member_id_seq'), primary_key=True,unique = True)
     # member info
     name = Column(String(100), nullable= False)
     email= Column(String(100), nullable= False, unique= True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,DateTime, ForeignKey
+from sqlalchemy import Column, Integer,String,DateTime, ForeignKey, Sequence, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Metric(Base):
     __tablename__ = 'metrics'
 
     # Primary Key
-    metric_id = Column(Integer, primary_key=True,unique = True)
+    metric_id = Column(Integer, Sequence('metrics_metric_id_seq'), primary_key=True,unique = True)
     # member info
     member_id = Column(Integer, ForeignKey('member.member_id'),nullable = False)
 
@@ -16,15 +16,26 @@ class Metric(Base):
     height = Column(Integer, nullable= False)
     weight = Column(Integer, nullable= False)
     heart_rate = Column(Integer, nullable= False)
+    # Wearable or scale that sent the reading (None for readings entered by hand)
+    device_id = Column(String(100), nullable= True)
 
     member = relationship("Member", back_populates="metrics")
 
-    def __init__(self, member_id, record_date, weight, height, heart_rate):
+    # A member's readings in date order: the dashboard's latest five and history reads are range scans
+    # A device sends each reading once per timestamp; re-sent readings are ignored on this key
+    # (readings entered by hand have no device_id, and NULLs never conflict)
+    __table_args__ = (
+        Index('idx_metrics_member_record_date', member_id, record_date),
+        UniqueConstraint(member_id, device_id, record_date, name='uq_metrics_member_device_time'),
+    )
+
+    def __init__(self, member_id, record_date, weight, height, heart_rate, device_id=None):
         self.member_id = member_id
         self.record_date = record_date
         self.weight = weight
         self.heart_rate = heart_rate
         self.height = height
+        self.device_id = device_id
         
     def __repr__(self):
         return f"<Metric(id={self.metric_id}, member_id={self.member_id}, date='{self.record_date.strftime('%Y-%m-%d')}', weight={self.weight})>"
\ No newline at end of file
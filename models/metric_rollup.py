@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, ForeignKey, CheckConstraint
+from .base import Base
+
+# Granularities kept in metric_rollup; period_start is the first day of the day/week (Monday)/month.
+METRIC_ROLLUP_PERIODS = ('day', 'week', 'month')
+
+# Running min/max/sum/count of weight and heart rate per member and period, kept up to date by the
+# trg_metric_rollup trigger (see db_init.py) so trend charts never scan raw metrics rows.
+class Metric_rollup(Base):
+    __tablename__ = 'metric_rollup'
+
+    # Primary Key (also serves range reads of one member's trend)
+    member_id = Column(Integer, ForeignKey('member.member_id', ondelete='CASCADE'), primary_key=True)
+    period = Column(String(10), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    #history
+    reading_count = Column(Integer, nullable=False)
+    weight_min = Column(Integer, nullable=False)
+    weight_max = Column(Integer, nullable=False)
+    weight_sum = Column(BigInteger, nullable=False)
+    heart_rate_min = Column(Integer, nullable=False)
+    heart_rate_max = Column(Integer, nullable=False)
+    heart_rate_sum = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint(period.in_(METRIC_ROLLUP_PERIODS), name='ck_metric_rollup_period'),
+    )
+
+    def __init__(self, member_id, period, period_start, reading_count, weight_min, weight_max, weight_sum,
+                 heart_rate_min, heart_rate_max, heart_rate_sum):
+        self.member_id = member_id
+        self.period = period
+        self.period_start = period_start
+        self.reading_count = reading_count
+        self.weight_min = weight_min
+        self.weight_max = weight_max
+        self.weight_sum = weight_sum
+        self.heart_rate_min = heart_rate_min
+        self.heart_rate_max = heart_rate_max
+        self.heart_rate_sum = heart_rate_sum
+
+    def __repr__(self):
+        return f"<metric_rollup (member_id={self.member_id}, period={self.period}, period_start={self.period_start}, count={self.reading_count})>"
@@ -0,0 +1,97 @@
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Any
+
+# Upper bounds (in milliseconds) of the checkout latency histogram buckets.
+# Anything slower than the last bound is counted in the '+Inf' bucket.
+CHECKOUT_LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolStats:
+    """Thread-safe counters describing how connections are checked out of the pool."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_checkout_ms = 0.0
+        self.max_checkout_ms = 0.0
+        self.histogram = [0] * (len(CHECKOUT_LATENCY_BUCKETS_MS) + 1)
+
+    def record_checkout(self, elapsed_ms: float, waited: bool):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.total_checkout_ms += elapsed_ms
+            self.max_checkout_ms = max(self.max_checkout_ms, elapsed_ms)
+            for i, bound in enumerate(CHECKOUT_LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    self.histogram[i] += 1
+                    break
+            else:
+                self.histogram[-1] += 1
+
+    def record_timeout(self):
+        # A checkout that timed out always waited first.
+        with self._lock:
+            self.waits += 1
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in CHECKOUT_LATENCY_BUCKETS_MS] + ['+Inf']
+            return {
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'avg_checkout_ms': round(self.total_checkout_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_checkout_ms': round(self.max_checkout_ms, 3),
+                'checkout_latency_histogram': dict(zip(labels, self.histogram)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times every checkout and counts the ones that had to wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        # Keep collecting into the same counters when the engine recreates its pool (e.g. after dispose()).
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+    def _do_get(self):
+        # Every pooled and overflow connection is in use: this checkout will block until one is returned.
+        waited = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        start = perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_checkout((perf_counter() - start) * 1000, waited)
+        return connection
+
+
+def get_pool_status(engine) -> Dict[str, Any]:
+    """Returns the live state of the engine's pool together with its checkout statistics."""
+    pool = engine.pool
+    status = {
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': pool._max_overflow,
+        'timeout_seconds': pool.timeout(),
+    }
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
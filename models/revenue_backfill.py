@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime
+from .base import Base
+
+# Progress of a revenue_daily rebuild. The row only exists while a rebuild runs: invoices with an ID below
+# next_invoice_id are already counted, and the revenue triggers leave the others to the rebuild.
+class Revenue_backfill(Base):
+    __tablename__ = 'revenue_backfill'
+
+    # Primary Key (a single row)
+    backfill_id = Column(Integer, primary_key=True, default=1)
+    #progress
+    next_invoice_id = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+
+    def __init__(self, next_invoice_id, started_at):
+        self.backfill_id = 1
+        self.next_invoice_id = next_invoice_id
+        self.started_at = started_at
+
+    def __repr__(self):
+        return f"<revenue_backfill (next_invoice_id={self.next_invoice_id}, started_at={self.started_at})>"
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Date, Numeric
+from .base import Base
+
+# Invoice count and amount per issue day, price type, payment method and status, kept up to date by the
+# trg_revenue_daily_* triggers (see db_init.py) so revenue reports never aggregate the invoice table.
+# A status change moves the invoice's amount from one row to another.
+class Revenue_daily(Base):
+    __tablename__ = 'revenue_daily'
+
+    # Primary Key (day first, so a date range is one index range scan)
+    day = Column(Date, primary_key=True)
+    price_type = Column(String(100), primary_key=True)
+    payment_method = Column(String(100), primary_key=True)
+    status = Column(String(100), primary_key=True)
+    #history
+    invoice_count = Column(Integer, nullable=False)
+    total_amount = Column(Numeric(14, 2), nullable=False)
+
+    def __init__(self, day, price_type, payment_method, status, invoice_count, total_amount):
+        self.day = day
+        self.price_type = price_type
+        self.payment_method = payment_method
+        self.status = status
+        self.invoice_count = invoice_count
+        self.total_amount = total_amount
+
+    def __repr__(self):
+        return f"<revenue_daily (day={self.day}, price_type={self.price_type}, payment_method={self.payment_method}, status={self.status}, total={self.total_amount})>"
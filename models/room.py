@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,String, ForeignKey
+from sqlalchemy import Column, Integer,String, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Room(Base):
     __tablename__ = 'room'
 
     # Primary Key
-    room_id = Column(Integer, primary_key=True, unique=True)
+    room_id = Column(Integer, Sequence('room_room_id_seq'), primary_key=True, unique=True)
     room_type = Column(String(50), nullable= False)
     capacity = Column(Integer, nullable= False)
     current_status = Column(String(100))
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from .base import Base
+
+# One row per schema migration applied to this database (see db_migrate.py). The highest version is what
+# the app compares with the version its code expects before it starts serving.
+class Schema_version(Base):
+    __tablename__ = 'schema_version'
+
+    # Primary Key
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    #history
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+    def __init__(self, version, name, applied_at):
+        self.version = version
+        self.name = name
+        self.applied_at = applied_at
+
+    def __repr__(self):
+        return f"<schema_version (version={self.version}, name={self.name}, applied_at={self.applied_at})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,String,DateTime, ForeignKey
+from sqlalchemy import Column, Integer,String,DateTime, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,12 +7,12 @@ class Trainer(Base):
     __tablename__ = 'trainer'
 
     # Primary Key
-    trainer_id = Column(Integer, primary_key=True,unique = True)
+    trainer_id = Column(Integer, Sequence('trainer_trainer_id_seq'), primary_key=True,unique = True)
     #class_id = Column(Integer, ForeignKey('classes.class_id'))
 
     #history
     name = Column(String(100), nullable= False)
-    email = Column(String(100), nullable= False)
+    email = Column(String(100), nullable= False, index=True)
     start_date = Column(DateTime, nullable= False)
     password = Column(String(50), nullable=False)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer,DateTime, ForeignKey, String
+from sqlalchemy import Column, Integer,DateTime, ForeignKey, String, Sequence, Index
 from sqlalchemy.orm import relationship
 from .base import Base 
 
@@ -7,7 +7,7 @@ class Trainer_availability(Base):
     __tablename__ = 'trainer_availability'
 
     # Primary Key
-    availability_id = Column(Integer, primary_key=True,unique = True)
+    availability_id = Column(Integer, Sequence('trainer_availability_availability_id_seq'), primary_key=True,unique = True)
     # member info
     trainer_id = Column(Integer, ForeignKey('trainer.trainer_id'),nullable = False)
 
@@ -19,6 +19,11 @@ class Trainer_availability(Base):
 
     trainer = relationship("Trainer", back_populates="trainer_availability")
 
+    # Availability is always read per trainer (and checked per day of the week)
+    __table_args__ = (
+        Index('idx_trainer_availability_trainer_day', trainer_id, day_of_week),
+    )
+
     def __init__(self, availability_id, trainer_id, day_of_week, start_time, end_time):
         self.availability_id = availability_id
         self.trainer_id = trainer_id
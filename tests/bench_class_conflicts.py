@@ -0,0 +1,101 @@
+"""
+Latency of a class conflict check as the classes table grows from 1k to 1M rows.
+
+    TEST_DATABASE_URL=postgresql://... python -m tests.bench_class_conflicts [--sizes 1000 10000 100000 1000000]
+
+Classes are generated 2 hours apart per trainer and room, back from a fixed date, and each probe asks
+_find_booking_conflicts about a random past slot: half land on a booked class, half in a free gap.
+Everything runs in one transaction that is rolled back at the end, so the database is left as it was.
+"""
+import sys
+from datetime import datetime, timedelta
+from random import Random
+from statistics import median, quantiles
+from time import perf_counter
+from tests import TEST_DATABASE_URL
+
+# Trainer i always teaches in room i, so bookings never clash
+PAIRS = 50
+SLOT = timedelta(hours=2)
+CLASS_LENGTH = timedelta(minutes=90)
+
+# Class n goes to pair n % PAIRS, in slot n // PAIRS counted back from :base
+_GROW_CLASSES_SQL = """
+    INSERT INTO classes (trainer_id, room_id, class_type, number_members, start_time, end_time, start_date)
+    SELECT (:trainer_ids)[1 + n % :pairs], (:room_ids)[1 + n % :pairs], 'Benchmark', 10, s.start_time,
+           s.start_time + :class_length, s.start_time::date
+    FROM generate_series(:first, :last) AS n, LATERAL (SELECT :base - (n / :pairs + 1) * :slot_length AS start_time) s
+"""
+
+
+def run(sizes, probes: int):
+    from sqlalchemy import text, bindparam, ARRAY, Integer
+    import apps  # noqa: F401  (loads every model the services' relationships refer to)
+    from db_migrate import migrate
+    from models.base import SessionLocal
+    from app.Admin_Service import _find_booking_conflicts
+
+    if not migrate():
+        sys.exit(1)
+
+    base = datetime(2020, 1, 1)
+    rng = Random(5)
+    session = SessionLocal()
+    try:
+        trainer_ids = list(session.scalars(text(
+            "INSERT INTO trainer (name, email, start_date, password) "
+            "SELECT 'Bench ' || n, 'bench-' || n || '@club.com', now(), 'pass' FROM generate_series(1, :n) n RETURNING trainer_id"
+        ), {'n': PAIRS}))
+        room_ids = list(session.scalars(text(
+            "INSERT INTO room (room_type, capacity, current_status) "
+            "SELECT 'Studio', 20, 'Available' FROM generate_series(1, :n) RETURNING room_id"
+        ), {'n': PAIRS}))
+        grow = text(_GROW_CLASSES_SQL).bindparams(
+            bindparam('trainer_ids', type_=ARRAY(Integer)), bindparam('room_ids', type_=ARRAY(Integer))
+        )
+
+        stored = 0
+        baseline = None
+        print(f"{'classes':>10} {'median us':>10} {'p95 us':>10} {'vs first':>9}")
+        for size in sizes:
+            session.execute(grow, {
+                'trainer_ids': trainer_ids, 'room_ids': room_ids, 'pairs': PAIRS, 'first': stored,
+                'last': size - 1, 'base': base, 'slot_length': SLOT, 'class_length': CLASS_LENGTH
+            })
+            stored = size
+            session.execute(text("ANALYZE classes"))
+
+            slots = size // PAIRS
+            timings = []
+            for probe in range(probes):
+                pair = rng.randrange(PAIRS)
+                start = base - (rng.randrange(slots) + 1) * SLOT
+                if probe % 2:
+                    # The gap after the class, before the next one
+                    start += CLASS_LENGTH + timedelta(minutes=2)
+                    end = start + timedelta(minutes=25)
+                else:
+                    end = start + CLASS_LENGTH
+                started = perf_counter()
+                trainer_busy, room_busy = _find_booking_conflicts(session, trainer_ids[pair], room_ids[pair], start, end)
+                timings.append((perf_counter() - started) * 1e6)
+                assert (trainer_busy is not None) == (probe % 2 == 0), (size, probe, start)
+
+            typical = median(timings)
+            baseline = baseline or typical
+            print(f"{size:>10} {typical:>10.0f} {quantiles(timings, n=20)[-1]:>10.0f} {typical / baseline:>8.2f}x")
+    finally:
+        session.rollback()
+        session.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark class conflict checks against the number of stored classes.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--probes', type=int, default=2000, help="conflict checks timed per size")
+    args = parser.parse_args()
+    if not TEST_DATABASE_URL:
+        parser.error("set TEST_DATABASE_URL to a scratch PostgreSQL database")
+    run(sorted(args.sizes), args.probes)
@@ -0,0 +1,120 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Barrier
+from uuid import uuid4
+from tests import TEST_DATABASE_URL
+
+# Enough connections for every enroll to hold one at the same time
+os.environ.setdefault("DB_MAX_OVERFLOW", "80")
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, "set TEST_DATABASE_URL to a scratch PostgreSQL database")
+class ConcurrentEnrollmentTest(unittest.TestCase):
+    """enroll_in_class under a burst: the database alone keeps a class within number_members."""
+
+    MEMBERS = 300
+    CAPACITY = 25
+
+    @classmethod
+    def setUpClass(cls):
+        import apps  # noqa: F401  (loads every model the services' relationships refer to)
+        from db_migrate import migrate
+        from models.base import SessionLocal
+        from models.member import Member
+        from models.room import Room
+        from models.trainer import Trainer
+
+        if not migrate():
+            raise RuntimeError("could not migrate the test database")
+        cls.tag = f"enroll-test-{uuid4().hex[:8]}"
+        cls.class_ids = []
+        with SessionLocal() as session:
+            trainer = Trainer(None, f"{cls.tag}@club.com", cls.tag, datetime.now(), 'pass')
+            room = Room(None, None, 'Studio', cls.CAPACITY, 'Available')
+            members = [
+                Member(None, f"{cls.tag}-{i}", f"{cls.tag}-{i}@club.com", datetime(1990, 1, 1), 'pass', '555-0100')
+                for i in range(cls.MEMBERS)
+            ]
+            session.add_all([trainer, room, *members])
+            session.commit()
+            cls.trainer_id, cls.room_id = trainer.trainer_id, room.room_id
+            cls.member_ids = [member.member_id for member in members]
+
+    @classmethod
+    def tearDownClass(cls):
+        from sqlalchemy import text
+        from models.base import engine
+
+        with engine.begin() as connection:
+            params = {'class_ids': cls.class_ids, 'member_ids': cls.member_ids}
+            connection.execute(text("DELETE FROM class_enrollment WHERE class_id = ANY(:class_ids)"), params)
+            connection.execute(text("DELETE FROM classes WHERE class_id = ANY(:class_ids)"), params)
+            connection.execute(text("DELETE FROM member WHERE member_id = ANY(:member_ids)"), params)
+            connection.execute(text("DELETE FROM room WHERE room_id = :room_id"), {'room_id': cls.room_id})
+            connection.execute(text("DELETE FROM trainer WHERE trainer_id = :trainer_id"), {'trainer_id': cls.trainer_id})
+
+    def _new_class(self, capacity: int) -> int:
+        from models.base import SessionLocal
+        from models.classes import Classes
+
+        # Each class gets its own day, so the test's trainer and room are never double-booked
+        start = datetime.now().replace(microsecond=0) + timedelta(days=30 + len(self.class_ids))
+        with SessionLocal() as session:
+            new_class = Classes(None, self.trainer_id, self.room_id, self.tag, start, capacity)
+            session.add(new_class)
+            session.commit()
+            self.class_ids.append(new_class.class_id)
+            return new_class.class_id
+
+    def _enroll_all_at_once(self, attempts):
+        """Runs enroll_in_class for every (member_id, class_id) at the same instant; returns the results in order."""
+        from app.Member_Service import enroll_in_class
+
+        start_line = Barrier(len(attempts))
+
+        def enroll(attempt):
+            start_line.wait()
+            return enroll_in_class(*attempt)
+
+        with ThreadPoolExecutor(max_workers=len(attempts)) as pool:
+            return list(pool.map(enroll, attempts))
+
+    def _stored_enrollment(self, class_id: int):
+        from sqlalchemy import text
+        from models.base import engine
+
+        with engine.connect() as connection:
+            return connection.execute(text("""
+                SELECT (SELECT count(*) FROM class_enrollment WHERE class_id = :class_id) AS enrolled,
+                       (SELECT current_enrollment FROM class_enrollment_summary WHERE class_id = :class_id) AS counted
+            """), {'class_id': class_id}).one()
+
+    def test_burst_never_exceeds_capacity(self):
+        class_id = self._new_class(self.CAPACITY)
+
+        results = self._enroll_all_at_once([(member_id, class_id) for member_id in self.member_ids])
+
+        stored = self._stored_enrollment(class_id)
+        self.assertLessEqual(stored.enrolled, self.CAPACITY, "the class was overbooked")
+        self.assertEqual(stored.enrolled, self.CAPACITY)
+        self.assertEqual(stored.counted, self.CAPACITY)
+        self.assertEqual(results.count(None), 0, "enrolls failed with a database error")
+        self.assertEqual(sum(1 for result in results if result), self.CAPACITY)
+        self.assertEqual({result.reason for result in results if not result}, {'class_full'})
+
+    def test_double_submits_enroll_once(self):
+        class_id = self._new_class(self.CAPACITY)
+        member_id = self.member_ids[0]
+
+        results = self._enroll_all_at_once([(member_id, class_id)] * 50)
+
+        self.assertEqual(results.count(None), 0, "enrolls failed with a database error")
+        self.assertEqual(sum(1 for result in results if result), 1)
+        self.assertEqual({result.reason for result in results if not result}, {'already_enrolled'})
+        self.assertEqual(self._stored_enrollment(class_id).enrolled, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()